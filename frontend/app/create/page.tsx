@@ -19,6 +19,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import {
   processImages,
   pollJobStatus,
+  JobFailedError,
   type JobStatusResponse,
 } from "@/lib/api";
 
@@ -179,6 +180,12 @@ export default function CreatePage() {
         console.error("Polling error:", pollErr);
         setPollingError(String(pollErr));
         setJobStatus("error");
+        if (pollErr instanceof JobFailedError) {
+          alert(
+            `❌ Video processing failed.\n\nJob ID: ${jobId}\n\n${pollErr.message}`
+          );
+          return;
+        }
         alert(
           `⏳ Video is still processing.\n\nJob ID: ${jobId}\n\nPlease wait and check back in a minute. The video may take up to 2 minutes to process.`
         );
@@ -66,9 +66,46 @@ async function uploadToS3(
   }
 }
 
+/**
+ * Images up to this size are sent in the POST itself (multipart/form-data),
+ * saving the presign request and the separate S3 uploads. Must not exceed the
+ * API's MAX_DIRECT_UPLOAD_BYTES.
+ */
+const DIRECT_UPLOAD_MAX_BYTES = 2 * 1024 * 1024;
+
+/**
+ * Upload small images and queue the job in a single multipart request
+ */
+async function directUpload(
+  apiUrl: string,
+  jobId: string,
+  params: ProcessImagesParams
+): Promise<Response> {
+  const form = new FormData();
+  form.append("job_id", jobId);
+  if (params.backgroundKey) {
+    form.append("background_key", params.backgroundKey);
+  }
+  if (params.includeAudio !== undefined) {
+    form.append("include_audio", String(params.includeAudio));
+  }
+  if (params.durationSeconds !== undefined) {
+    form.append("duration_seconds", String(params.durationSeconds));
+  }
+  if (params.renditions?.length) {
+    form.append("renditions", params.renditions.join(","));
+  }
+  form.append("image1", params.image1);
+  form.append("image2", params.image2);
+
+  // The browser sets the multipart Content-Type with its boundary
+  return fetch(apiUrl, { method: "POST", body: form });
+}
+
 /**
  * Process images through the API Gateway Lambda
- * Uses presigned S3 URLs to upload images directly, bypassing API Gateway size limits
+ * Small images are uploaded in the same request; larger ones use presigned
+ * S3 URLs to upload directly, bypassing API Gateway size limits
  */
 export interface ProcessImagesParams {
   image1: File; // Must be a File object (not base64)
@@ -76,9 +113,18 @@ export interface ProcessImagesParams {
   backgroundKey?: string;
   includeAudio?: boolean;
   durationSeconds?: number;
+  renditions?: Rendition[]; // extra sizes rendered alongside the full clip
   jobId?: string;
 }
 
+export type Rendition = "small" | "gif";
+
+export interface RenditionStatus {
+  name: Rendition;
+  output_key: string;
+  download_url: string;
+}
+
 export interface ProcessImagesResponse {
   message: string;
   job_id: string;
@@ -88,14 +134,45 @@ export interface ProcessImagesResponse {
   output_url: string;
 }
 
+export type JobStage =
+  | "queued"
+  | "fetching"
+  | "rendering"
+  | "uploading"
+  | "retrying"
+  | "completed"
+  | "failed";
+
 export interface JobStatusResponse {
-  status: "processing" | "completed";
+  status: "queued" | "processing" | "completed" | "failed";
+  stage?: JobStage | null;
   job_id: string;
+  progress?: number; // 0-1, from the encoder's frame count
   output_key?: string;
   download_url?: string;
   output_url?: string;
+  poster_url?: string;
+  preview_url?: string;
+  renditions?: RenditionStatus[]; // listed as each one is uploaded
+  error?: string; // set when status is "failed"
 }
 
+/**
+ * Thrown by pollJobStatus when the worker gives up on a job
+ */
+export class JobFailedError extends Error {
+  constructor(public status: JobStatusResponse) {
+    super(status.error || "Video processing failed");
+    this.name = "JobFailedError";
+  }
+}
+
+/**
+ * Longest ?wait= long-poll to request; the API caps it at its
+ * MAX_STATUS_WAIT_SECONDS
+ */
+const STATUS_WAIT_SECONDS = 20;
+
 export async function processImages(
   params: ProcessImagesParams
 ): Promise<ProcessImagesResponse> {
@@ -108,6 +185,40 @@ export async function processImages(
   // Generate job ID if not provided
   const jobId = params.jobId || Math.random().toString(36).slice(2, 10);
 
+  // Files without a MIME type go through presign, which defaults it
+  const direct = [params.image1, params.image2].every(
+    (file) => file.type && file.size <= DIRECT_UPLOAD_MAX_BYTES
+  );
+  const response = direct
+    ? await directUpload(apiUrl, jobId, params)
+    : await presignedUpload(apiUrl, jobId, params);
+
+  if (!response.ok) {
+    const error = await response
+      .json()
+      .catch(() => ({ error: response.statusText }));
+    throw new Error(
+      error.error || `HTTP ${response.status}: ${response.statusText}`
+    );
+  }
+
+  const json = await response.json();
+  try {
+    if (json.job_id) {
+      localStorage.setItem("memeclip:lastJobId", json.job_id);
+    }
+  } catch {}
+  return json;
+}
+
+/**
+ * Upload images through presigned S3 URLs, then queue the job by S3 keys
+ */
+async function presignedUpload(
+  apiUrl: string,
+  jobId: string,
+  params: ProcessImagesParams
+): Promise<Response> {
   // Get file MIME types (mobile browsers may send different types)
   const image1Type = params.image1.type || "image/png";
   const image2Type = params.image2.type || "image/png";
@@ -133,32 +244,16 @@ export async function processImages(
     ...(params.durationSeconds !== undefined && {
       duration_seconds: params.durationSeconds,
     }),
+    ...(params.renditions?.length ? { renditions: params.renditions } : {}),
   };
 
-  const response = await fetch(apiUrl, {
+  return fetch(apiUrl, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
     },
     body: JSON.stringify(body),
   });
-
-  if (!response.ok) {
-    const error = await response
-      .json()
-      .catch(() => ({ error: response.statusText }));
-    throw new Error(
-      error.error || `HTTP ${response.status}: ${response.statusText}`
-    );
-  }
-
-  const json = await response.json();
-  try {
-    if (json.job_id) {
-      localStorage.setItem("memeclip:lastJobId", json.job_id);
-    }
-  } catch {}
-  return json;
 }
 
 /**
@@ -167,6 +262,20 @@ export async function processImages(
 export async function checkJobStatus(
   jobId: string
 ): Promise<JobStatusResponse> {
+  const { status } = await fetchJobStatus(jobId);
+  return status!;
+}
+
+/**
+ * Fetch job status, optionally conditional on the last ETag seen.
+ * With an ETag and waitSeconds the API holds the request until the job
+ * record changes (or the wait runs out); status is null on 304 Not Modified.
+ */
+async function fetchJobStatus(
+  jobId: string,
+  etag?: string | null,
+  waitSeconds?: number
+): Promise<{ status: JobStatusResponse | null; etag: string | null }> {
   const apiUrl = process.env.NEXT_PUBLIC_API_BASE_URL;
   if (!apiUrl) {
     throw new Error("NEXT_PUBLIC_API_BASE_URL is not set");
@@ -175,11 +284,24 @@ export async function checkJobStatus(
   const url = new URL(apiUrl);
   url.searchParams.set("action", "status");
   url.searchParams.set("job_id", jobId);
+  const headers: Record<string, string> = {};
+  if (etag) {
+    headers["If-None-Match"] = etag;
+    if (waitSeconds) {
+      url.searchParams.set("wait", String(Math.ceil(waitSeconds)));
+    }
+  }
 
   const response = await fetch(url.toString(), {
     method: "GET",
+    headers,
+    cache: "no-store",
   });
 
+  if (response.status === 304) {
+    return { status: null, etag };
+  }
+
   if (!response.ok) {
     const error = await response
       .json()
@@ -189,11 +311,15 @@ export async function checkJobStatus(
     );
   }
 
-  return response.json();
+  return { status: await response.json(), etag: response.headers.get("ETag") };
 }
 
 /**
- * Poll job status until completion, with progress callback
+ * Poll job status until completion, with progress callback.
+ * Once the API returns an ETag, each request long-polls with If-None-Match
+ * so it returns as soon as the job changes; responses without one (no job
+ * store) fall back to polling every intervalMs. Rejects with JobFailedError
+ * when the job fails.
  */
 export async function pollJobStatus(
   jobId: string,
@@ -201,19 +327,36 @@ export async function pollJobStatus(
   maxAttempts: number = 120, // 2 minutes at 1s intervals
   intervalMs: number = 1000
 ): Promise<JobStatusResponse> {
-  for (let attempt = 0; attempt < maxAttempts; attempt++) {
-    const status = await checkJobStatus(jobId);
+  const deadline = Date.now() + maxAttempts * intervalMs;
+  let etag: string | null = null;
 
-    if (onProgress) {
-      onProgress(status);
-    }
+  while (Date.now() < deadline) {
+    const remainingSeconds = (deadline - Date.now()) / 1000;
+    const result = await fetchJobStatus(
+      jobId,
+      etag,
+      Math.min(STATUS_WAIT_SECONDS, remainingSeconds)
+    );
+    const status = result.status;
+    etag = result.etag;
 
-    if (status.status === "completed") {
-      return status;
+    if (status) {
+      if (onProgress) {
+        onProgress(status);
+      }
+
+      if (status.status === "completed") {
+        return status;
+      }
+      if (status.status === "failed") {
+        throw new JobFailedError(status);
+      }
     }
 
-    // Wait before next poll
-    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    // A long-poll already waited server-side
+    if (!etag) {
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
   }
 
   throw new Error(
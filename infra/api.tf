@@ -18,7 +18,7 @@ resource "aws_iam_role" "api_lambda" {
   assume_role_policy = data.aws_iam_policy_document.api_lambda_assume.json
 }
 
-# IAM policy for API Lambda: S3 upload, SQS send, CloudWatch logs
+# IAM policy for API Lambda: S3 upload, SQS send, job state, CloudWatch logs
 data "aws_iam_policy_document" "api_lambda_policy" {
   statement {
     sid    = "CloudWatchLogs"
@@ -42,13 +42,34 @@ data "aws_iam_policy_document" "api_lambda_policy" {
     resources = ["${aws_s3_bucket.media.arn}/*"]
   }
 
+  # Without ListBucket, S3 answers a HEAD or CopyObject of a missing key
+  # (every render cache miss) with 403 AccessDenied instead of 404.
+  statement {
+    sid    = "S3List"
+    effect = "Allow"
+    actions = [
+      "s3:ListBucket",
+    ]
+    resources = [aws_s3_bucket.media.arn]
+  }
+
   statement {
     sid    = "SQSSend"
     effect = "Allow"
     actions = [
       "sqs:SendMessage",
     ]
-    resources = [aws_sqs_queue.jobs.arn]
+    resources = [aws_sqs_queue.jobs.arn, aws_sqs_queue.interactive.arn, aws_sqs_queue.bulk.arn]
+  }
+
+  statement {
+    sid    = "JobState"
+    effect = "Allow"
+    actions = [
+      "dynamodb:GetItem",
+      "dynamodb:UpdateItem",
+    ]
+    resources = [aws_dynamodb_table.jobs.arn]
   }
 }
 
@@ -85,7 +106,13 @@ resource "aws_lambda_function" "api" {
       S3_BUCKET            = aws_s3_bucket.media.bucket
       OUTPUT_BUCKET        = aws_s3_bucket.media.bucket
       SQS_QUEUE_URL        = aws_sqs_queue.jobs.url
+      SQS_INTERACTIVE_QUEUE_URL = aws_sqs_queue.interactive.url
+      SQS_BULK_QUEUE_URL        = aws_sqs_queue.bulk.url
       DEFAULT_BACKGROUND_KEY = "backgrounds/background.mp4"
+      JOB_STORE              = "dynamodb"
+      JOB_TABLE              = aws_dynamodb_table.jobs.name
+      # Status long-polls stay well inside the 30s timeout
+      MAX_STATUS_WAIT_SECONDS = "20"
     }
   }
 }
@@ -95,6 +122,9 @@ resource "aws_api_gateway_rest_api" "api" {
   name        = "${var.project_name}-api"
   description = "API for uploading images and triggering video processing"
 
+  # Direct uploads reach the Lambda base64-encoded instead of mangled as text
+  binary_media_types = ["multipart/form-data"]
+
   endpoint_configuration {
     types = ["REGIONAL"]
   }
@@ -183,8 +213,8 @@ resource "aws_api_gateway_integration_response" "process_options" {
   status_code = aws_api_gateway_method_response.process_options.status_code
 
   response_parameters = {
-    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'"
-    "method.response.header.Access-Control-Allow-Methods" = "'POST,OPTIONS'"
+    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,If-None-Match,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'"
+    "method.response.header.Access-Control-Allow-Methods" = "'GET,POST,OPTIONS'"
     "method.response.header.Access-Control-Allow-Origin"  = "'*'"
   }
 }
@@ -51,6 +51,18 @@ resource "aws_s3_bucket_versioning" "media" {
   versioning_configuration { status = "Enabled" }
 }
 
+# Parts of streamed uploads that were never completed or aborted (a worker
+# killed mid-render) are billed until removed.
+resource "aws_s3_bucket_lifecycle_configuration" "media" {
+  bucket = aws_s3_bucket.media.id
+  rule {
+    id     = "abort-incomplete-multipart-uploads"
+    status = "Enabled"
+    filter {}
+    abort_incomplete_multipart_upload { days_after_initiation = 1 }
+  }
+}
+
 resource "aws_s3_bucket_server_side_encryption_configuration" "media" {
   bucket = aws_s3_bucket.media.id
   rule {
@@ -91,6 +103,61 @@ resource "aws_sqs_queue" "jobs" {
   message_retention_seconds  = 1209600
   receive_wait_time_seconds  = 10
   sqs_managed_sse_enabled    = true
+  redrive_policy             = local.sqs_redrive_policy
+}
+
+# Messages that failed sqs_max_receive_count times land here instead of being
+# redelivered forever; the worker records the job as failed on that last try
+resource "aws_sqs_queue" "dead_letter" {
+  name                      = "${var.sqs_queue_name}-dlq"
+  message_retention_seconds  = 1209600
+  sqs_managed_sse_enabled    = true
+}
+
+locals {
+  sqs_redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.dead_letter.arn
+    maxReceiveCount     = var.sqs_max_receive_count
+  })
+}
+
+# Short clips and long/batch renders get queues of their own, routed by the
+# API from each job's estimated cost, so neither waits behind the other
+resource "aws_sqs_queue" "interactive" {
+  name                      = "${var.sqs_queue_name}-interactive"
+  visibility_timeout_seconds = 900
+  message_retention_seconds  = 1209600
+  receive_wait_time_seconds  = 10
+  sqs_managed_sse_enabled    = true
+  redrive_policy             = local.sqs_redrive_policy
+}
+
+resource "aws_sqs_queue" "bulk" {
+  name                      = "${var.sqs_queue_name}-bulk"
+  visibility_timeout_seconds = 900
+  message_retention_seconds  = 1209600
+  receive_wait_time_seconds  = 10
+  sqs_managed_sse_enabled    = true
+  redrive_policy             = local.sqs_redrive_policy
+}
+
+# -------------------------
+# Job state (stages and progress, read by the status endpoint)
+# -------------------------
+resource "aws_dynamodb_table" "jobs" {
+  name         = "${var.project_name}-jobs"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "job_id"
+
+  attribute {
+    name = "job_id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
 }
 
 # -------------------------
@@ -127,6 +194,7 @@ data "aws_iam_policy_document" "lambda_policy" {
     actions = [
       "s3:GetObject",
       "s3:PutObject",
+      "s3:AbortMultipartUpload",
       "s3:ListBucket"
     ]
     resources = [
@@ -143,7 +211,16 @@ data "aws_iam_policy_document" "lambda_policy" {
       "sqs:GetQueueAttributes",
       "sqs:ChangeMessageVisibility"
     ]
-    resources = [aws_sqs_queue.jobs.arn]
+    resources = [aws_sqs_queue.jobs.arn, aws_sqs_queue.interactive.arn, aws_sqs_queue.bulk.arn]
+  }
+
+  statement {
+    sid     = "AllowJobState"
+    actions = [
+      "dynamodb:GetItem",
+      "dynamodb:UpdateItem"
+    ]
+    resources = [aws_dynamodb_table.jobs.arn]
   }
 }
 
@@ -171,19 +248,136 @@ resource "aws_lambda_function" "processor" {
   memory_size  = 3008
   architectures = ["x86_64"]
 
+  # /tmp holds the 256 MB background cache plus a 128 MB job workspace per
+  # parallel job, or per output a group job encodes at once (8): 1280 MB at
+  # most, which processor_ephemeral_storage_mb (default 2048) covers. Lambda's
+  # own 512 MB default would fit the cache and only two workspaces.
+  ephemeral_storage {
+    size = var.processor_ephemeral_storage_mb
+  }
+
   environment {
     variables = {
-      MEDIA_BUCKET = aws_s3_bucket.media.bucket
+      MEDIA_BUCKET      = aws_s3_bucket.media.bucket
+      JOB_STORE         = "dynamodb"
+      JOB_TABLE         = aws_dynamodb_table.jobs.name
+      MAX_RECEIVE_COUNT = tostring(var.sqs_max_receive_count)
     }
   }
 }
 
+# Upload-time image normalization: same image, different entry point
+resource "aws_lambda_function" "normalizer" {
+  count         = var.lambda_image_uri == "" ? 0 : 1
+  function_name = "${var.project_name}-normalizer"
+  role          = aws_iam_role.lambda.arn
+  package_type  = "Image"
+  image_uri     = var.lambda_image_uri
+
+  image_config {
+    command = ["normalize.lambda_handler"]
+  }
+
+  timeout      = 60
+  memory_size  = 1024
+  architectures = ["x86_64"]
+}
+
+resource "aws_lambda_permission" "normalizer_s3" {
+  count         = length(aws_lambda_function.normalizer)
+  statement_id  = "AllowS3Invoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.normalizer[0].function_name
+  principal     = "s3.amazonaws.com"
+  source_arn    = aws_s3_bucket.media.arn
+}
+
+# Upload-time background transcoding to a render-friendly mezzanine
+resource "aws_lambda_function" "mezzanine" {
+  count         = var.lambda_image_uri == "" ? 0 : 1
+  function_name = "${var.project_name}-mezzanine"
+  role          = aws_iam_role.lambda.arn
+  package_type  = "Image"
+  image_uri     = var.lambda_image_uri
+
+  image_config {
+    command = ["mezzanine.lambda_handler"]
+  }
+
+  timeout      = 300
+  memory_size  = 3008
+  architectures = ["x86_64"]
+}
+
+resource "aws_lambda_permission" "mezzanine_s3" {
+  count         = length(aws_lambda_function.mezzanine)
+  statement_id  = "AllowS3Invoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.mezzanine[0].function_name
+  principal     = "s3.amazonaws.com"
+  source_arn    = aws_s3_bucket.media.arn
+}
+
+# Normalized variants and mezzanines go to normalized/ and mezzanine/, outside
+# these prefixes, so they do not retrigger them
+resource "aws_s3_bucket_notification" "uploads" {
+  count  = length(aws_lambda_function.normalizer)
+  bucket = aws_s3_bucket.media.id
+
+  lambda_function {
+    lambda_function_arn = aws_lambda_function.normalizer[0].arn
+    events              = ["s3:ObjectCreated:*"]
+    filter_prefix       = "images/"
+  }
+
+  lambda_function {
+    lambda_function_arn = aws_lambda_function.mezzanine[0].arn
+    events              = ["s3:ObjectCreated:*"]
+    filter_prefix       = "backgrounds/"
+  }
+
+  depends_on = [aws_lambda_permission.normalizer_s3, aws_lambda_permission.mezzanine_s3]
+}
+
 # Trigger Lambda from SQS
 resource "aws_lambda_event_source_mapping" "sqs_trigger" {
   count        = length(aws_lambda_function.processor)
   event_source_arn = aws_sqs_queue.jobs.arn
   function_name    = aws_lambda_function.processor[0].arn
+  batch_size       = var.sqs_batch_size
+  maximum_batching_window_in_seconds = 0
+  # Only the failed messages of a batch are redelivered
+  function_response_types = ["ReportBatchItemFailures"]
+
+  scaling_config {
+    maximum_concurrency = var.sqs_max_concurrency
+  }
+}
+
+# One short clip per invocation, so none waits on another in its batch
+resource "aws_lambda_event_source_mapping" "sqs_trigger_interactive" {
+  count        = length(aws_lambda_function.processor)
+  event_source_arn = aws_sqs_queue.interactive.arn
+  function_name    = aws_lambda_function.processor[0].arn
   batch_size       = 1
   maximum_batching_window_in_seconds = 0
+  function_response_types = ["ReportBatchItemFailures"]
+
+  scaling_config {
+    maximum_concurrency = var.sqs_interactive_max_concurrency
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "sqs_trigger_bulk" {
+  count        = length(aws_lambda_function.processor)
+  event_source_arn = aws_sqs_queue.bulk.arn
+  function_name    = aws_lambda_function.processor[0].arn
+  batch_size       = var.sqs_batch_size
+  maximum_batching_window_in_seconds = 0
+  function_response_types = ["ReportBatchItemFailures"]
+
+  scaling_config {
+    maximum_concurrency = var.sqs_bulk_max_concurrency
+  }
 }
 
@@ -8,6 +8,21 @@ output "sqs_queue_url" {
   value       = aws_sqs_queue.jobs.id
 }
 
+output "sqs_interactive_queue_url" {
+  description = "SQS queue URL for interactive (short clip) jobs"
+  value       = aws_sqs_queue.interactive.id
+}
+
+output "sqs_bulk_queue_url" {
+  description = "SQS queue URL for bulk (long render and batch) jobs"
+  value       = aws_sqs_queue.bulk.id
+}
+
+output "sqs_dead_letter_queue_url" {
+  description = "SQS dead-letter queue for job messages that failed every delivery"
+  value       = aws_sqs_queue.dead_letter.id
+}
+
 output "lambda_name" {
   description = "Lambda function name"
   value       = length(aws_lambda_function.processor) > 0 ? aws_lambda_function.processor[0].function_name : ""
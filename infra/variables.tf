@@ -21,6 +21,42 @@ variable "sqs_queue_name" {
   default     = "meme-clip-jobs"
 }
 
+variable "sqs_batch_size" {
+  description = "SQS records delivered per processor invocation (rendered in parallel across vCPUs)"
+  type        = number
+  default     = 4
+}
+
+variable "sqs_max_receive_count" {
+  description = "Deliveries of a failing job message before SQS moves it to the dead-letter queue"
+  type        = number
+  default     = 3
+}
+
+variable "sqs_max_concurrency" {
+  description = "Most concurrent processor invocations draining the standard jobs queue"
+  type        = number
+  default     = 10
+}
+
+variable "sqs_interactive_max_concurrency" {
+  description = "Most concurrent processor invocations draining the interactive (short clip) queue"
+  type        = number
+  default     = 10
+}
+
+variable "sqs_bulk_max_concurrency" {
+  description = "Most concurrent processor invocations draining the bulk (long render and batch) queue"
+  type        = number
+  default     = 2
+}
+
+variable "processor_ephemeral_storage_mb" {
+  description = "Processor /tmp size in MB: background cache (256) plus JOB_SCRATCH_MB (128) per parallel job or group encoder (MAX_GROUP_ENCODERS, 8)"
+  type        = number
+  default     = 2048
+}
+
 variable "lambda_image_uri" {
   description = "ECR image URI for the Lambda container"
   type        = string
@@ -5,40 +5,627 @@ This function is exposed via API Gateway and handles multipart/form-data uploads
 
 import boto3
 from botocore.exceptions import ClientError
+import hashlib
 import json
 import logging
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from base64 import b64decode
 
+from jobstate import job_store_from_env, record_etag
+from multipart import MultipartError, MultipartParser, boundary_from_content_type, iter_body_chunks
+from scheduling import estimate_cost, job_class, queue_client_from_env
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 s3_client = boto3.client('s3')
-sqs_client = boto3.client('sqs')
+sqs_client = queue_client_from_env()
 
 # Get environment variables
 S3_BUCKET = os.environ.get('S3_BUCKET')
 SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
+# Jobs are routed by estimated cost (see scheduling.py); classes without a
+# queue of their own use SQS_QUEUE_URL
+QUEUE_URLS = {
+    'interactive': os.environ.get('SQS_INTERACTIVE_QUEUE_URL') or SQS_QUEUE_URL,
+    'standard': SQS_QUEUE_URL,
+    'bulk': os.environ.get('SQS_BULK_QUEUE_URL') or SQS_QUEUE_URL,
+}
 OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET', S3_BUCKET)  # Default to same bucket
 DEFAULT_BACKGROUND_KEY = os.environ.get('DEFAULT_BACKGROUND_KEY', 'backgrounds/background.mp4')
 
+# Encoding profiles understood by the render worker (see lambda/prod/profiles.py)
+ENCODING_PROFILES = ('fast', 'balanced', 'archive')
+# Extra renditions the render worker can produce (see lambda/prod/renditions.py)
+RENDITIONS = ('small', 'gif')
+# Render engines a job may ask for (RENDER_BACKENDS in lambda/prod/handler.py)
+RENDER_BACKENDS = ('moviepy', 'ffmpeg')
+
+
+# Finished renders are cached by content under this prefix of OUTPUT_BUCKET
+RENDER_CACHE_ENABLED = os.environ.get('RENDER_CACHE', '1').lower() not in ('0', 'false', 'no', 'off', '')
+RENDER_CACHE_PREFIX = os.environ.get('RENDER_CACHE_PREFIX', 'renders/')
+RENDER_CACHE_VERSION = 3
+DEFAULT_PROFILE = os.environ.get('ENCODING_PROFILE', 'balanced')
+
+# Job state written by the worker (JOB_STORE); without it status falls back to S3 HEAD polling
+job_store = job_store_from_env()
+# Upper bound for ?wait= long-polls; keep well under the function timeout
+MAX_STATUS_WAIT_SECONDS = float(os.environ.get('MAX_STATUS_WAIT_SECONDS', '20'))
+
+# Image pairs accepted by one batch submission (rendered as one grouped job)
+MAX_BATCH_JOBS = int(os.environ.get('MAX_BATCH_JOBS', '50'))
+
+# Largest image accepted by a direct multipart upload; bigger files use the presign flow
+MAX_DIRECT_UPLOAD_BYTES = int(os.environ.get('MAX_DIRECT_UPLOAD_BYTES', str(2 * 1024 * 1024)))
+# Largest non-file form field in a direct upload
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+
+def head_objects(bucket, keys):
+    """
+    HEAD all keys concurrently over the shared client.
+    Returns {key: ETag}, with None for keys that cannot be found.
+    """
+    def etag(key):
+        try:
+            return s3_client.head_object(Bucket=bucket, Key=key)['ETag']
+        except ClientError as e:
+            logger.info(f"S3 head_object failed for {key}: {e.response.get('Error', {}).get('Code', '')}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(32, max(1, len(keys)))) as pool:
+        return dict(zip(keys, pool.map(etag, keys)))
+
+
+def render_cache_key(background, background_etag, image_etags, include_audio, duration_seconds, profile):
+    """
+    Content hash of a render's inputs and parameters.
+    Must stay identical to render_cache_key in lambda/prod/rendercache.py
+    (checked by lambda/tests/test_render_cache_key.py).
+    """
+    duration_seconds = max(0.1, min(float(duration_seconds), 12.0))
+    material = {
+        'v': RENDER_CACHE_VERSION,
+        'background': [background[0], background[1], background_etag.strip('"')],
+        'images': [etag.strip('"') for etag in image_etags],
+        'include_audio': bool(include_audio),
+        'duration_seconds': round(duration_seconds, 3),
+        'profile': profile,
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def copy_cached_render(digest, output_key):
+    """
+    Server-side copy a cached render to output_key. Returns False on a cache miss,
+    and on any other S3 error (logged), so the cache never blocks a submission.
+    """
+    try:
+        s3_client.copy_object(
+            Bucket=OUTPUT_BUCKET,
+            Key=output_key,
+            CopySource={'Bucket': OUTPUT_BUCKET, 'Key': f"{RENDER_CACHE_PREFIX}{digest}.mp4"},
+        )
+        return True
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code', '')
+        if code not in ('404', 'NoSuchKey'):
+            # 403 AccessDenied is also what a missing key looks like without s3:ListBucket
+            logger.warning(f"Render cache lookup for {digest} failed ({code}); treating it as a miss")
+        return False
+
+
+def download_url_for(output_key):
+    """Presigned download URL (valid for 1 hour) that forces a download on mobile browsers."""
+    filename = output_key.split('/')[-1]  # Extract just the filename (e.g., "abc123.mp4")
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': OUTPUT_BUCKET,
+            'Key': output_key,
+            'ResponseContentDisposition': f'attachment; filename="{filename}"'
+        },
+        ExpiresIn=3600
+    )
+
+
+def preview_url_for(key):
+    """Presigned URL (valid for 1 hour) for showing a poster or preview clip inline."""
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': OUTPUT_BUCKET, 'Key': key},
+        ExpiresIn=3600
+    )
+
+
+def image_extension(content_type):
+    """File extension for an uploaded image's content type."""
+    content_type = content_type.lower()
+    return 'jpg' if 'jpeg' in content_type else ('heic' if 'heic' in content_type else 'png')
+
+
+def record_job(job_id, **fields):
+    """Best-effort write to the job store; never fails the request."""
+    if job_store is None:
+        return
+    try:
+        job_store.update(job_id, **fields)
+    except Exception:
+        logger.warning(f"Could not record job state for {job_id}", exc_info=True)
+
+
+def job_status_response(event, job_id, headers):
+    """
+    Answer a status request from the job store, or None when there is no record.
+    Honors If-None-Match (304 while unchanged) and ?wait=<seconds> long-polling.
+    """
+    if job_store is None:
+        return None
+    request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    if_none_match = request_headers.get('if-none-match')
+    query_params = event.get('queryStringParameters') or {}
+    try:
+        wait = max(0.0, min(float(query_params.get('wait') or 0), MAX_STATUS_WAIT_SECONDS))
+    except ValueError:
+        wait = 0.0
+
+    if if_none_match and wait:
+        record = job_store.wait_for_change(job_id, if_none_match, wait)
+    else:
+        record = job_store.get(job_id)
+    if record is None:
+        return None
+
+    etag = record_etag(record)
+    headers = {**headers, 'ETag': etag, 'Cache-Control': 'no-cache'}
+    if if_none_match == etag:
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
+
+    output_key = record.get('output_key') or f"outputs/{job_id}.mp4"
+    body = {
+        'status': record.get('status', 'processing'),
+        'stage': record.get('stage'),
+        'job_id': job_id,
+        'output_key': output_key,
+    }
+    if 'progress' in record:
+        body['progress'] = record['progress']
+    # Published by the worker before the full render finishes
+    if record.get('poster_key'):
+        body['poster_url'] = preview_url_for(record['poster_key'])
+    if record.get('preview_key'):
+        body['preview_url'] = preview_url_for(record['preview_key'])
+    # Extra renditions, each listed once it is uploaded
+    if record.get('renditions'):
+        body['renditions'] = [
+            {'name': name, 'output_key': key, 'download_url': download_url_for(key)}
+            for name, key in record['renditions'].items()
+        ]
+    if body['status'] == 'completed':
+        body['download_url'] = download_url_for(output_key)
+        body['output_url'] = f"s3://{OUTPUT_BUCKET}/{output_key}"
+    elif body['status'] == 'failed':
+        body['error'] = record.get('error', 'Video processing failed')
+    elif body['stage'] == 'retrying':
+        # The last attempt's error; SQS redelivers the job
+        body['error'] = record.get('error')
+    return {
+        'statusCode': 200,
+        'headers': {**headers, 'Content-Type': 'application/json'},
+        'body': json.dumps(body),
+    }
+
+
+def parse_render_options(data):
+    """
+    Optional render fields shared by single and batch submissions.
+    Returns (options, None), or (None, error message) for an invalid value.
+    """
+    ia_val = data.get('include_audio', True)
+    if isinstance(ia_val, str):
+        include_audio = ia_val.strip().lower() not in ('false', '0', 'no', 'off', '')
+    else:
+        include_audio = bool(ia_val)
+    
+    ds_val = data.get('duration_seconds', 6.0)
+    try:
+        duration_seconds = float(ds_val)
+    except Exception:
+        duration_seconds = 6.0
+    
+    profile = data.get('profile')
+    if profile is not None and profile not in ENCODING_PROFILES:
+        return None, f"Unknown profile: {profile}. Expected one of: {', '.join(ENCODING_PROFILES)}"
+    
+    render_backend = data.get('render_backend') or None
+    if render_backend is not None and render_backend not in RENDER_BACKENDS:
+        return None, f"Unknown render_backend: {render_backend}. Expected one of: {', '.join(RENDER_BACKENDS)}"
+    
+    return {
+        'background_key': data.get('background_key', DEFAULT_BACKGROUND_KEY),
+        'include_audio': include_audio,
+        'duration_seconds': duration_seconds,
+        'profile': profile,
+        'render_backend': render_backend,
+    }, None
+
+
+def parse_renditions(value):
+    """
+    Rendition names from a JSON list or a comma-separated form field.
+    Returns (names, None), or (None, error message) for an unknown name.
+    """
+    if not value:
+        return [], None
+    names = value.split(',') if isinstance(value, str) else value
+    if not isinstance(names, list):
+        return None, 'renditions must be a list of names'
+    names = list(dict.fromkeys(str(name).strip() for name in names if str(name).strip()))
+    unknown = [name for name in names if name not in RENDITIONS]
+    if unknown:
+        return None, f"Unknown rendition: {', '.join(unknown)}. Expected any of: {', '.join(RENDITIONS)}"
+    return names, None
+
+
+def enqueue(sqs_message, outputs=1):
+    """
+    Send a job message to the queue of its class, recording its estimated cost
+    for the worker. Returns the job class.
+    """
+    cost = estimate_cost(
+        sqs_message['duration_seconds'],
+        sqs_message['include_audio'],
+        sqs_message.get('profile') or DEFAULT_PROFILE,
+        outputs,
+    )
+    sqs_message['estimated_cost'] = cost
+    sqs_message['job_class'] = job_class(cost)
+    logger.info(f"Sending {sqs_message['job_class']} SQS message (estimated cost {cost}): {json.dumps(sqs_message)}")
+    sqs_client.send_message(
+        QueueUrl=QUEUE_URLS[sqs_message['job_class']],
+        MessageBody=json.dumps(sqs_message)
+    )
+    return sqs_message['job_class']
+
+
+def submit_batch(data, headers):
+    """
+    Queue many image pairs on one background as a single grouped SQS job.
+    The worker decodes the background once for the whole group and still writes
+    each pair to outputs/{job_id}.mp4, so per-job status polling is unchanged.
+    Pairs whose render is cached are completed immediately and not queued.
+    """
+    def error_response(status_code, message):
+        return {
+            'statusCode': status_code,
+            'headers': {**headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': message})
+        }
+    
+    jobs = data['jobs']
+    if not jobs:
+        return error_response(400, 'jobs must not be empty')
+    if len(jobs) > MAX_BATCH_JOBS:
+        return error_response(400, f'At most {MAX_BATCH_JOBS} jobs per batch')
+    for job in jobs:
+        if not isinstance(job, dict) or not job.get('job_id') or not job.get('image1_key') or not job.get('image2_key'):
+            return error_response(400, 'Every job needs job_id, image1_key and image2_key')
+    job_ids = [job['job_id'] for job in jobs]
+    if len(set(job_ids)) != len(job_ids):
+        return error_response(400, 'job_id values must be unique within a batch')
+    
+    options, error = parse_render_options(data)
+    if error:
+        return error_response(400, error)
+    if data.get('renditions'):
+        return error_response(400, 'renditions are not supported for batch submissions')
+    # Groups always render through the worker's shared-decode group renderer
+    if options['render_backend']:
+        return error_response(400, 'render_backend is not supported for batch submissions')
+    background_key = options['background_key']
+    
+    image_keys = list(dict.fromkeys(k for job in jobs for k in (job['image1_key'], job['image2_key'])))
+    logger.info(f"Verifying {len(image_keys)} images exist in S3 for a batch of {len(jobs)}")
+    etags = head_objects(S3_BUCKET, image_keys + [background_key])
+    missing = [k for k in image_keys if etags[k] is None]
+    if missing:
+        return error_response(404, f"Images not found in S3: {', '.join(missing)}")
+    
+    results = {job['job_id']: {'job_id': job['job_id'], 'status': 'queued', 'output_key': f"outputs/{job['job_id']}.mp4"}
+               for job in jobs}
+    
+    # Identical inputs were rendered before: serve those pairs from the render cache
+    if RENDER_CACHE_ENABLED and etags.get(background_key):
+        def serve_cached(job):
+            digest = render_cache_key(
+                (S3_BUCKET, background_key),
+                etags[background_key],
+                [etags[job['image1_key']], etags[job['image2_key']]],
+                options['include_audio'],
+                options['duration_seconds'],
+                options['profile'] or DEFAULT_PROFILE,
+            )
+            return copy_cached_render(digest, results[job['job_id']]['output_key'])
+        
+        with ThreadPoolExecutor(max_workers=min(16, len(jobs))) as pool:
+            hits = list(pool.map(serve_cached, jobs))
+        for job, hit in zip(jobs, hits):
+            if hit:
+                result = results[job['job_id']]
+                result.update(status='completed', download_url=download_url_for(result['output_key']))
+                record_job(job['job_id'], status='completed', stage='completed', output_key=result['output_key'], cached=True)
+    
+    queued = [job for job in jobs if results[job['job_id']]['status'] == 'queued']
+    if queued:
+        sqs_message = {
+            'background_bucket': S3_BUCKET,
+            'background_key': background_key,
+            'output_bucket': OUTPUT_BUCKET,
+            'include_audio': options['include_audio'],
+            'duration_seconds': options['duration_seconds'],
+            'jobs': [
+                {
+                    'job_id': job['job_id'],
+                    'image1_bucket': S3_BUCKET,
+                    'image1_key': job['image1_key'],
+                    'image2_bucket': S3_BUCKET,
+                    'image2_key': job['image2_key'],
+                    'output_key': results[job['job_id']]['output_key'],
+                }
+                for job in queued
+            ],
+        }
+        if options['profile']:
+            sqs_message['profile'] = options['profile']
+        for job in queued:
+            record_job(job['job_id'], status='queued', stage='queued', output_key=results[job['job_id']]['output_key'])
+        logger.info(f"Queueing a group of {len(queued)} of {len(jobs)} jobs")
+        enqueue(sqs_message, outputs=len(queued))
+    
+    return {
+        'statusCode': 200,
+        'headers': {**headers, 'Content-Type': 'application/json'},
+        'body': json.dumps({
+            'message': f'Batch of {len(jobs)} videos accepted ({len(queued)} queued)',
+            'jobs': [results[job_id] for job_id in job_ids],
+        })
+    }
+
+
+def submit_job(data, headers, image_etags=None):
+    """
+    Queue one render (or serve it from the render cache) for images already in S3.
+    image_etags maps image keys to ETags the caller already knows (e.g. just
+    uploaded), which skips HEADing them.
+    """
+    # Get required S3 keys (images are uploaded via presigned URLs or a direct upload)
+    job_id = data.get('job_id')
+    image1_key = data.get('image1_key')
+    image2_key = data.get('image2_key')
+    
+    if not job_id or not image1_key or not image2_key:
+        return {
+            'statusCode': 400,
+            'headers': {**headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'error': 'Missing required fields: job_id, image1_key, image2_key'
+            })
+        }
+    
+    # Get optional parameters
+    options, error = parse_render_options(data)
+    if not error:
+        renditions, error = parse_renditions(data.get('renditions'))
+    if error:
+        return {
+            'statusCode': 400,
+            'headers': {**headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': error})
+        }
+    background_key = options['background_key']
+    include_audio = options['include_audio']
+    duration_seconds = options['duration_seconds']
+    profile = options['profile']
+    
+    # Generate output key
+    output_key = f"outputs/{job_id}.mp4"
+    
+    # Verify images exist in S3 before triggering processing
+    known = image_etags or {}
+    unknown = [k for k in dict.fromkeys([image1_key, image2_key, background_key]) if k not in known]
+    logger.info(f"Verifying objects exist in S3: {', '.join(unknown)}")
+    # The background is HEADed alongside the images for its ETag (render cache key)
+    etags = {**head_objects(S3_BUCKET, unknown), **known}
+    missing_key = next((k for k in (image1_key, image2_key) if etags[k] is None), None)
+    if missing_key:
+        return {
+            'statusCode': 404,
+            'headers': {**headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'error': f'Image not found in S3: {missing_key}'
+            })
+        }
+    
+    # Identical inputs were rendered before: serve the cached result without queueing.
+    # Renditions are cached too, but only the worker knows how to serve them.
+    if RENDER_CACHE_ENABLED and etags[background_key] and not renditions:
+        digest = render_cache_key(
+            (S3_BUCKET, background_key),
+            etags[background_key],
+            [etags[image1_key], etags[image2_key]],
+            include_audio,
+            duration_seconds,
+            profile or DEFAULT_PROFILE,
+        )
+        if copy_cached_render(digest, output_key):
+            logger.info(f"Render cache hit {digest}; copied to {output_key}")
+            record_job(job_id, status='completed', stage='completed', output_key=output_key, cached=True)
+            return {
+                'statusCode': 200,
+                'headers': {**headers, 'Content-Type': 'application/json'},
+                'body': json.dumps({
+                    'message': 'Video served from render cache',
+                    'status': 'completed',
+                    'job_id': job_id,
+                    'image1_key': image1_key,
+                    'image2_key': image2_key,
+                    'output_key': output_key,
+                    'download_url': download_url_for(output_key),
+                    'output_url': f"s3://{OUTPUT_BUCKET}/{output_key}"
+                })
+            }
+    
+    # Send SQS message to trigger video processing
+    sqs_message = {
+        'background_bucket': S3_BUCKET,
+        'background_key': background_key,
+        'image1_bucket': S3_BUCKET,
+        'image1_key': image1_key,
+        'image2_bucket': S3_BUCKET,
+        'image2_key': image2_key,
+        'output_bucket': OUTPUT_BUCKET,
+        'output_key': output_key,
+        'include_audio': include_audio,
+        'duration_seconds': duration_seconds,
+        'job_id': job_id,
+    }
+    if profile:
+        sqs_message['profile'] = profile
+    if renditions:
+        sqs_message['renditions'] = renditions
+    # Optional per-job render engine override ("moviepy" or "ffmpeg")
+    if options['render_backend']:
+        sqs_message['render_backend'] = options['render_backend']
+
+    # Recorded before sending so a fast worker's first stage is never overwritten
+    record_job(job_id, status='queued', stage='queued', output_key=output_key)
+    enqueue(sqs_message)
+
+    return {
+        'statusCode': 200,
+        'headers': {**headers, 'Content-Type': 'application/json'},
+        'body': json.dumps({
+            'message': 'Video processing queued',
+            'job_id': job_id,
+            'image1_key': image1_key,
+            'image2_key': image2_key,
+            'output_key': output_key,
+            'output_url': f"s3://{OUTPUT_BUCKET}/{output_key}"
+        })
+    }
+
+
+
+class UploadTooLarge(Exception):
+    """A multipart part is over its size limit."""
+
+
+class _BufferSink:
+    """Collects one multipart part, refusing more than limit bytes."""
+
+    def __init__(self, name, limit, on_close):
+        self.data = bytearray()
+        self.name = name
+        self.limit = limit
+        self.on_close = on_close
+
+    def write(self, chunk):
+        if len(self.data) + len(chunk) > self.limit:
+            raise UploadTooLarge(f'{self.name} is over {self.limit} bytes')
+        self.data += chunk
+
+    def close(self):
+        self.on_close(bytes(self.data))
+
+
+def submit_upload(event, boundary, headers):
+    """
+    Direct upload: multipart/form-data with image1 and image2 file parts plus the
+    usual form fields (job_id, background_key, include_audio, ...).
+
+    The body is parsed as bytes while it is base64-decoded, and each image is
+    PUT to S3 as soon as its part ends (while later parts are still being
+    parsed), then the job is queued in the same request. This saves the presign
+    round trip and the browser's separate PUTs for small images.
+    """
+    def error_response(status_code, message):
+        return {
+            'statusCode': status_code,
+            'headers': {**headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': message})
+        }
+    
+    fields = {}
+    uploads = {}
+    pool = ThreadPoolExecutor(max_workers=2)
+    
+    def open_part(part):
+        if not part.is_file:
+            def store_field(data):
+                fields[part.name] = data.decode('utf-8', 'replace')
+            return _BufferSink(part.name, MAX_FORM_FIELD_BYTES, store_field)
+        if part.name not in ('image1', 'image2') or part.name in uploads:
+            raise MultipartError(f'Unexpected file field: {part.name}')
+        if not part.content_type.lower().startswith('image/'):
+            raise MultipartError(f'{part.name} must be an image, got {part.content_type}')
+        key = f"images/{str(uuid.uuid4())[:12]}.{image_extension(part.content_type)}"
+        
+        def put(data):
+            response = s3_client.put_object(Bucket=S3_BUCKET, Key=key, Body=data, ContentType=part.content_type)
+            return key, response['ETag']
+        
+        def on_close(data):
+            if not data:
+                raise MultipartError(f'{part.name} is empty')
+            uploads[part.name] = pool.submit(put, data)
+        
+        return _BufferSink(part.name, MAX_DIRECT_UPLOAD_BYTES, on_close)
+    
+    try:
+        parser = MultipartParser(boundary, open_part)
+        for chunk in iter_body_chunks(event.get('body') or '', event.get('isBase64Encoded', False)):
+            parser.feed(chunk)
+        parser.close()
+        missing = [name for name in ('image1', 'image2') if name not in uploads]
+        if missing:
+            return error_response(400, f"Missing file field(s): {', '.join(missing)}")
+        uploaded = {name: future.result() for name, future in uploads.items()}
+    except UploadTooLarge as e:
+        return error_response(413, f'{e}; upload large images with the presign flow')
+    except ValueError as e:
+        # MultipartError, or a body that is not valid base64
+        return error_response(400, f'Invalid multipart body: {e}')
+    finally:
+        pool.shutdown(wait=True)
+    
+    logger.info(f"Direct upload stored {uploaded['image1'][0]} and {uploaded['image2'][0]}")
+    data = dict(fields)
+    data.setdefault('job_id', str(uuid.uuid4())[:8])
+    data['image1_key'], data['image2_key'] = uploaded['image1'][0], uploaded['image2'][0]
+    return submit_job(data, headers, image_etags=dict(uploaded.values()))
+
 
 def lambda_handler(event, context):
     """
     Handle API Gateway requests.
     
-    Two modes:
+    Three modes:
     1. GET /process?action=presign - Returns presigned S3 URLs for uploading images
     2. POST /process - Accepts S3 keys (image1_key, image2_key) and triggers processing
+    3. POST /process as multipart/form-data - Uploads small images directly and triggers processing
     """
     try:
         http_method = event.get('httpMethod', '')
         headers = {
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
+            'Access-Control-Expose-Headers': 'ETag',
         }
         
         # Handle CORS preflight
@@ -64,8 +651,8 @@ def lambda_handler(event, context):
                 image2_type = query_params.get('image2_type', 'image/png')
                 
                 # Determine file extension based on content type
-                ext1 = 'jpg' if 'jpeg' in image1_type.lower() else ('heic' if 'heic' in image1_type.lower() else 'png')
-                ext2 = 'jpg' if 'jpeg' in image2_type.lower() else ('heic' if 'heic' in image2_type.lower() else 'png')
+                ext1 = image_extension(image1_type)
+                ext2 = image_extension(image2_type)
                 
                 image1_key = f"images/{image1_id}.{ext1}"
                 image2_key = f"images/{image2_id}.{ext2}"
@@ -103,24 +690,19 @@ def lambda_handler(event, context):
                         'body': json.dumps({'error': 'job_id is required'})
                     }
                 
+                # One key lookup in the job store when the worker records state
+                response = job_status_response(event, job_id, headers)
+                if response is not None:
+                    return response
+                
                 output_key = f"outputs/{job_id}.mp4"
                 
                 # Check if output file exists in S3
                 try:
                     logger.info(f"Checking S3 for output: s3://{OUTPUT_BUCKET}/{output_key}")
                     s3_client.head_object(Bucket=OUTPUT_BUCKET, Key=output_key)
-                    # File exists - generate a presigned URL for download (valid for 1 hour)
-                    # Include Content-Disposition header to force download on mobile browsers
-                    filename = output_key.split('/')[-1]  # Extract just the filename (e.g., "abc123.mp4")
-                    download_url = s3_client.generate_presigned_url(
-                        'get_object',
-                        Params={
-                            'Bucket': OUTPUT_BUCKET,
-                            'Key': output_key,
-                            'ResponseContentDisposition': f'attachment; filename="{filename}"'
-                        },
-                        ExpiresIn=3600
-                    )
+                    # File exists - generate a presigned URL for download
+                    download_url = download_url_for(output_key)
                     logger.info(f"Output file found, generated download URL")
                     return {
                         'statusCode': 200,
@@ -162,7 +744,13 @@ def lambda_handler(event, context):
                         }
 
         # Handle POST request - expects S3 keys (images already uploaded via presigned URLs)
+        # or, as multipart/form-data, the images themselves
         if http_method == 'POST':
+            request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+            boundary = boundary_from_content_type(request_headers.get('content-type'))
+            if boundary:
+                return submit_upload(event, boundary, headers)
+            
             body = event.get('body', '')
             if event.get('isBase64Encoded', False):
                 body = b64decode(body).decode('utf-8')
@@ -176,84 +764,12 @@ def lambda_handler(event, context):
                     'body': json.dumps({'error': 'Invalid JSON body'})
                 }
             
-            # Get required S3 keys (images should already be uploaded via presigned URLs)
-            job_id = data.get('job_id')
-            image1_key = data.get('image1_key')
-            image2_key = data.get('image2_key')
-            
-            if not job_id or not image1_key or not image2_key:
-                return {
-                    'statusCode': 400,
-                    'headers': {**headers, 'Content-Type': 'application/json'},
-                    'body': json.dumps({
-                        'error': 'Missing required fields: job_id, image1_key, image2_key'
-                    })
-                }
-            
-            # Get optional parameters
-            background_key = data.get('background_key', DEFAULT_BACKGROUND_KEY)
-            ia_val = data.get('include_audio', True)
-            if isinstance(ia_val, str):
-                include_audio = ia_val.strip().lower() not in ('false', '0', 'no', 'off', '')
-            else:
-                include_audio = bool(ia_val)
-            
-            ds_val = data.get('duration_seconds', 6.0)
-            try:
-                duration_seconds = float(ds_val)
-            except Exception:
-                duration_seconds = 6.0
-            
-            # Generate output key
-            output_key = f"outputs/{job_id}.mp4"
+            # A "jobs" list submits many image pairs as one grouped render
+            if isinstance(data.get('jobs'), list):
+                return submit_batch(data, headers)
             
-            # Verify images exist in S3 before triggering processing
-            logger.info(f"Verifying images exist in S3: {image1_key}, {image2_key}")
-            try:
-                s3_client.head_object(Bucket=S3_BUCKET, Key=image1_key)
-                s3_client.head_object(Bucket=S3_BUCKET, Key=image2_key)
-            except ClientError as e:
-                return {
-                    'statusCode': 404,
-                    'headers': {**headers, 'Content-Type': 'application/json'},
-                    'body': json.dumps({
-                        'error': f'Image not found in S3: {image1_key if "image1" in str(e) else image2_key}'
-                    })
-                }
-            
-            # Send SQS message to trigger video processing
-            sqs_message = {
-                'background_bucket': S3_BUCKET,
-                'background_key': background_key,
-                'image1_bucket': S3_BUCKET,
-                'image1_key': image1_key,
-                'image2_bucket': S3_BUCKET,
-                'image2_key': image2_key,
-                'output_bucket': OUTPUT_BUCKET,
-                'output_key': output_key,
-                'include_audio': include_audio,
-                'duration_seconds': duration_seconds,
-            }
-
-            logger.info(f"Sending SQS message: {json.dumps(sqs_message)}")
-            sqs_client.send_message(
-                QueueUrl=SQS_QUEUE_URL,
-                MessageBody=json.dumps(sqs_message)
-            )
+            return submit_job(data, headers)
 
-            return {
-                'statusCode': 200,
-                'headers': {**headers, 'Content-Type': 'application/json'},
-                'body': json.dumps({
-                    'message': 'Video processing queued',
-                    'job_id': job_id,
-                    'image1_key': image1_key,
-                    'image2_key': image2_key,
-                    'output_key': output_key,
-                    'output_url': f"s3://{OUTPUT_BUCKET}/{output_key}"
-                })
-            }
-        
         # Unknown method
         return {
             'statusCode': 405,
@@ -274,46 +790,3 @@ def lambda_handler(event, context):
             })
         }
 
-
-def parse_multipart(body, boundary):
-    """Parse multipart/form-data body."""
-    parts = body.split(f'--{boundary}')
-    images = {}
-    form_data = {}
-    
-    for part in parts:
-        if not part.strip() or part.strip() == '--':
-            continue
-        
-        # Split headers and content
-        if '\r\n\r\n' in part:
-            headers_raw, content = part.split('\r\n\r\n', 1)
-        elif '\n\n' in part:
-            headers_raw, content = part.split('\n\n', 1)
-        else:
-            continue
-        
-        headers = {}
-        for line in headers_raw.split('\n'):
-            if ':' in line:
-                key, value = line.split(':', 1)
-                headers[key.strip().lower()] = value.strip()
-        
-        content_disposition = headers.get('content-disposition', '')
-        
-        # Extract field name
-        if 'name="' in content_disposition:
-            field_name = content_disposition.split('name="')[1].split('"')[0]
-        else:
-            continue
-        
-        # Check if it's a file upload
-        if 'filename=' in content_disposition:
-            # It's a file
-            images[field_name] = content.rstrip('\r\n')
-        else:
-            # It's a form field
-            form_data[field_name] = content.rstrip('\r\n')
-    
-    return images, form_data
-
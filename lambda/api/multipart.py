@@ -0,0 +1,171 @@
+"""
+Incremental, bytes-based multipart/form-data parser.
+
+The body is fed in chunks of any size and each part's content is handed to a
+sink as soon as it is known not to contain the boundary, so file parts can be
+forwarded (e.g. to S3) without ever holding the whole body, and binary data
+is never decoded as text.
+"""
+
+from base64 import b64decode
+
+# Longest header block accepted for one part
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class MultipartError(ValueError):
+    """The body is not valid multipart/form-data."""
+
+
+def parse_options_header(value):
+    """
+    Split a header such as `form-data; name="image1"; filename="a.png"`
+    into ('form-data', {'name': 'image1', 'filename': 'a.png'}).
+    """
+    parts = value.split(';')
+    params = {}
+    for param in parts[1:]:
+        if '=' not in param:
+            continue
+        key, val = param.split('=', 1)
+        val = val.strip()
+        if len(val) >= 2 and val[0] == val[-1] == '"':
+            val = val[1:-1].replace('\\"', '"')
+        params[key.strip().lower()] = val
+    return parts[0].strip().lower(), params
+
+
+def boundary_from_content_type(content_type):
+    """Boundary of a multipart/form-data Content-Type, or None."""
+    kind, params = parse_options_header(content_type or '')
+    if kind != 'multipart/form-data' or not params.get('boundary'):
+        return None
+    return params['boundary']
+
+
+class Part:
+    """Headers of one part; `name`, `filename` and `content_type` for convenience."""
+
+    def __init__(self, headers):
+        self.headers = headers
+        _, params = parse_options_header(headers.get('content-disposition', ''))
+        self.name = params.get('name')
+        self.filename = params.get('filename')
+        self.content_type = headers.get('content-type', 'text/plain')
+
+    @property
+    def is_file(self):
+        return self.filename is not None
+
+
+class MultipartParser:
+    """
+    Push parser: call feed() with successive chunks of the body, then close().
+
+    open_part(part) is called with each Part as its headers complete and
+    returns a sink with write(bytes) and close(); content arrives in pieces
+    through write() and close() marks the end of the part.
+    """
+
+    PREAMBLE, HEADERS, BODY, DONE = range(4)
+
+    def __init__(self, boundary, open_part):
+        if isinstance(boundary, str):
+            boundary = boundary.encode('latin-1')
+        self.delimiter = b'\r\n--' + boundary
+        self.open_part = open_part
+        # The first boundary has no preceding CRLF; pretend it does.
+        self.buffer = bytearray(b'\r\n')
+        self.state = self.PREAMBLE
+        self.sink = None
+
+    def feed(self, data):
+        if self.state == self.DONE:
+            return
+        self.buffer += data
+        while self._step():
+            pass
+
+    def close(self):
+        if self.state != self.DONE:
+            raise MultipartError('Unexpected end of multipart body')
+
+    def _step(self):
+        """Consume as much of the buffer as possible; True if more may follow."""
+        buf = self.buffer
+        if self.state in (self.PREAMBLE, self.BODY):
+            index = buf.find(self.delimiter)
+            if index < 0:
+                # Keep a tail that could be the start of a split delimiter.
+                keep = len(self.delimiter) - 1
+                if self.state == self.BODY and len(buf) > keep:
+                    self.sink.write(bytes(buf[:-keep]))
+                    del buf[:-keep]
+                elif self.state == self.PREAMBLE and len(buf) > keep:
+                    del buf[:-keep]
+                return False
+            end = index + len(self.delimiter)
+            if len(buf) < end + 2:
+                return False
+            if self.state == self.BODY:
+                if index:
+                    self.sink.write(bytes(buf[:index]))
+                self.sink.close()
+                self.sink = None
+            marker = bytes(buf[end:end + 2])
+            if marker == b'--':
+                self.state = self.DONE
+                del buf[:]
+                return False
+            # Transport padding may follow the boundary before its CRLF.
+            line_end = buf.find(b'\r\n', end)
+            if line_end < 0:
+                return False
+            if buf[end:line_end].strip(b' \t'):
+                raise MultipartError('Malformed multipart boundary line')
+            del buf[:line_end + 2]
+            self.state = self.HEADERS
+            return True
+
+        if self.state == self.HEADERS:
+            index = buf.find(b'\r\n\r\n')
+            if buf.startswith(b'\r\n'):
+                index, skip = 0, 2
+            elif index < 0:
+                if len(buf) > MAX_HEADER_BYTES:
+                    raise MultipartError('Multipart part headers too large')
+                return False
+            else:
+                skip = 4
+            if index > MAX_HEADER_BYTES:
+                raise MultipartError('Multipart part headers too large')
+            headers = {}
+            for line in bytes(buf[:index]).decode('utf-8', 'replace').split('\r\n'):
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+            del buf[:index + skip]
+            part = Part(headers)
+            if not part.name:
+                raise MultipartError('Multipart part without a name')
+            self.sink = self.open_part(part)
+            self.state = self.BODY
+            return True
+        return False
+
+
+def iter_body_chunks(body, is_base64, chunk_size=256 * 1024):
+    """
+    Yield an API Gateway event body as bytes, decoding base64 a chunk at a time
+    so the decoded body is never held in memory in full.
+    """
+    if not body:
+        return
+    if not is_base64:
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+        return
+    step = chunk_size // 3 * 4  # whole base64 quanta
+    for start in range(0, len(body), step):
+        yield b64decode(body[start:start + step])
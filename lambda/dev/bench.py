@@ -0,0 +1,287 @@
+"""
+Offline render benchmark for lambda/prod, no AWS required.
+
+Generates synthetic backgrounds (480p/720p/1080p portrait, with and without
+audio) and overlay images of several sizes and aspect ratios, renders every
+combination through overlay_images_on_video across the requested durations
+and backends, and records wall time, render fps, CPU time and peak RSS per
+case. Each case renders in a fresh forked process so peak RSS is its own.
+
+Usage:
+    python bench.py [--quick] [--backends moviepy,ffmpeg] [--durations 2,6,12]
+                    [--resolutions 480p,720p,1080p] [--images square,photo,...]
+                    [--segments 1|N|auto] [--repeat N] [--output results.json]
+                    [--baseline baseline.json] [--tolerance 0.10] [--save-baseline]
+
+Results are written as JSON. With --baseline, cases whose median wall time
+grew by more than --tolerance are reported and the exit status is non-zero.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prod"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+# The harness does its own accounting; keep per-job metrics out of the output.
+os.environ.setdefault("METRICS", "off")
+
+import imageio_ffmpeg  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from handler import overlay_images_on_video  # noqa: E402
+from metrics import peak_rss_bytes  # noqa: E402
+
+RESOLUTIONS = {
+    "480p": (480, 854),
+    "720p": (720, 1280),
+    "1080p": (1080, 1920),
+}
+
+# name -> ((width, height), format) of each generated overlay image
+IMAGES = {
+    "square": ((512, 512), "PNG"),
+    "photo": ((4032, 3024), "JPEG"),
+    "tall": ((1080, 1920), "PNG"),
+    "wide": ((1920, 600), "JPEG"),
+}
+
+# Two images are overlaid per job; each case uses the same image twice.
+DURATIONS = (2.0, 6.0, 12.0)
+BACKGROUND_SECONDS = 12
+BACKGROUND_FPS = 30
+
+QUICK = dict(resolutions=["720p"], audio=[True], images=["photo"], durations=[2.0])
+
+
+def make_background(path, size, audio):
+    """Moving test pattern (and a tone when audio is set) encoded as H.264/AAC."""
+    w, h = size
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate={BACKGROUND_FPS}:duration={BACKGROUND_SECONDS}",
+    ]
+    if audio:
+        cmd += ["-f", "lavfi", "-i", f"sine=frequency=440:duration={BACKGROUND_SECONDS}", "-c:a", "aac"]
+    cmd += ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-shortest", path]
+    subprocess.run(cmd, check=True)
+
+
+def make_image(path, size, fmt):
+    img = Image.new("RGB", size)
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    for i in range(0, max(w, h), max(8, min(w, h) // 16)):
+        draw.line([(i, 0), (0, i)], fill=(i % 256, 128, 255 - i % 256), width=4)
+    draw.rectangle([w // 4, h // 4, 3 * w // 4, 3 * h // 4], outline=(255, 255, 0), width=8)
+    img.save(path, format=fmt, quality=90)
+
+
+def prepare_inputs(workdir, resolutions, audio_modes, images):
+    """Create (or reuse) the synthetic inputs; returns (backgrounds, images) path maps."""
+    backgrounds = {}
+    for res in resolutions:
+        for audio in audio_modes:
+            path = os.path.join(workdir, f"bg-{res}-{'audio' if audio else 'mute'}.mp4")
+            if not os.path.exists(path):
+                print(f"Generating background {os.path.basename(path)}...")
+                make_background(path, RESOLUTIONS[res], audio)
+            backgrounds[(res, audio)] = path
+    image_paths = {}
+    for name in images:
+        size, fmt = IMAGES[name]
+        path = os.path.join(workdir, f"img-{name}.{'jpg' if fmt == 'JPEG' else 'png'}")
+        if not os.path.exists(path):
+            make_image(path, size, fmt)
+        image_paths[name] = path
+    return backgrounds, image_paths
+
+
+def _render_case(case, conn):
+    """Forked child: render one case and send back its measurements."""
+    frames = [0]
+
+    def on_progress(done, total):
+        frames[0] = done
+
+    try:
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        started = time.perf_counter()
+        overlay_images_on_video(
+            case["background"],
+            case["image"],
+            case["image"],
+            case["output"],
+            include_audio=case["audio"],
+            duration_seconds=case["duration"],
+            backend=case["backend"],
+            profile=case["profile"],
+            on_progress=on_progress,
+            segments=case["segments"],
+        )
+        wall = time.perf_counter() - started
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        cpu += children.ru_utime + children.ru_stime
+        conn.send({
+            "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3),
+            "frames": frames[0],
+            "fps": round(frames[0] / wall, 2) if wall else 0.0,
+            "peak_rss_mb": round(peak_rss_bytes() / (1024 * 1024), 1),
+        })
+    except Exception as e:
+        conn.send({"error": str(e) or e.__class__.__name__})
+    finally:
+        conn.close()
+
+
+def run_case(case):
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_render_case, args=(case, child))
+    proc.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {"error": f"render process exited with code {proc.exitcode}"}
+    proc.join()
+    return result
+
+
+def summarize(runs):
+    """Median of each measurement over repeated runs."""
+    keys = ("wall_s", "cpu_s", "fps", "peak_rss_mb")
+    summary = {k: round(statistics.median(r[k] for r in runs), 3) for k in keys}
+    summary["frames"] = runs[0]["frames"]
+    return summary
+
+
+def compare(results, baseline, tolerance):
+    """Print per-case changes against baseline; return the ids that regressed."""
+    previous = {c["id"]: c for c in baseline.get("cases", []) if "wall_s" in c}
+    regressions = []
+    print(f"\n{'case':<42}{'wall s':>9}{'base s':>9}{'change':>9}")
+    for case in results["cases"]:
+        base = previous.get(case["id"])
+        if base is None or "wall_s" not in case:
+            continue
+        change = case["wall_s"] / base["wall_s"] - 1 if base["wall_s"] else 0.0
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"{case['id']:<42}{case['wall_s']:>9.2f}{base['wall_s']:>9.2f}{change:>+9.1%}{flag}")
+        if flag:
+            regressions.append(case["id"])
+    return regressions
+
+
+def parse_list(value, cast=str):
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="one 720p case per backend")
+    parser.add_argument("--backends", default="moviepy,ffmpeg")
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS))
+    parser.add_argument("--audio", default="on,off", help="on, off or on,off")
+    parser.add_argument("--images", default=",".join(IMAGES))
+    parser.add_argument("--durations", default=",".join(str(d) for d in DURATIONS))
+    parser.add_argument("--profile", default="balanced")
+    parser.add_argument("--segments", default="1", help="time slices rendered in parallel (see RENDER_SEGMENTS)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "meme-clip-bench"),
+                        help="where generated inputs are kept between runs")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed wall-time growth (0.10 = 10%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    args = parser.parse_args(argv)
+
+    resolutions = parse_list(args.resolutions)
+    audio_modes = [m == "on" for m in parse_list(args.audio)]
+    images = parse_list(args.images)
+    durations = [min(d, 12.0) for d in parse_list(args.durations, float)]
+    if args.quick:
+        resolutions, audio_modes, images, durations = (QUICK[k] for k in ("resolutions", "audio", "images", "durations"))
+    for name, known in ((resolutions, RESOLUTIONS), (images, IMAGES)):
+        unknown = [n for n in name if n not in known]
+        if unknown:
+            parser.error(f"unknown value(s): {', '.join(unknown)}")
+
+    os.makedirs(args.workdir, exist_ok=True)
+    backgrounds, image_paths = prepare_inputs(args.workdir, resolutions, audio_modes, images)
+    out_dir = tempfile.mkdtemp(prefix="bench-out-")
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "profile": args.profile,
+        "segments": args.segments,
+        "cases": [],
+    }
+    try:
+        for backend in parse_list(args.backends):
+            for res in resolutions:
+                for audio in audio_modes:
+                    for image in images:
+                        for duration in durations:
+                            case_id = f"{backend}/{res}/{'audio' if audio else 'mute'}/{image}/{duration:g}s"
+                            case = {
+                                "background": backgrounds[(res, audio)],
+                                "image": image_paths[image],
+                                "output": os.path.join(out_dir, "out.mp4"),
+                                "audio": audio,
+                                "duration": duration,
+                                "backend": backend,
+                                "profile": args.profile,
+                                "segments": args.segments,
+                            }
+                            runs = [run_case(case) for _ in range(max(1, args.repeat))]
+                            entry = {"id": case_id, "backend": backend, "resolution": res, "audio": audio,
+                                     "image": image, "duration_s": duration}
+                            errors = [r["error"] for r in runs if "error" in r]
+                            if errors:
+                                entry["error"] = errors[0]
+                                print(f"{case_id:<42} FAILED: {errors[0]}")
+                            else:
+                                entry.update(summarize(runs))
+                                print(f"{case_id:<42}{entry['wall_s']:>8.2f}s {entry['fps']:>7.1f} fps "
+                                      f"{entry['cpu_s']:>8.2f}s cpu {entry['peak_rss_mb']:>7.0f} MB")
+                            results["cases"].append(entry)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {len(results['cases'])} cases to {args.output}")
+
+    failed = any("error" in c for c in results["cases"])
+    if args.baseline and args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than baseline by more than {args.tolerance:.0%}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,11 @@
 from moviepy.editor import VideoFileClip, ImageClip, CompositeVideoClip
 from PIL import Image
 import os
+import sys
+
+# profiles.py is lambda/prod's; the Docker image copies it next to this file
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prod"))
+from profiles import available_cpus, encoder_threads, get_profile
 
 def overlay_images_on_video(
     background_video_path,
@@ -118,15 +123,16 @@ def overlay_images_on_video(
     else:
         final_video = final_video.set_audio(None)
     
-    # Write the output video
+    # Write the output video with the worker's default profile (ENCODING_PROFILE)
+    profile = get_profile()
     print(f"Writing output video to {output_path}...")
     final_video.write_videofile(
         output_path,
         codec='libx264',
         audio_codec='aac',
         fps=video.fps,
-        preset='medium',
-        threads=4,
+        preset=profile.preset,
+        threads=encoder_threads(profile, available_cpus()),
         audio=include_audio
     )
     
@@ -0,0 +1,111 @@
+"""
+Cold-import budget check for the lambda/prod worker.
+
+Imports handler in fresh interpreters (as a Lambda cold start does), prints
+the slowest modules it pulls in with ``python -X importtime``, and exits
+non-zero if the best of --runs imports exceeds the budget or if a module that
+must stay lazy (moviepy and its imageio/IPython stack) is loaded at import.
+
+Usage:
+    python importtime.py [--budget-ms 600] [--runs 3] [--top 12]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+PROD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prod")
+
+DEFAULT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "600"))
+
+# Only loaded by jobs that render through moviepy
+LAZY_MODULES = ("moviepy", "imageio", "IPython", "proglog", "tqdm")
+
+PROBE = (
+    "import sys, time\n"
+    "t = time.perf_counter()\n"
+    "import handler\n"
+    "elapsed = (time.perf_counter() - t) * 1000\n"
+    "lazy = sorted({m.split('.')[0] for m in sys.modules} & set(sys.argv[1:]))\n"
+    "print(f'{elapsed:.1f} ' + ','.join(lazy))\n"
+)
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env["METRICS"] = "off"
+    return env
+
+
+def timed_import():
+    """Milliseconds to import handler in a new interpreter, and any lazy modules it loaded."""
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, *LAZY_MODULES],
+        cwd=PROD_DIR, env=child_env(), capture_output=True, text=True, check=True,
+    ).stdout.strip().split(" ", 1)
+    return float(out[0]), [m for m in (out[1] if len(out) > 1 else "").split(",") if m]
+
+
+def import_breakdown():
+    """(cumulative_us, self_us, depth, module) rows of handler's import tree.
+
+    -X importtime lists a module after everything it imports, so handler's
+    tree is the run of nested rows ending at its own depth-0 row.
+    """
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import handler"],
+        cwd=PROD_DIR, env=child_env(), capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    end = next(i for i, r in enumerate(rows) if r[2] == 0 and r[3] == "handler")
+    start = end
+    while start > 0 and rows[start - 1][2] > 0:
+        start -= 1
+    return rows[start:end + 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    rows = import_breakdown()
+    # handler's self time is its module-level setup (S3 client, caches);
+    # below it are its direct imports and the packages behind them.
+    print(f"{'module':<40}{'self ms':>10}{'cumulative ms':>15}")
+    for cumulative, own, depth, name in sorted((r for r in rows if r[2] <= 2), reverse=True)[: args.top]:
+        print(f"{'  ' * max(0, depth - 1) + name:<40}{own / 1000:>10.1f}{cumulative / 1000:>15.1f}")
+
+    timings, loaded = [], set()
+    for _ in range(max(1, args.runs)):
+        ms, lazy = timed_import()
+        timings.append(ms)
+        loaded.update(lazy)
+    best = min(timings)
+    print(f"\nimport handler: best {best:.0f} ms of {len(timings)} run(s) "
+          f"({', '.join(f'{t:.0f}' for t in timings)}); budget {args.budget_ms:.0f} ms")
+
+    ok = True
+    if loaded:
+        print(f"FAIL: loaded at import but should stay lazy: {', '.join(sorted(loaded))}")
+        ok = False
+    if best > args.budget_ms:
+        print(f"FAIL: cold import is over budget by {best - args.budget_ms:.0f} ms")
+        ok = False
+    if ok:
+        print("OK")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
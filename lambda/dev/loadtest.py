@@ -0,0 +1,687 @@
+"""
+End-to-end local load test of the API and render worker, no AWS required.
+
+Runs the lambda/api and lambda/prod handlers in this process against
+in-memory stand-ins for S3 (MemoryS3 below) and SQS (scheduling.MemoryQueue,
+JOB_QUEUE=memory), with a SQLite job store. Each simulated user loops
+through the frontend's flow: presign, PUT both images to the presigned URLs
+(or one direct multipart upload), POST the job, then poll status until it
+completes. Worker threads drain the interactive, standard and bulk queues
+through the worker's lambda_handler like the SQS event source mappings,
+each queue with its own concurrency.
+
+Reports throughput and p50/p95/p99 of submit latency (presign + PUT + POST),
+queue wait, time to completion and status polls per job, plus S3 requests
+by operation.
+
+Usage:
+    python loadtest.py [--users 4] [--jobs-per-user 3] [--durations 2,6]
+                       [--profile fast] [--audio on|off] [--image square]
+                       [--upload presign|direct] [--renditions small,gif]
+                       [--concurrency interactive=2,standard=2,bulk=1]
+                       [--poll-interval 1.0] [--long-poll SECONDS]
+                       [--cache-hits 0.0] [--output loadtest-results.json]
+                       [--baseline baseline.json] [--tolerance 0.10] [--save-baseline]
+
+All simulated workers share this machine's CPUs, so worker concurrency above
+its core count measures contention rather than scale-out. Batches received
+by one worker run one job after another (MAX_PARALLEL_JOBS=1): forked job
+processes would not see the in-memory S3. S3-triggered functions other than
+the one-time mezzanine transcode of the background (normalize.py) do not run.
+
+With --baseline, a p95 latency or throughput worse than the baseline's by
+more than --tolerance is reported and the exit status is non-zero.
+"""
+
+import argparse
+import base64
+import hashlib
+import importlib
+import importlib.util
+import io
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlencode, urlparse
+
+DEV_DIR = os.path.dirname(os.path.abspath(__file__))
+PROD_DIR = os.path.join(DEV_DIR, "..", "prod")
+API_DIR = os.path.join(DEV_DIR, "..", "api")
+
+# prod first: jobstate.py and scheduling.py are identical in both directories,
+# and only one copy of each may be loaded for the two handlers to share the
+# queue and the job store.
+sys.path[:0] = [PROD_DIR, DEV_DIR]
+sys.path.append(API_DIR)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+# The harness does its own accounting; keep per-job metrics out of the output.
+os.environ.setdefault("METRICS", "off")
+
+from botocore.exceptions import ClientError  # noqa: E402
+from botocore.response import StreamingBody  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+BUCKET = "loadtest"
+QUEUE_URLS = {name: f"memory://loadtest-{name}" for name in ("interactive", "standard", "bulk")}
+BACKGROUND_KEY = "backgrounds/background.mp4"
+
+DURATIONS = (2.0, 6.0)
+DEFAULT_CONCURRENCY = "interactive=2,standard=2,bulk=1"
+# Give up on a job that has not finished after this long
+JOB_TIMEOUT_SECONDS = 600
+
+# Measurements compared against a baseline: (section, key, higher_is_better)
+CHECKED = (
+    ("latency", "submit_ms", False),
+    ("latency", "completion_s", False),
+    ("summary", "jobs_per_min", True),
+)
+
+
+class MemoryS3:
+    """Process-local stand-in for the S3 client calls both handlers make.
+
+    Objects keep their bytes, an MD5 ETag, content type and user metadata.
+    Presigned URLs are memory:// URLs that put_presigned accepts in place of
+    the browser's HTTP PUT. Requests are counted by operation.
+    """
+
+    def __init__(self):
+        self._objects = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+        self.requests = Counter()
+
+    def _store(self, bucket, key, body, content_type=None, metadata=None, etag=None):
+        etag = etag or f'"{hashlib.md5(body).hexdigest()}"'
+        with self._lock:
+            self._objects[(bucket, key)] = {
+                "body": body,
+                "etag": etag,
+                "content_type": content_type or "binary/octet-stream",
+                "metadata": dict(metadata or {}),
+                "last_modified": datetime.now(timezone.utc),
+            }
+        return etag
+
+    def _lookup(self, operation, bucket, key, missing_code="NoSuchKey"):
+        self.requests[operation] += 1
+        with self._lock:
+            obj = self._objects.get((bucket, key))
+        if obj is None:
+            raise ClientError({"Error": {"Code": missing_code, "Message": "Not Found"}}, operation)
+        return obj
+
+    def _headers(self, obj):
+        return {
+            "ETag": obj["etag"],
+            "ContentLength": len(obj["body"]),
+            "ContentType": obj["content_type"],
+            "Metadata": dict(obj["metadata"]),
+            "LastModified": obj["last_modified"],
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        return self._headers(self._lookup("HeadObject", Bucket, Key, missing_code="404"))
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        obj = self._lookup("GetObject", Bucket, Key)
+        if IfNoneMatch is not None and IfNoneMatch == obj["etag"]:
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+        return {**self._headers(obj), "Body": StreamingBody(io.BytesIO(obj["body"]), len(obj["body"]))}
+
+    def put_object(self, Bucket, Key, Body=b"", ContentType=None, Metadata=None, **kwargs):
+        self.requests["PutObject"] += 1
+        data = Body.read() if hasattr(Body, "read") else Body
+        data = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+        return {"ETag": self._store(Bucket, Key, data, ContentType, Metadata)}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self.requests["PutObject"] += 1
+        extra = ExtraArgs or {}
+        with open(Filename, "rb") as f:
+            data = f.read()
+        self._store(Bucket, Key, data, extra.get("ContentType"), extra.get("Metadata"))
+        if Callback is not None:
+            Callback(len(data))
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        obj = self._lookup("GetObject", Bucket, Key)
+        with open(Filename, "wb") as f:
+            f.write(obj["body"])
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective="COPY", ContentType=None, Metadata=None,
+                    **kwargs):
+        obj = self._lookup("CopyObject", CopySource["Bucket"], CopySource["Key"])
+        if MetadataDirective == "REPLACE":
+            content_type, metadata = ContentType, Metadata
+        else:
+            content_type, metadata = obj["content_type"], obj["metadata"]
+        etag = self._store(Bucket, Key, obj["body"], content_type, metadata, etag=obj["etag"])
+        return {"CopyObjectResult": {"ETag": etag, "LastModified": datetime.now(timezone.utc)}}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None, Metadata=None, **kwargs):
+        self.requests["CreateMultipartUpload"] += 1
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {"content_type": ContentType, "metadata": Metadata, "parts": {}}
+        return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.requests["UploadPart"] += 1
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        with self._lock:
+            self._uploads[UploadId]["parts"][PartNumber] = data
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self.requests["CompleteMultipartUpload"] += 1
+        with self._lock:
+            upload = self._uploads.pop(UploadId)
+        parts = [upload["parts"][p["PartNumber"]] for p in MultipartUpload["Parts"]]
+        digest = hashlib.md5(b"".join(hashlib.md5(p).digest() for p in parts)).hexdigest()
+        etag = self._store(Bucket, Key, b"".join(parts), upload["content_type"], upload["metadata"],
+                           etag=f'"{digest}-{len(parts)}"')
+        return {"Bucket": Bucket, "Key": Key, "ETag": etag}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.requests["AbortMultipartUpload"] += 1
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, HttpMethod=None):
+        params = Params or {}
+        query = {"method": ClientMethod, "expires": int(time.time() + ExpiresIn)}
+        if params.get("ContentType"):
+            query["content_type"] = params["ContentType"]
+        return f"memory://{params['Bucket']}/{params['Key']}?{urlencode(query)}"
+
+    def put_presigned(self, url, data, content_type):
+        """The browser's PUT of data to a presigned put_object URL."""
+        parsed = urlparse(url)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        if parsed.scheme != "memory" or query.get("method") != "put_object":
+            raise ValueError(f"Not a presigned PUT URL: {url}")
+        if int(query["expires"]) < time.time():
+            raise ValueError(f"Presigned URL expired: {url}")
+        if query.get("content_type", content_type) != content_type:
+            raise ValueError(f"Signed for {query['content_type']}, sent {content_type}")
+        self.requests["PutObject"] += 1
+        return self._store(parsed.netloc, parsed.path.lstrip("/"), data, content_type)
+
+
+def load_handlers(workdir):
+    """Import the worker and API handlers configured for the stand-ins.
+
+    Both modules are named handler, so the API's is loaded as api_handler.
+    """
+    os.environ.update({
+        "JOB_QUEUE": "memory",
+        "JOB_STORE": f"sqlite:{os.path.join(workdir, 'jobs.sqlite')}",
+        "S3_BUCKET": BUCKET,
+        "OUTPUT_BUCKET": BUCKET,
+        "DEFAULT_BACKGROUND_KEY": BACKGROUND_KEY,
+        "SQS_QUEUE_URL": QUEUE_URLS["standard"],
+        "SQS_INTERACTIVE_QUEUE_URL": QUEUE_URLS["interactive"],
+        "SQS_BULK_QUEUE_URL": QUEUE_URLS["bulk"],
+        "MAX_PARALLEL_JOBS": "1",
+        "SCRATCH_DIR": workdir,
+        "BACKGROUND_CACHE_DIR": os.path.join(workdir, "background-cache"),
+        "FRAME_STORE_DIR": os.path.join(workdir, "frame-store"),
+    })
+    worker = importlib.import_module("handler")
+    spec = importlib.util.spec_from_file_location("api_handler", os.path.join(API_DIR, "handler.py"))
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+    return worker, api
+
+
+def install_s3(s3, worker, api):
+    worker.s3 = s3
+    worker.background_cache.client = s3
+    api.s3_client = s3
+
+
+# bench (synthetic inputs) imports the worker handler, so it is only imported
+# once load_handlers has configured it.
+
+
+def prepare_background(workdir, resolution, audio):
+    from bench import RESOLUTIONS, make_background
+
+    path = os.path.join(workdir, f"bg-{resolution}-{'audio' if audio else 'mute'}.mp4")
+    if not os.path.exists(path):
+        print(f"Generating background {os.path.basename(path)}...")
+        make_background(path, RESOLUTIONS[resolution], audio)
+    return path
+
+
+def image_variants(workdir, name, count):
+    """count distinct encodings of the named bench image (distinct ETags, so
+    every job misses the render cache), as (bytes, content_type) pairs."""
+    from bench import IMAGES, make_image
+
+    size, fmt = IMAGES[name]
+    path = os.path.join(workdir, f"img-{name}.{'jpg' if fmt == 'JPEG' else 'png'}")
+    if not os.path.exists(path):
+        make_image(path, size, fmt)
+    content_type = "image/jpeg" if fmt == "JPEG" else "image/png"
+    with Image.open(path) as img:
+        base = img.convert("RGB")
+    variants = []
+    for i in range(count):
+        img = base.copy()
+        ImageDraw.Draw(img).rectangle([0, 0, 15, 15], fill=(i % 256, (i // 256) % 256, 200))
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, quality=90)
+        variants.append((buf.getvalue(), content_type))
+    return variants
+
+
+def api_request(api, method, query=None, body=None, headers=None, is_base64=False):
+    """Invoke the API handler with an API Gateway proxy event; returns (status, headers, body)."""
+    event = {
+        "httpMethod": method,
+        "queryStringParameters": query,
+        "headers": headers or {},
+        "body": body,
+        "isBase64Encoded": is_base64,
+    }
+    resp = api.lambda_handler(event, None)
+    body = resp.get("body") or ""
+    return resp["statusCode"], resp.get("headers") or {}, json.loads(body) if body else {}
+
+
+def multipart_body(fields, files):
+    """multipart/form-data body (base64, as API Gateway passes binary) and its content type."""
+    boundary = uuid.uuid4().hex
+    buf = io.BytesIO()
+    for name, value in fields.items():
+        buf.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (data, content_type) in files.items():
+        buf.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode()
+        )
+        buf.write(data + b"\r\n")
+    buf.write(f"--{boundary}--\r\n".encode())
+    return base64.b64encode(buf.getvalue()).decode("ascii"), f"multipart/form-data; boundary={boundary}"
+
+
+def submit(api, s3, job, args):
+    """Upload the job's images and POST it; returns (response body, timings in ms)."""
+    timings = {}
+    fields = {
+        "job_id": job["job_id"],
+        "duration_seconds": job["duration_s"],
+        "include_audio": args.audio == "on",
+        "profile": args.profile,
+    }
+    if args.renditions:
+        fields["renditions"] = args.renditions
+    (data1, type1), (data2, type2) = job["images"]
+
+    if args.upload == "direct":
+        form = {k: (str(v).lower() if isinstance(v, bool) else v) for k, v in fields.items()}
+        body, content_type = multipart_body(form, {"image1": (data1, type1), "image2": (data2, type2)})
+        started = time.perf_counter()
+        status, _, resp = api_request(api, "POST", body=body, headers={"Content-Type": content_type}, is_base64=True)
+        timings["submit_ms"] = timings["post_ms"] = (time.perf_counter() - started) * 1000
+    else:
+        started = time.perf_counter()
+        status, _, urls = api_request(api, "GET", query={
+            "action": "presign", "job_id": job["job_id"], "image1_type": type1, "image2_type": type2,
+        })
+        presigned = time.perf_counter()
+        if status != 200:
+            raise RuntimeError(f"presign returned {status}: {urls.get('error')}")
+        s3.put_presigned(urls["image1_url"], data1, type1)
+        s3.put_presigned(urls["image2_url"], data2, type2)
+        uploaded = time.perf_counter()
+        fields.update(image1_key=urls["image1_key"], image2_key=urls["image2_key"])
+        status, _, resp = api_request(api, "POST", body=json.dumps(fields), headers={"Content-Type": "application/json"})
+        posted = time.perf_counter()
+        timings.update(
+            presign_ms=(presigned - started) * 1000,
+            upload_ms=(uploaded - presigned) * 1000,
+            post_ms=(posted - uploaded) * 1000,
+            submit_ms=(posted - started) * 1000,
+        )
+    if status != 200:
+        raise RuntimeError(f"submit returned {status}: {resp.get('error')}")
+    return resp, timings
+
+
+def wait_for_job(api, job_id, resp, args):
+    """Poll status until the job completes or fails; returns (final body, polls)."""
+    polls = 0
+    etag = None
+    deadline = time.monotonic() + JOB_TIMEOUT_SECONDS
+    while resp.get("status") not in ("completed", "failed"):
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"still {resp.get('status')} after {JOB_TIMEOUT_SECONDS}s")
+        query = {"action": "status", "job_id": job_id}
+        headers = {}
+        if args.long_poll and etag:
+            query["wait"] = str(args.long_poll)
+            headers["If-None-Match"] = etag
+        else:
+            time.sleep(args.poll_interval)
+        status, resp_headers, body = api_request(api, "GET", query=query, headers=headers)
+        polls += 1
+        etag = resp_headers.get("ETag", etag)
+        if status == 304:
+            continue
+        if status != 200:
+            raise RuntimeError(f"status returned {status}: {body.get('error')}")
+        resp = body
+    return resp, polls
+
+
+def run_user(api, s3, jobs, args, results):
+    for job in jobs:
+        record = {"job_id": job["job_id"], "duration_s": job["duration_s"], "cache_candidate": job["shared"]}
+        job["started"] = time.perf_counter()
+        try:
+            resp, timings = submit(api, s3, job, args)
+            record.update(timings)
+            record["submitted"] = time.perf_counter()
+            final, polls = wait_for_job(api, job["job_id"], resp, args)
+            record.update(polls=polls, status=final["status"], cached=final.get("message") == "Video served from render cache")
+            if final["status"] == "failed":
+                record["error"] = final.get("error", "failed")
+            else:
+                s3.head_object(Bucket=BUCKET, Key=final["output_key"])
+        except Exception as e:
+            record.update(status="error", error=str(e) or e.__class__.__name__)
+        record["completion_s"] = time.perf_counter() - job["started"]
+        results.append(record)
+
+
+def drain_queue(worker, queue, queue_url, batch_size, stop, received):
+    """One simulated worker Lambda: receive batches and hand them to lambda_handler."""
+    from scheduling import sqs_event
+
+    while not stop.is_set():
+        messages = queue.receive_message(
+            QueueUrl=queue_url, MaxNumberOfMessages=batch_size, WaitTimeSeconds=0.5
+        ).get("Messages", [])
+        if not messages:
+            continue
+        now = time.perf_counter()
+        for m in messages:
+            received.setdefault(json.loads(m["Body"]).get("job_id"), now)
+        result = worker.lambda_handler(sqs_event(queue_url, messages), None)
+        failed = {f["itemIdentifier"] for f in (result or {}).get("batchItemFailures", [])}
+        for m in messages:
+            if m["MessageId"] not in failed:
+                queue.delete_message(QueueUrl=queue_url, ReceiptHandle=m["ReceiptHandle"])
+
+
+def percentiles(values):
+    """p50/p95/p99 (linear interpolation) and max of values, or None if empty."""
+    values = sorted(values)
+    if not values:
+        return None
+
+    def at(q):
+        rank = (len(values) - 1) * q
+        lo = int(rank)
+        hi = min(lo + 1, len(values) - 1)
+        return values[lo] + (values[hi] - values[lo]) * (rank - lo)
+
+    return {"p50": round(at(0.50), 3), "p95": round(at(0.95), 3), "p99": round(at(0.99), 3),
+            "max": round(values[-1], 3), "count": len(values)}
+
+
+def summarize(records, received, wall_s):
+    done = [r for r in records if r["status"] == "completed"]
+    for r in records:
+        if r["job_id"] in received and "submitted" in r:
+            r["queue_wait_s"] = max(0.0, received[r["job_id"]] - r["submitted"])
+    latency = {}
+    for key in ("presign_ms", "upload_ms", "post_ms", "submit_ms", "queue_wait_s", "completion_s", "polls"):
+        stats = percentiles([r[key] for r in done if key in r])
+        if stats is not None:
+            latency[key] = stats
+    summary = {
+        "jobs": len(records),
+        "completed": len(done),
+        "failed": len(records) - len(done),
+        "cache_hits": sum(1 for r in done if r.get("cached")),
+        "wall_s": round(wall_s, 3),
+        "jobs_per_min": round(len(done) / wall_s * 60, 3) if wall_s else 0.0,
+        "clip_s_per_min": round(sum(r["duration_s"] for r in done) / wall_s * 60, 3) if wall_s else 0.0,
+    }
+    return summary, latency
+
+
+def print_report(results):
+    s = results["summary"]
+    print(f"\n{s['completed']}/{s['jobs']} jobs completed in {s['wall_s']:.1f}s "
+          f"({s['jobs_per_min']:.1f} jobs/min, {s['clip_s_per_min']:.1f} clip s/min, {s['cache_hits']} cache hits)")
+    print(f"\n{'':<14}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for key, stats in results["latency"].items():
+        print(f"{key:<14}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['max']:>10.2f}")
+    requests = results["s3_requests"]
+    if requests:
+        print("\nS3 requests: " + ", ".join(f"{op} {n}" for op, n in sorted(requests.items())))
+    for r in results["jobs"]:
+        if r["status"] != "completed":
+            print(f"{r['job_id']}: {r['status']}: {r.get('error')}")
+
+
+def compare(results, baseline, tolerance):
+    """Print the checked measurements against baseline; return the ones that regressed."""
+    regressions = []
+    print(f"\n{'measurement':<28}{'now':>10}{'base':>10}{'change':>9}")
+    for section, key, higher_is_better in CHECKED:
+        now, base = results.get(section, {}).get(key), baseline.get(section, {}).get(key)
+        if isinstance(now, dict):
+            now, base, key = now["p95"], (base or {}).get("p95"), f"{key} p95"
+        if now is None or not base:
+            continue
+        change = now / base - 1
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{key:<28}{now:>10.2f}{base:>10.2f}{change:>+9.1%}{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def parse_list(value, cast=str):
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def parse_concurrency(value):
+    concurrency = dict.fromkeys(QUEUE_URLS, 0)
+    for item in parse_list(value):
+        name, _, count = item.partition("=")
+        if name not in QUEUE_URLS or not count.isdigit():
+            raise ValueError(f"expected <queue>=<workers> with queue one of {', '.join(QUEUE_URLS)}: {item}")
+        concurrency[name] = int(count)
+    return concurrency
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4, help="concurrent simulated users")
+    parser.add_argument("--jobs-per-user", type=int, default=3)
+    parser.add_argument("--durations", default=",".join(f"{d:g}" for d in DURATIONS),
+                        help="clip lengths, picked at random per job")
+    parser.add_argument("--profile", default="fast")
+    parser.add_argument("--audio", default="on", choices=("on", "off"))
+    parser.add_argument("--resolution", default="720p", help="background size from bench.py: 480p, 720p or 1080p")
+    parser.add_argument("--image", default="square", help="overlay image from bench.py: square, photo, tall or wide")
+    parser.add_argument("--upload", default="presign", choices=("presign", "direct"))
+    parser.add_argument("--renditions", default="", help="comma-separated extra renditions per job")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="worker Lambdas per queue")
+    parser.add_argument("--batch-size", type=int, default=1, help="SQS messages per worker invocation")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between status polls")
+    parser.add_argument("--long-poll", type=float, default=0.0,
+                        help="poll with ?wait=SECONDS and If-None-Match instead of sleeping")
+    parser.add_argument("--cache-hits", type=float, default=0.0,
+                        help="fraction of jobs reusing one image pair (render cache hits after the first)")
+    parser.add_argument("--no-mezzanine", action="store_true", help="skip transcoding the background's mezzanine")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="show the handlers' INFO logs")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "meme-clip-bench"),
+                        help="where generated inputs are kept between runs")
+    parser.add_argument("--output", default="loadtest-results.json")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95/throughput change (0.10 = 10%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    args = parser.parse_args(argv)
+
+    try:
+        concurrency = parse_concurrency(args.concurrency)
+    except ValueError as e:
+        parser.error(str(e))
+    durations = [min(d, 12.0) for d in parse_list(args.durations, float)]
+    args.renditions = ",".join(parse_list(args.renditions))
+    logging.basicConfig(format="%(asctime)s %(threadName)s %(levelname)s %(message)s")
+
+    run_dir = tempfile.mkdtemp(prefix="loadtest-")
+    try:
+        worker, api = load_handlers(run_dir)
+        # Both handlers set the root logger to INFO when imported
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+        from bench import IMAGES, RESOLUTIONS
+
+        if args.resolution not in RESOLUTIONS or args.image not in IMAGES:
+            parser.error(f"unknown --resolution or --image: {args.resolution}, {args.image}")
+        os.makedirs(args.workdir, exist_ok=True)
+        background = prepare_background(args.workdir, args.resolution, args.audio == "on")
+        total = max(1, args.users) * max(1, args.jobs_per_user)
+        print(f"Encoding {total} image pairs...")
+        variants = image_variants(args.workdir, args.image, 2 * total + 2)
+        shared_pair = variants[-2:]
+
+        s3 = MemoryS3()
+        install_s3(s3, worker, api)
+        with open(background, "rb") as f:
+            s3.put_object(Bucket=BUCKET, Key=BACKGROUND_KEY, Body=f.read(), ContentType="video/mp4")
+        if not args.no_mezzanine:
+            import mezzanine
+
+            print("Transcoding the background's mezzanine...")
+            mezzanine.transcode_object(s3, BUCKET, BACKGROUND_KEY)
+        s3.requests.clear()
+
+        rng = random.Random(args.seed)
+        run_id = uuid.uuid4().hex[:6]
+        counter = itertools.count()
+        plans = []
+        for user in range(max(1, args.users)):
+            jobs = []
+            for n in range(max(1, args.jobs_per_user)):
+                i = next(counter)
+                shared = rng.random() < args.cache_hits
+                jobs.append({
+                    "job_id": f"load-{run_id}-{user}-{n}",
+                    "duration_s": rng.choice(durations),
+                    "images": shared_pair if shared else variants[2 * i:2 * i + 2],
+                    "shared": shared,
+                })
+            plans.append(jobs)
+
+        from scheduling import memory_queue
+
+        stop = threading.Event()
+        received = {}
+        workers = [
+            threading.Thread(
+                target=drain_queue,
+                args=(worker, memory_queue, QUEUE_URLS[name], max(1, args.batch_size), stop, received),
+                name=f"{name}-{i}",
+                daemon=True,
+            )
+            for name, count in concurrency.items()
+            for i in range(count)
+        ]
+        records = []
+        users = [
+            threading.Thread(target=run_user, args=(api, s3, jobs, args, records), name=f"user-{u}")
+            for u, jobs in enumerate(plans)
+        ]
+        print(f"Running {total} jobs from {len(users)} users on "
+              + ", ".join(f"{n} {name}" for name, n in concurrency.items()) + " workers...")
+        started = time.perf_counter()
+        for t in workers + users:
+            t.start()
+        for t in users:
+            t.join()
+        wall_s = time.perf_counter() - started
+        stop.set()
+        for t in workers:
+            t.join()
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    summary, latency = summarize(records, received, wall_s)
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "users": args.users,
+            "jobs_per_user": args.jobs_per_user,
+            "durations": durations,
+            "profile": args.profile,
+            "audio": args.audio,
+            "resolution": args.resolution,
+            "image": args.image,
+            "upload": args.upload,
+            "renditions": args.renditions,
+            "concurrency": concurrency,
+            "batch_size": args.batch_size,
+            "poll_interval": args.poll_interval,
+            "long_poll": args.long_poll,
+            "cache_hits": args.cache_hits,
+            "mezzanine": not args.no_mezzanine,
+        },
+        "summary": summary,
+        "latency": latency,
+        "s3_requests": dict(s3.requests),
+        "jobs": sorted(
+            ({k: (round(v, 3) if isinstance(v, float) else v) for k, v in r.items() if k != "submitted"}
+             for r in records),
+            key=lambda r: r["job_id"],
+        ),
+    }
+    print_report(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {len(records)} jobs to {args.output}")
+
+    failed = summary["failed"] > 0
+    if args.baseline and args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} measurement(s) worse than baseline by more than {args.tolerance:.0%}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Render the same job with the moviepy and ffmpeg backends of lambda/prod and
+compare the output frames.
+
+Usage:
+    python parity.py background.mp4 image1.png image2.png [duration_seconds]
+
+Exits non-zero if any sampled frame differs by more than the PSNR threshold.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prod"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from moviepy.editor import VideoFileClip  # noqa: E402
+from handler import overlay_images_on_video  # noqa: E402
+
+MIN_PSNR_DB = 30.0
+SAMPLES = 5
+
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float("inf")
+    return 10 * np.log10(255.0 ** 2 / mse)
+
+
+def main(background_video, image1, image2, duration_seconds=3.0):
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        for backend in ("moviepy", "ffmpeg"):
+            outputs[backend] = os.path.join(tmp, f"{backend}.mp4")
+            print(f"Rendering with {backend}...")
+            overlay_images_on_video(
+                background_video,
+                image1,
+                image2,
+                outputs[backend],
+                include_audio=False,
+                duration_seconds=duration_seconds,
+                backend=backend,
+            )
+
+        ref = VideoFileClip(outputs["moviepy"])
+        alt = VideoFileClip(outputs["ffmpeg"])
+        ok = True
+        if ref.size != alt.size:
+            print(f"Size mismatch: moviepy={ref.size} ffmpeg={alt.size}")
+            ok = False
+        if abs(ref.duration - alt.duration) > 1.0 / (ref.fps or 24) + 0.05:
+            print(f"Duration mismatch: moviepy={ref.duration:.3f}s ffmpeg={alt.duration:.3f}s")
+            ok = False
+
+        if ok:
+            end = min(ref.duration, alt.duration)
+            for t in np.linspace(0, end, SAMPLES, endpoint=False):
+                score = psnr(ref.get_frame(t), alt.get_frame(t))
+                print(f"t={t:.2f}s PSNR={score:.1f} dB")
+                if score < MIN_PSNR_DB:
+                    ok = False
+
+        ref.close()
+        alt.close()
+
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print(__doc__)
+        sys.exit(2)
+    args = sys.argv[1:4]
+    duration = float(sys.argv[4]) if len(sys.argv) > 4 else 3.0
+    sys.exit(main(*args, duration_seconds=duration))
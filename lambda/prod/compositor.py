@@ -0,0 +1,153 @@
+"""Overlay layout and the pre-composited overlay plane used by the renderer.
+
+The two meme images never change over the length of a clip, so instead of
+letting moviepy resize, position and blend two ``ImageClip`` layers on every
+frame, they are rasterized once into a single RGBA plane covering only the
+region they occupy. Each background frame is then blended with that plane by
+one vectorized NumPy operation limited to the overlay bounding box.
+"""
+
+from typing import NamedTuple, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+Size = Tuple[int, int]
+Point = Tuple[int, int]
+
+# Each image fits in this fraction of the frame width, and both stacked in
+# this fraction of its height.
+MAX_IMAGE_WIDTH = 0.8
+MAX_STACK_HEIGHT = 0.9
+
+
+class OverlayLayout(NamedTuple):
+    """Scaled sizes and top-left positions of both images on the frame."""
+
+    frame_size: Size
+    image1_size: Size
+    image1_pos: Point
+    image2_size: Size
+    image2_pos: Point
+
+
+def compute_layout(frame_size: Size, image1_size: Size, image2_size: Size) -> OverlayLayout:
+    """Stack both images horizontally centred near the top of the frame.
+
+    Images are shrunk (never enlarged) by a common factor so that each fits in
+    80% of the frame width and both together fit in 90% of its height.
+    """
+    vw, vh = frame_size
+    i1w, i1h = image1_size
+    i2w, i2h = image2_size
+
+    max_w = int(vw * MAX_IMAGE_WIDTH)
+    s1 = max_w / i1w if i1w > max_w else 1.0
+    s2 = max_w / i2w if i2w > max_w else 1.0
+    scale = min(s1, s2)
+
+    i1w2, i1h2 = int(i1w * scale), int(i1h * scale)
+    i2w2, i2h2 = int(i2w * scale), int(i2h * scale)
+
+    total_h = i1h2 + i2h2
+    max_h = int(vh * MAX_STACK_HEIGHT)
+    if total_h > max_h:
+        hs = max_h / total_h
+        i1w2, i1h2 = int(i1w2 * hs), int(i1h2 * hs)
+        i2w2, i2h2 = int(i2w2 * hs), int(i2h2 * hs)
+
+    top_margin = max(int(vh * 0.06), 10)
+    vertical_gap = max(int(vh * 0.06), 24)
+    i1x = (vw - i1w2) // 2
+    i1y = top_margin
+    i2x = (vw - i2w2) // 2
+    i2y = i1y + i1h2 + vertical_gap
+
+    return OverlayLayout(
+        frame_size=(vw, vh),
+        image1_size=(i1w2, i1h2),
+        image1_pos=(i1x, i1y),
+        image2_size=(i2w2, i2h2),
+        image2_pos=(i2x, i2y),
+    )
+
+
+def max_image_size(frame_size: Size) -> Size:
+    """Largest size compute_layout can give a single image on this frame."""
+    return int(frame_size[0] * MAX_IMAGE_WIDTH), int(frame_size[1] * MAX_STACK_HEIGHT)
+
+
+class OverlayPlane:
+    """Both overlay images rasterized once into an RGBA plane.
+
+    ``bbox`` is ``(x0, y0, x1, y1)`` in frame coordinates, already clipped to
+    the frame. ``rgb`` and ``alpha`` cover exactly that box.
+    """
+
+    def __init__(self, rgb: np.ndarray, alpha: np.ndarray, bbox: Tuple[int, int, int, int]):
+        self.bbox = bbox
+        self.rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+        self.alpha = np.ascontiguousarray(alpha, dtype=np.uint8)
+        # Fully opaque/transparent pixels (the common case for photos and
+        # screenshots) reduce blending to a masked copy.
+        self.binary = bool(np.all((self.alpha == 0) | (self.alpha == 255)))
+        self._mask = (self.alpha > 0)[..., None]
+        if not self.binary:
+            a = self.alpha.astype(np.float32)[..., None] / 255.0
+            self._inv_alpha = 1.0 - a
+            self._premultiplied = self.rgb.astype(np.float32) * a
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """Blend the plane onto ``frame`` and return the composited frame."""
+        x0, y0, x1, y1 = self.bbox
+        if x1 <= x0 or y1 <= y0:
+            return frame
+        out = frame if frame.flags.writeable else frame.copy()
+        region = out[y0:y1, x0:x1]
+        if self.binary:
+            np.copyto(region, self.rgb, where=self._mask)
+        else:
+            blended = region * self._inv_alpha
+            blended += self._premultiplied
+            np.copyto(region, blended, casting="unsafe")
+        return out
+
+
+ImageSource = Union[str, Image.Image]
+
+
+def _as_rgba(source: ImageSource, size: Size) -> Image.Image:
+    img = Image.open(source) if isinstance(source, str) else source
+    img = img.convert("RGBA")
+    if img.size != tuple(size):
+        img = img.resize(tuple(size), Image.Resampling.LANCZOS)
+    return img
+
+
+def build_overlay_plane(layout: OverlayLayout, image1: ImageSource, image2: ImageSource) -> OverlayPlane:
+    """Rasterize both images at their layout size and position into one plane."""
+    vw, vh = layout.frame_size
+    (i1w, i1h), (i1x, i1y) = layout.image1_size, layout.image1_pos
+    (i2w, i2h), (i2x, i2y) = layout.image2_size, layout.image2_pos
+
+    x0 = max(min(i1x, i2x), 0)
+    y0 = max(min(i1y, i2y), 0)
+    x1 = min(max(i1x + i1w, i2x + i2w), vw)
+    y1 = min(max(i1y + i1h, i2y + i2h), vh)
+    if x1 <= x0 or y1 <= y0:
+        empty = np.zeros((0, 0), dtype=np.uint8)
+        return OverlayPlane(np.zeros((0, 0, 3), dtype=np.uint8), empty, (0, 0, 0, 0))
+
+    canvas = Image.new("RGBA", (x1 - x0, y1 - y0), (0, 0, 0, 0))
+    for source, size, (x, y) in (
+        (image1, (i1w, i1h), (i1x, i1y)),
+        (image2, (i2w, i2h), (i2x, i2y)),
+    ):
+        if size[0] <= 0 or size[1] <= 0:
+            continue
+        layer = Image.new("RGBA", canvas.size, (0, 0, 0, 0))
+        layer.paste(_as_rgba(source, size), (x - x0, y - y0))
+        canvas = Image.alpha_composite(canvas, layer)
+
+    arr = np.asarray(canvas)
+    return OverlayPlane(arr[..., :3], arr[..., 3], (x0, y0, x1, y1))
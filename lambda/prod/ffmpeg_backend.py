@@ -0,0 +1,316 @@
+"""Native ffmpeg render backend and the shared encoder invocation.
+
+Turns the overlay layout into a single ``ffmpeg -filter_complex`` invocation,
+so frames are decoded, scaled, overlaid and encoded entirely inside ffmpeg and
+never pass through Python. The moviepy path in ``handler.py`` remains the
+reference implementation; it composites in Python and pipes frames into
+``encode_frames``. Both paths stream-copy compatible background audio.
+"""
+
+import logging
+import os
+import subprocess
+import tempfile
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import imageio_ffmpeg
+import numpy as np
+
+from compositor import OverlayLayout, compute_layout
+from ingest import FFMPEG_UNSUPPORTED, image_orientation, ingest_to_file, layout_size, open_image
+from profiles import EncodingProfile, encoder_threads, get_profile, output_size
+from s3stream import FRAGMENTED_MP4_FLAGS
+
+logger = logging.getLogger()
+
+# Source audio codecs copied into the MP4 output as-is; anything else is
+# re-encoded to AAC by ffmpeg.
+PASSTHROUGH_AUDIO_CODECS = ("aac",)
+
+# Called with (frames_done, frames_total) while encoding
+ProgressCallback = Callable[[int, int], None]
+
+
+def probe_video(path: str) -> Dict[str, Any]:
+    """Return ffmpeg's stream metadata (size, fps, duration, codecs) for a file."""
+    frames = imageio_ffmpeg.read_frames(path)
+    try:
+        return next(frames)
+    finally:
+        frames.close()
+
+
+def audio_args(meta: Dict[str, Any], input_index: int) -> List[str]:
+    """Map the first audio stream of an input, stream-copied when compatible.
+
+    meta is probe_video output for that input; returns ["-an"] if it has no
+    audio.
+    """
+    codec = (meta.get("audio_codec") or "").split(" ")[0]
+    if not codec:
+        return ["-an"]
+    action = "copy" if codec in PASSTHROUGH_AUDIO_CODECS else "aac"
+    if action != "copy":
+        logger.info("Source audio is %s; re-encoding to AAC", codec)
+    return ["-map", f"{input_index}:a:0", "-c:a", action]
+
+
+def video_args(profile: EncodingProfile, threads: int, trim_end: float, fragmented: bool) -> List[str]:
+    """libx264 encoder and muxer arguments shared by both render paths."""
+    args = [
+        "-t", f"{trim_end:.3f}",
+        "-c:v", "libx264",
+        "-preset", profile.preset,
+        "-crf", str(profile.crf),
+        "-threads", str(threads),
+        "-pix_fmt", "yuv420p",
+    ]
+    if fragmented:
+        args += FRAGMENTED_MP4_FLAGS + ["-f", "mp4"]
+    return args
+
+
+def run_ffmpeg(cmd: List[str], on_progress: Optional[ProgressCallback] = None, frames_total: int = 0) -> None:
+    """Run ffmpeg to completion, reporting encoded frames from -progress output."""
+    logger.info("Running ffmpeg: %s", " ".join(cmd))
+    if on_progress is None:
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        _check(proc.returncode, proc.stderr)
+        return
+
+    cmd = cmd[:1] + ["-nostats", "-progress", "pipe:1"] + cmd[1:]
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+        for line in proc.stdout:
+            if line.startswith(b"frame="):
+                try:
+                    on_progress(int(line[6:]), frames_total)
+                except ValueError:
+                    pass
+        proc.wait()
+        err.seek(0)
+        _check(proc.returncode, err.read())
+
+
+def _check(returncode: int, stderr: bytes) -> None:
+    if returncode != 0:
+        message = stderr.decode("utf-8", "replace").strip()
+        logger.error("ffmpeg exited with %s: %s", returncode, message)
+        raise RuntimeError(f"ffmpeg render failed ({returncode}): {message[-500:]}")
+
+
+def encoder_command(
+    frame_size: Tuple[int, int],
+    fps: float,
+    output_path: str,
+    trim_end: float,
+    audio_source: Optional[str] = None,
+    profile: Optional[EncodingProfile] = None,
+    threads: int = 2,
+    fragmented: bool = False,
+) -> List[str]:
+    """ffmpeg command encoding RGB24 frames from stdin, muxing audio from audio_source.
+
+    The audio track of audio_source (trimmed to trim_end) is stream-copied
+    when its codec fits MP4, so it is never decoded in Python nor staged in a
+    temp file.
+    """
+    profile = profile or get_profile()
+    w, h = frame_size
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-y",
+        "-loglevel", "error",
+        "-f", "rawvideo",
+        "-pix_fmt", "rgb24",
+        "-s", f"{w}x{h}",
+        "-r", f"{fps}",
+        "-i", "-",
+    ]
+    if audio_source:
+        cmd += ["-t", f"{trim_end:.3f}", "-i", audio_source, "-map", "0:v"]
+        cmd += audio_args(probe_video(audio_source), 1)
+    else:
+        cmd += ["-an"]
+    out_w, out_h = output_size(profile, frame_size)
+    if (out_w, out_h) != (w, h):
+        # Downscale inside the encoder process rather than per frame in Python
+        cmd += ["-vf", f"scale={out_w}:{out_h}"]
+    cmd += video_args(profile, threads, trim_end, fragmented)
+    cmd.append(output_path)
+    return cmd
+
+
+class FrameEncoder:
+    """A running ffmpeg encoder fed one RGB24 frame at a time."""
+
+    def __init__(self, cmd: List[str]):
+        logger.info("Encoding frames with ffmpeg: %s", " ".join(cmd))
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self._stderr = b""
+
+    def write(self, frame: np.ndarray) -> bool:
+        """Send one frame; False once ffmpeg has stopped reading."""
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8))
+            return True
+        except BrokenPipeError:
+            return False
+
+    def finish(self) -> None:
+        """Close the input and wait for ffmpeg to exit."""
+        if self._proc.stdin.closed:
+            return
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._stderr = self._proc.stderr.read()
+        self._proc.wait()
+
+    def check(self) -> None:
+        """Raise if ffmpeg failed; call after finish()."""
+        _check(self._proc.returncode, self._stderr)
+
+
+def encode_frames(
+    frames: Iterable[np.ndarray],
+    frame_size: Tuple[int, int],
+    fps: float,
+    output_path: str,
+    trim_end: float,
+    audio_source: Optional[str] = None,
+    profile: Optional[EncodingProfile] = None,
+    threads: int = 2,
+    fragmented: bool = False,
+    on_progress: Optional[ProgressCallback] = None,
+) -> None:
+    """Encode RGB24 frames piped from Python, muxing audio from audio_source
+    (see encoder_command)."""
+    encoder = FrameEncoder(
+        encoder_command(frame_size, fps, output_path, trim_end, audio_source, profile, threads, fragmented)
+    )
+    frames_total = int(trim_end * fps)
+    try:
+        for done, frame in enumerate(frames, 1):
+            if not encoder.write(frame):
+                break
+            if on_progress is not None:
+                on_progress(done, frames_total)
+    finally:
+        encoder.finish()
+    encoder.check()
+
+
+def build_filter_graph(layout: OverlayLayout, out_size: Optional[Tuple[int, int]] = None) -> str:
+    """Scale both images once and overlay them on the background stream.
+
+    out_size, when it differs from the frame size, downscales the composite.
+    """
+    (i1w, i1h), (i1x, i1y) = layout.image1_size, layout.image1_pos
+    (i2w, i2h), (i2x, i2y) = layout.image2_size, layout.image2_pos
+    final = "format=yuv420p"
+    if out_size and tuple(out_size) != tuple(layout.frame_size):
+        final = f"scale={out_size[0]}:{out_size[1]}," + final
+    return ";".join([
+        f"[1:v]scale={i1w}:{i1h}:flags=lanczos,format=rgba[img1]",
+        f"[2:v]scale={i2w}:{i2h}:flags=lanczos,format=rgba[img2]",
+        f"[0:v][img1]overlay={i1x}:{i1y}:format=auto[tmp]",
+        f"[tmp][img2]overlay={i2x}:{i2y}:format=auto,{final}[out]",
+    ])
+
+
+def build_command(
+    background_video_path: str,
+    image1_path: str,
+    image2_path: str,
+    output_path: str,
+    layout: OverlayLayout,
+    trim_end: float,
+    meta: Dict[str, Any],
+    include_audio: bool = True,
+    profile: Optional[EncodingProfile] = None,
+    threads: int = 2,
+    fragmented: bool = False,
+) -> List[str]:
+    """Assemble the ffmpeg argument list for one render.
+
+    meta is probe_video output for the background.
+    """
+    profile = profile or get_profile()
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-y",
+        "-loglevel", "error",
+        "-t", f"{trim_end:.3f}",
+        "-i", background_video_path,
+        # Images are single frames: overlay repeats the last frame, so they
+        # are decoded and scaled exactly once.
+        "-i", image1_path,
+        "-i", image2_path,
+        "-filter_complex", build_filter_graph(layout, output_size(profile, layout.frame_size)),
+        "-map", "[out]",
+    ]
+    cmd += audio_args(meta, 0) if include_audio else ["-an"]
+    cmd += video_args(profile, threads, trim_end, fragmented)
+    cmd.append(output_path)
+    return cmd
+
+
+def _prepare_image(path: str, img, target_size: Tuple[int, int], out_path: str) -> str:
+    """Pre-shrink images ffmpeg cannot decode, would decode at far more
+    pixels than needed, or would not turn upright, into a small PNG at
+    out_path; returns the path ffmpeg should read."""
+    oversized = img.size[0] >= 2 * target_size[0] and img.size[1] >= 2 * target_size[1]
+    if (
+        not oversized
+        and image_orientation(img) == 1
+        and os.path.splitext(path)[1].lower() not in FFMPEG_UNSUPPORTED
+    ):
+        return path
+    return ingest_to_file(path, target_size, out_path)
+
+
+def render_with_ffmpeg(
+    background_video_path: str,
+    image1_path: str,
+    image2_path: str,
+    output_path: str,
+    include_audio: bool = True,
+    duration_seconds: float = 6.0,
+    fragmented: bool = False,
+    profile: Optional[EncodingProfile] = None,
+    cpus: Optional[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> None:
+    """ffmpeg counterpart of ``handler.overlay_images_on_video``.
+
+    duration_seconds must already be clamped by the caller. fragmented writes
+    a fragmented MP4, which can go to a non-seekable output such as a FIFO.
+    """
+    profile = profile or get_profile()
+    meta = probe_video(background_video_path)
+    trim_end = min(duration_seconds, meta.get("duration") or duration_seconds)
+
+    # Prepared images live beside the output (in the job workspace), never
+    # next to the caller's inputs.
+    with tempfile.TemporaryDirectory(prefix="ffmpeg-", dir=os.path.dirname(os.path.abspath(output_path))) as tmp:
+        with open_image(image1_path) as img1, open_image(image2_path) as img2:
+            layout = compute_layout(meta["size"], layout_size(img1), layout_size(img2))
+            image1_path = _prepare_image(image1_path, img1, layout.image1_size, os.path.join(tmp, "image1.png"))
+            image2_path = _prepare_image(image2_path, img2, layout.image2_size, os.path.join(tmp, "image2.png"))
+
+        cmd = build_command(
+            background_video_path,
+            image1_path,
+            image2_path,
+            output_path,
+            layout,
+            trim_end,
+            meta,
+            include_audio=include_audio,
+            profile=profile,
+            threads=encoder_threads(profile, cpus),
+            fragmented=fragmented,
+        )
+        run_ffmpeg(cmd, on_progress, int(trim_end * (meta.get("fps") or 24)))
@@ -0,0 +1,142 @@
+"""Pre-decoded, memory-mapped background frames.
+
+For the few backgrounds used by most jobs, decoding H.264 on every render is a
+fixed cost repeated for nothing. The first ``MAX_SECONDS`` of such a video are
+decoded once into a raw RGB24 frame file in ``/tmp`` with a small JSON index
+(frame count, fps, size). Renders then read frames straight out of a read-only
+``np.memmap`` without decoding anything.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import imageio_ffmpeg
+import numpy as np
+
+logger = logging.getLogger()
+
+# Matches the duration cap enforced by overlay_images_on_video.
+MAX_SECONDS = 12.0
+
+
+class StoredFrames:
+    """A decoded background: ``frames`` is an (n, h, w, 3) uint8 memmap."""
+
+    def __init__(self, frames: np.ndarray, fps: float, size: Tuple[int, int], has_audio: bool):
+        self.frames = frames
+        self.fps = fps
+        self.size = size
+        self.has_audio = has_audio
+
+    @property
+    def duration(self) -> float:
+        return len(self.frames) / self.fps
+
+    def get_frame(self, t: float) -> np.ndarray:
+        """Frame shown at time t, as a read-only view into the mmap."""
+        i = int(t * self.fps + 1e-6)
+        return self.frames[max(0, min(i, len(self.frames) - 1))]
+
+    def to_clip(self):
+        """Wrap the frames in a moviepy VideoClip (without audio)."""
+        from moviepy.video.VideoClip import VideoClip
+
+        return VideoClip(self.get_frame, duration=self.duration).set_fps(self.fps)
+
+
+class FrameStore:
+    """LRU store of decoded backgrounds under a local directory."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, video_path: str) -> Optional[StoredFrames]:
+        """Return decoded frames for video_path, decoding it on first use.
+
+        Returns None when the decoded frames would not fit the store's budget.
+        """
+        store_id = self._store_id(video_path)
+        with self._lock:
+            stored = self._entries.get(store_id)
+            if stored is not None:
+                self._entries.move_to_end(store_id)
+                logger.info("Frame store hit for %s", video_path)
+                return stored
+            stored = self._decode(video_path, store_id)
+            if stored is not None:
+                self._entries[store_id] = stored
+                self._evict(keep=store_id)
+            return stored
+
+    def _store_id(self, video_path: str) -> str:
+        st = os.stat(video_path)
+        ident = f"{os.path.realpath(video_path)}:{st.st_size}:{st.st_mtime_ns}"
+        return hashlib.sha256(ident.encode("utf-8")).hexdigest()[:32]
+
+    def _paths(self, store_id: str) -> Tuple[str, str]:
+        base = os.path.join(self.root, store_id)
+        return base + ".rgb", base + ".json"
+
+    def _decode(self, video_path: str, store_id: str) -> Optional[StoredFrames]:
+        data_path, index_path = self._paths(store_id)
+        frames = imageio_ffmpeg.read_frames(video_path, pix_fmt="rgb24", input_params=["-t", str(MAX_SECONDS)])
+        meta = next(frames)
+        w, h = meta["size"]
+        fps = float(meta.get("fps") or 24)
+        estimate = int(min(meta.get("duration") or MAX_SECONDS, MAX_SECONDS) * fps + 1) * w * h * 3
+        if estimate > self.max_bytes:
+            frames.close()
+            logger.info("Not storing frames for %s: ~%d bytes exceeds budget %d", video_path, estimate, self.max_bytes)
+            return None
+
+        logger.info("Decoding %s into frame store (%dx%d @ %.2f fps)", video_path, w, h, fps)
+        count = 0
+        try:
+            with open(data_path + ".part", "wb") as f:
+                for frame in frames:
+                    f.write(frame)
+                    count += 1
+            os.replace(data_path + ".part", data_path)
+        finally:
+            frames.close()
+            if os.path.exists(data_path + ".part"):
+                os.remove(data_path + ".part")
+
+        if count == 0:
+            os.remove(data_path)
+            return None
+        index = {"frames": count, "fps": fps, "width": w, "height": h, "has_audio": bool(meta.get("audio_codec"))}
+        with open(index_path, "w") as f:
+            json.dump(index, f)
+        return self._open(data_path, index)
+
+    def _open(self, data_path: str, index: dict) -> StoredFrames:
+        shape = (index["frames"], index["height"], index["width"], 3)
+        frames = np.memmap(data_path, dtype=np.uint8, mode="r", shape=shape)
+        return StoredFrames(frames, index["fps"], (index["width"], index["height"]), index["has_audio"])
+
+    def _evict(self, keep: str) -> None:
+        def total():
+            return sum(s.frames.nbytes for s in self._entries.values())
+
+        while total() > self.max_bytes:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._entries.pop(oldest)
+            for p in self._paths(oldest):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
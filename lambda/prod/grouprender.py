@@ -0,0 +1,253 @@
+"""Render many image pairs over a single decode of a shared background.
+
+Campaign batches put dozens of image pairs on the same background, duration
+and profile. Rendering them as separate jobs decodes the background once per
+pair. Here each background frame is decoded once and handed to one thread
+per output, which blends that output's overlay plane onto a copy of the
+frame and feeds it to the output's own ffmpeg encoder. The encoders run in
+parallel, up to ``MAX_GROUP_ENCODERS`` at a time; larger groups are rendered
+in chunks of that size, one background decode per chunk.
+
+``render_renditions`` uses the same fan-out for one image pair: each frame is
+decoded and composited once, then encoded at every requested size (see
+renditions.py) in parallel.
+"""
+
+import logging
+import math
+import os
+import queue
+import threading
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import imageio_ffmpeg
+import numpy as np
+
+from compositor import OverlayPlane, build_overlay_plane, compute_layout
+from ffmpeg_backend import FrameEncoder, ProgressCallback, encoder_command
+from framestore import StoredFrames
+from ingest import ingest_image, layout_size, open_image
+from profiles import available_cpus, get_profile, output_size
+from renditions import Rendition, rendition_command, rendition_size
+
+logger = logging.getLogger()
+
+# Encoders alive at once; each holds its own x264 lookahead buffers.
+MAX_GROUP_ENCODERS = int(os.environ.get("MAX_GROUP_ENCODERS", "8"))
+
+# Frames buffered per output between the decoder and that output's encoder
+QUEUE_DEPTH = 2
+
+
+class GroupMember(NamedTuple):
+    image1_path: str
+    image2_path: str
+    output_path: str
+
+
+def _overlay_plane(member: GroupMember, frame_size) -> OverlayPlane:
+    with open_image(member.image1_path) as img1, open_image(member.image2_path) as img2:
+        layout = compute_layout(frame_size, layout_size(img1), layout_size(img2))
+        return build_overlay_plane(
+            layout,
+            ingest_image(img1, layout.image1_size).image,
+            ingest_image(img2, layout.image2_size).image,
+        )
+
+
+def _background_frames(background_video_path: str, background_frames: Optional[StoredFrames], trim_end: float):
+    """Iterate (h, w, 3) uint8 background frames covering trim_end seconds."""
+    if background_frames is not None:
+        for i in range(min(len(background_frames.frames), math.ceil(trim_end * background_frames.fps))):
+            yield background_frames.frames[i]
+        return
+    reader = imageio_ffmpeg.read_frames(
+        background_video_path, pix_fmt="rgb24", input_params=["-t", f"{trim_end:.3f}"]
+    )
+    try:
+        meta = next(reader)
+        w, h = meta["size"]
+        for raw in reader:
+            yield np.frombuffer(raw, dtype=np.uint8).reshape(h, w, 3)
+    finally:
+        reader.close()
+
+
+def _probe(background_video_path: str, background_frames: Optional[StoredFrames]):
+    """(fps, (w, h), duration) of the background."""
+    if background_frames is not None:
+        return background_frames.fps, tuple(background_frames.size), background_frames.duration
+    reader = imageio_ffmpeg.read_frames(background_video_path)
+    try:
+        meta = next(reader)
+    finally:
+        reader.close()
+    return meta.get("fps") or 24, tuple(meta["size"]), meta.get("duration")
+
+
+def _feed(encoder: FrameEncoder, plane: Optional[OverlayPlane], frames: "queue.Queue", errors: list, index: int) -> None:
+    """Thread body: composite each queued frame for one output (unless plane
+    is None: already composited) and encode it."""
+    writing = True
+    while True:
+        frame = frames.get()
+        if frame is None:
+            return
+        if not writing:
+            # Keep draining after a failure so the decoder never blocks.
+            continue
+        try:
+            writing = encoder.write(plane.apply(frame.copy()) if plane is not None else frame)
+        except Exception as e:
+            logger.warning("Compositing failed for output %d", index, exc_info=True)
+            errors[index] = e
+            writing = False
+
+
+def render_group(
+    background_video_path: str,
+    members: List[GroupMember],
+    include_audio: bool = True,
+    duration_seconds: float = 6.0,
+    profile: Optional[str] = None,
+    cpus: Optional[int] = None,
+    background_frames: Optional[StoredFrames] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[Optional[Exception]]:
+    """Render every member over the same background, sharing its decode.
+
+    Returns one entry per member: None on success or the exception that
+    failed it, so a bad image does not fail the rest of the group.
+    on_progress receives (frames_done, frames_total) summed over all members.
+    """
+    encoding = get_profile(profile)
+    duration_seconds = max(0.1, min(float(duration_seconds or 6.0), 12.0))
+    fps, frame_size, bg_duration = _probe(background_video_path, background_frames)
+    trim_end = min(duration_seconds, bg_duration or duration_seconds)
+    cpus = cpus or available_cpus()
+
+    errors: List[Optional[Exception]] = [None] * len(members)
+    planes = {}
+    for i, member in enumerate(members):
+        try:
+            planes[i] = _overlay_plane(member, frame_size)
+        except Exception as e:
+            logger.warning("Could not prepare overlay for %s", member.output_path, exc_info=True)
+            errors[i] = e
+
+    ready = [i for i in range(len(members)) if errors[i] is None]
+    frames_total = math.ceil(trim_end * fps) * len(ready)
+    frames_done = 0
+    for start in range(0, len(ready), MAX_GROUP_ENCODERS):
+        chunk = ready[start:start + MAX_GROUP_ENCODERS]
+        threads = max(1, cpus // len(chunk))
+        logger.info("Rendering %d outputs over one decode of %s", len(chunk), background_video_path)
+
+        encoders, queues, feeders = {}, {}, {}
+        try:
+            for i in chunk:
+                encoders[i] = FrameEncoder(encoder_command(
+                    frame_size, fps, members[i].output_path, trim_end,
+                    audio_source=(background_video_path if include_audio else None),
+                    profile=encoding, threads=threads,
+                ))
+                queues[i] = queue.Queue(maxsize=QUEUE_DEPTH)
+                feeders[i] = threading.Thread(
+                    target=_feed, args=(encoders[i], planes[i], queues[i], errors, i), daemon=True
+                )
+                feeders[i].start()
+
+            for frame in _background_frames(background_video_path, background_frames, trim_end):
+                for i in chunk:
+                    queues[i].put(frame)
+                frames_done += len(chunk)
+                if on_progress is not None:
+                    on_progress(frames_done, frames_total)
+        finally:
+            for i in chunk:
+                if i in queues:
+                    queues[i].put(None)
+            for i, feeder in feeders.items():
+                feeder.join()
+            for i, encoder in encoders.items():
+                encoder.finish()
+
+        for i in chunk:
+            try:
+                encoders[i].check()
+            except Exception as e:
+                errors[i] = errors[i] or e
+    return errors
+
+
+def render_renditions(
+    background_video_path: str,
+    image1_path: str,
+    image2_path: str,
+    output_path: str,
+    renditions: Sequence[Tuple[Rendition, str]],
+    include_audio: bool = True,
+    duration_seconds: float = 6.0,
+    profile: Optional[str] = None,
+    cpus: Optional[int] = None,
+    background_frames: Optional[StoredFrames] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[Optional[Exception]]:
+    """Render the main output and every (rendition, path) from one decode and
+    composite of each frame.
+
+    The vCPUs are split between the encoders by output pixel count. Raises if
+    the main output fails; returns one entry per rendition, None on success
+    or the exception that failed it.
+    """
+    encoding = get_profile(profile)
+    duration_seconds = max(0.1, min(float(duration_seconds or 6.0), 12.0))
+    fps, frame_size, bg_duration = _probe(background_video_path, background_frames)
+    trim_end = min(duration_seconds, bg_duration or duration_seconds)
+    cpus = cpus or available_cpus()
+    audio_source = background_video_path if include_audio else None
+    plane = _overlay_plane(GroupMember(image1_path, image2_path, output_path), frame_size)
+
+    sizes = [output_size(encoding, frame_size)] + [rendition_size(r, frame_size) for r, _ in renditions]
+    pixels = [w * h for w, h in sizes]
+    threads = [max(1, round(cpus * p / sum(pixels))) for p in pixels]
+    commands = [encoder_command(frame_size, fps, output_path, trim_end, audio_source, encoding, threads[0])]
+    commands += [
+        rendition_command(r, frame_size, fps, path, trim_end, audio_source, threads[i])
+        for i, (r, path) in enumerate(renditions, 1)
+    ]
+    logger.info("Rendering %s and %d renditions over one composite", output_path, len(renditions))
+
+    errors: List[Optional[Exception]] = [None] * len(commands)
+    frames_total = math.ceil(trim_end * fps)
+    encoders, queues, feeders = [], [], []
+    try:
+        for i, cmd in enumerate(commands):
+            encoders.append(FrameEncoder(cmd))
+            queues.append(queue.Queue(maxsize=QUEUE_DEPTH))
+            feeders.append(threading.Thread(target=_feed, args=(encoders[i], None, queues[i], errors, i), daemon=True))
+            feeders[i].start()
+
+        for done, frame in enumerate(_background_frames(background_video_path, background_frames, trim_end), 1):
+            # Encoders only read the composited frame, so they share it.
+            composited = plane.apply(frame)
+            for q in queues:
+                q.put(composited)
+            if on_progress is not None:
+                on_progress(done, frames_total)
+    finally:
+        for q in queues:
+            q.put(None)
+        for feeder in feeders:
+            feeder.join()
+        for encoder in encoders:
+            encoder.finish()
+
+    for i, encoder in enumerate(encoders):
+        try:
+            encoder.check()
+        except Exception as e:
+            errors[i] = errors[i] or e
+    if errors[0] is not None:
+        raise errors[0]
+    return errors[1:]
@@ -1,15 +1,119 @@
-from moviepy.editor import VideoFileClip, ImageClip, CompositeVideoClip
-from PIL import Image
+from PIL import Image, ImageOps
+from compositor import build_overlay_plane, compute_layout
+from ffmpeg_backend import ProgressCallback, encode_frames, render_with_ffmpeg
+from framestore import FrameStore, StoredFrames
+from grouprender import MAX_GROUP_ENCODERS, GroupMember, render_group, render_renditions
+from ingest import (
+    NORMALIZED_PREFIX,
+    NORMALIZED_SUFFIX,
+    image_orientation,
+    ingest_image,
+    layout_size,
+    normalized_key,
+    open_image,
+)
+from jobstate import JobReporter, job_store_from_env
+from metrics import JobMetrics
+from mezzanine import MEZZANINE_PREFIX, mezzanine_key, mezzanine_serves
+from preview import render_poster, render_preview_clip
+from profiles import available_cpus, encoder_threads, get_profile
+from rendercache import (
+    DIGEST_METADATA,
+    MESSAGE_ID_METADATA,
+    RENDER_CACHE_ENABLED,
+    output_metadata,
+    render_cache_key,
+    serve_from_cache,
+    store_in_cache,
+)
+from renditions import get_rendition, rendition_key
+from s3cache import S3FileCache
+from s3stream import StreamingUpload
+from scheduling import cpu_share, message_cost
+from segmented import RENDER_SEGMENTS, render_segmented, segment_count
+from workspace import JobWorkspace
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import os
 import json
 import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from typing import Dict, List, Optional, Tuple, Union
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-s3 = boto3.client('s3')
+# Input transfers run concurrently, so allow more pooled connections than the
+# default 10 (download_file itself fans out over several).
+S3_CONFIG = Config(max_pool_connections=32)
+s3 = boto3.client('s3', config=S3_CONFIG)
+
+# "plane" blends a pre-rasterized overlay onto each frame; "layered" is the
+# original moviepy CompositeVideoClip path, kept as a reference.
+COMPOSITOR = os.environ.get("COMPOSITOR", "plane")
+
+# "moviepy" renders through Python frame by frame; "ffmpeg" runs the whole
+# composite as one native ffmpeg filter graph. Jobs may override per message.
+RENDER_BACKEND = os.environ.get("RENDER_BACKEND", "moviepy")
+RENDER_BACKENDS = ("moviepy", "ffmpeg")
+
+# Background videos are kept in /tmp across warm invocations, keyed by ETag.
+background_cache = S3FileCache(
+    s3,
+    root=os.environ.get("BACKGROUND_CACHE_DIR", "/tmp/background-cache"),
+    max_bytes=int(float(os.environ.get("BACKGROUND_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    revalidate_after=float(os.environ.get("BACKGROUND_CACHE_REVALIDATE_SECONDS", "60")),
+)
+
+# Backgrounds without a mezzanine yet, with when that was last checked, so
+# each warm container asks S3 again only after the revalidation interval.
+missing_mezzanines: Dict[Tuple[str, str], float] = {}
+
+# SQS batches render this many records at once in separate processes.
+MAX_PARALLEL_JOBS = int(os.environ.get("MAX_PARALLEL_JOBS", "0")) or available_cpus()
+
+# vCPUs one job's encoder may use; run_jobs splits them between parallel jobs.
+job_cpus = available_cpus()
+
+# "file" encodes to the workspace then uploads; "stream" pipes a fragmented
+# MP4 from the encoder straight into an S3 multipart upload as it encodes.
+OUTPUT_MODE = os.environ.get("OUTPUT_MODE", "file")
+
+# Stage transitions and encoder progress for the API's status endpoint
+job_store = job_store_from_env()
+
+# SQS moves a message to the dead-letter queue once it has been received this
+# many times (the queues' redrive maxReceiveCount); until then a failed job is
+# recorded as "retrying", not "failed".
+MAX_RECEIVE_COUNT = int(os.environ.get("MAX_RECEIVE_COUNT", "3"))
+
+# "poster" publishes the first composited frame before the full render starts,
+# "clip" also a low-fps, low-resolution preview clip rendered alongside it,
+# "off" neither. Both land under PREVIEW_PREFIX in the output bucket.
+PREVIEW_MODE = os.environ.get("PREVIEW", "poster")
+PREVIEW_PREFIX = os.environ.get("PREVIEW_PREFIX", "previews/")
+POSTER_FORMAT = os.environ.get("POSTER_FORMAT", "jpeg")
+POSTER_TYPES = {"jpeg": (".jpg", "image/jpeg"), "webp": (".webp", "image/webp")}
+
+# Each job renders in its own directory under SCRATCH_DIR, and is refused up
+# front unless JOB_SCRATCH_MB of space is free there.
+SCRATCH_DIR = os.environ.get("SCRATCH_DIR", "/tmp")
+JOB_SCRATCH_BYTES = int(float(os.environ.get("JOB_SCRATCH_MB", "128")) * 1024 * 1024)
+
+# Heavily used backgrounds (comma-separated S3 keys) are decoded once per warm
+# container into raw memory-mapped frames instead of on every render.
+FRAME_STORE_BACKGROUNDS = {
+    k.strip() for k in os.environ.get("FRAME_STORE_BACKGROUNDS", "").split(",") if k.strip()
+}
+frame_store = FrameStore(
+    root=os.environ.get("FRAME_STORE_DIR", "/tmp/frame-store"),
+    max_bytes=int(float(os.environ.get("FRAME_STORE_MAX_MB", "2048")) * 1024 * 1024),
+)
 
 # Pillow 10 compatibility: restore Image.ANTIALIAS for libraries expecting it
 if not hasattr(Image, "ANTIALIAS"):
@@ -26,121 +130,399 @@ def overlay_images_on_video(
     output_path: str,
     include_audio: bool = True,
     duration_seconds: float = 6.0,
+    compositor: Optional[str] = None,
+    backend: Optional[str] = None,
+    background_frames: Optional[StoredFrames] = None,
+    fragmented: bool = False,
+    profile: Optional[str] = None,
+    cpus: Optional[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    metrics: Optional[JobMetrics] = None,
+    segments: Optional[Union[int, str]] = None,
 ) -> None:
     """Compose two images on top of a background video and export a short clip.
 
-    duration_seconds is capped to 12 seconds.
+    duration_seconds is capped to 12 seconds. compositor is "plane" or
+    "layered" and defaults to the COMPOSITOR environment variable; backend is
+    one of RENDER_BACKENDS and defaults to RENDER_BACKEND. background_frames,
+    when given, supplies pre-decoded frames of background_video_path to the
+    moviepy backend so the video is not decoded again. fragmented writes a
+    fragmented MP4 so output_path may be a FIFO (see StreamingUpload).
+    profile names an encoding profile (see profiles.PROFILES); the encoder
+    uses up to cpus threads unless the profile fixes its own count.
+    on_progress is called with (frames_done, frames_total) while encoding.
+    Stage timings are recorded in metrics when given. segments ("auto" or a
+    count, default RENDER_SEGMENTS) splits a plane-compositor render into
+    time slices rendered in parallel processes (see segmented.py).
     """
+    compositor = compositor or COMPOSITOR
+    encoding = get_profile(profile)
+    backend = backend or RENDER_BACKEND
+    if backend not in RENDER_BACKENDS:
+        raise ValueError(f"Unknown render backend: {backend}")
     if duration_seconds is None:
         duration_seconds = 6.0
     duration_seconds = max(0.1, min(float(duration_seconds), 12.0))
+    metrics = metrics or JobMetrics(track_rss=False)
+
+    if backend == "ffmpeg":
+        # Decode, composite and encode all happen inside one ffmpeg process.
+        with metrics.span("render"):
+            render_with_ffmpeg(
+                background_video_path,
+                image1_path,
+                image2_path,
+                output_path,
+                include_audio=include_audio,
+                duration_seconds=duration_seconds,
+                fragmented=fragmented,
+                profile=encoding,
+                cpus=cpus,
+                on_progress=on_progress,
+            )
+        return
+
+    if compositor == "plane":
+        count = segment_count(RENDER_SEGMENTS if segments is None else segments, duration_seconds, cpus or job_cpus)
+        if count > 1:
+            with metrics.span("render"):
+                render_segmented(
+                    background_video_path,
+                    image1_path,
+                    image2_path,
+                    output_path,
+                    count,
+                    include_audio=include_audio,
+                    duration_seconds=duration_seconds,
+                    background_frames=background_frames,
+                    fragmented=fragmented,
+                    profile=encoding,
+                    cpus=cpus,
+                    on_progress=on_progress,
+                )
+            return
 
     logger.info("Loading background video…")
-    base_video = VideoFileClip(background_video_path)
+    setup_started = time.perf_counter()
+    # moviepy (and the imageio stack behind it) is imported by the first job
+    # that renders through it, never at cold start; the ffmpeg backend does
+    # not load it at all. moviepy.editor is avoided because it also pulls in
+    # IPython display helpers and every effect module.
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+    # Audio never goes through moviepy: the encoder muxes it straight from
+    # the background file.
+    if background_frames is not None:
+        base_video = background_frames.to_clip()
+    else:
+        base_video = VideoFileClip(background_video_path, audio=False)
     trim_end = min(duration_seconds, base_video.duration or duration_seconds)
     video = base_video.subclip(0, trim_end)
 
     vw, vh = video.size
 
-    img1 = Image.open(image1_path)
-    img2 = Image.open(image2_path)
-    i1w, i1h = img1.size
-    i2w, i2h = img2.size
+    with open_image(image1_path) as img1, open_image(image2_path) as img2:
+        layout = compute_layout((vw, vh), layout_size(img1), layout_size(img2))
+        (i1w2, i1h2), (i1x, i1y) = layout.image1_size, layout.image1_pos
+        (i2w2, i2h2), (i2x, i2y) = layout.image2_size, layout.image2_pos
+
+        layers = []
+        if compositor == "layered":
+            from moviepy.video.VideoClip import ImageClip
+            from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+            from moviepy.video.fx.resize import resize
+            import numpy as np
 
-    max_w = int(vw * 0.8)
-    s1 = max_w / i1w if i1w > max_w else 1.0
-    s2 = max_w / i2w if i2w > max_w else 1.0
-    scale = min(s1, s2)
+            # ImageClip reads files as stored, so EXIF-rotated images are passed upright
+            src1 = image1_path if image_orientation(img1) == 1 else np.array(ImageOps.exif_transpose(img1))
+            src2 = image2_path if image_orientation(img2) == 1 else np.array(ImageOps.exif_transpose(img2))
+            imgc1 = ImageClip(src1).set_duration(video.duration).fx(resize, (i1w2, i1h2)).set_position((i1x, i1y))
+            imgc2 = ImageClip(src2).set_duration(video.duration).fx(resize, (i2w2, i2h2)).set_position((i2x, i2y))
+            layers = [imgc1, imgc2]
+            final = CompositeVideoClip([video, imgc1, imgc2]).set_duration(video.duration)
+        else:
+            # Each image is decoded once, already close to its layout size.
+            plane = build_overlay_plane(
+                layout,
+                ingest_image(img1, layout.image1_size).image,
+                ingest_image(img2, layout.image2_size).image,
+            )
+            final = video.fl_image(plane.apply).set_duration(video.duration)
+    metrics.add_time("setup", time.perf_counter() - setup_started)
 
-    i1w2, i1h2 = int(i1w * scale), int(i1h * scale)
-    i2w2, i2h2 = int(i2w * scale), int(i2h * scale)
+    fps = video.fps or 24
+    # Producing a frame (background decode + compositing) is timed apart from
+    # the rest of the render, which is spent feeding and draining the encoder.
+    with metrics.span("render"):
+        encode_frames(
+            metrics.timed_iter("composite", final.iter_frames(fps=fps, dtype="uint8")),
+            (vw, vh),
+            fps,
+            output_path,
+            trim_end,
+            audio_source=(background_video_path if include_audio else None),
+            profile=encoding,
+            threads=encoder_threads(encoding, cpus),
+            fragmented=fragmented,
+            on_progress=on_progress,
+        )
+    metrics.add_time("encode", (metrics.spans["render"] - metrics.spans.get("composite", 0.0)) / 1000)
 
-    total_h = i1h2 + i2h2
-    max_h = int(vh * 0.9)
-    if total_h > max_h:
-        hs = max_h / total_h
-        i1w2, i1h2 = int(i1w2 * hs), int(i1h2 * hs)
-        i2w2, i2h2 = int(i2w2 * hs), int(i2h2 * hs)
+    for layer in layers:
+        layer.close()
+    video.close()
+    base_video.close()
+    final.close()
 
-    top_margin = max(int(vh * 0.06), 10)
-    vertical_gap = max(int(vh * 0.06), 24)
-    i1x = (vw - i1w2) // 2
-    i1y = top_margin
-    i2x = (vw - i2w2) // 2
-    i2y = i1y + i1h2 + vertical_gap
 
-    imgc1 = ImageClip(image1_path).set_duration(video.duration).resize((i1w2, i1h2)).set_position((i1x, i1y))
-    imgc2 = ImageClip(image2_path).set_duration(video.duration).resize((i2w2, i2h2)).set_position((i2x, i2y))
+def preview_key(output_key: str, suffix: str) -> str:
+    """Key of a preview artifact, named after the output's base name."""
+    return PREVIEW_PREFIX + os.path.splitext(os.path.basename(output_key))[0] + suffix
 
-    final = CompositeVideoClip([video, imgc1, imgc2]).set_duration(video.duration)
 
-    if include_audio and video.audio is not None:
-        final = final.set_audio(video.audio)
-    else:
-        final = final.set_audio(None)
-
-    temp_audio = "/tmp/temp-audio.m4a"
-    final.write_videofile(
-        output_path,
-        codec="libx264",
-        audio_codec="aac",
-        fps=(video.fps or 24),
-        preset="medium",
-        threads=2,
-        audio=include_audio,
-        temp_audiofile=temp_audio,
-        remove_temp=True,
-        logger=None,
-    )
+def publish_poster(inputs: Tuple[str, str, str], path: str, bucket: str, output_key: str, reporter: JobReporter) -> None:
+    """Render and upload the poster frame; failures are logged, never raised."""
+    try:
+        ext, content_type = POSTER_TYPES[POSTER_FORMAT]
+        render_poster(*inputs, path + ext)
+        key = preview_key(output_key, ext)
+        s3.upload_file(path + ext, bucket, key, ExtraArgs={"ContentType": content_type})
+        reporter.record(poster_key=key)
+        logger.info("Published poster s3://%s/%s", bucket, key)
+    except Exception:
+        logger.warning("Could not publish poster for %s", output_key, exc_info=True)
 
-    imgc1.close()
-    imgc2.close()
-    video.close()
-    base_video.close()
-    final.close()
 
+def publish_preview_clip(
+    inputs: Tuple[str, str, str], path: str, bucket: str, output_key: str, duration_seconds: float, reporter: JobReporter
+) -> None:
+    """Render and upload the preview clip; failures are logged, never raised."""
+    try:
+        render_preview_clip(*inputs, path, duration_seconds=duration_seconds)
+        key = preview_key(output_key, "-preview.mp4")
+        s3.upload_file(path, bucket, key, ExtraArgs={"ContentType": "video/mp4"})
+        reporter.record(preview_key=key)
+        logger.info("Published preview clip s3://%s/%s", bucket, key)
+    except Exception:
+        logger.warning("Could not publish preview clip for %s", output_key, exc_info=True)
 
-def lambda_handler(event, context):
-    """AWS Lambda entrypoint.
 
-    Expected event fields:
+def download_object(bucket: str, key: str, path: str) -> str:
+    """Stream an object to path with a single GET and return its ETag.
+
+    Unlike download_file this issues no HEAD first, which matters for the
+    small images where the extra round trip dominates.
+    """
+    resp = s3.get_object(Bucket=bucket, Key=key)
+    with open(path, "wb") as f:
+        for chunk in resp["Body"].iter_chunks(1024 * 1024):
+            f.write(chunk)
+    return resp["ETag"]
+
+
+def download_image(bucket: str, key: str, path: str) -> Tuple[str, str]:
+    """Download an image, preferring its normalized variant (see normalize.py).
+
+    Returns the local path and the ETag of the uploaded original, which keys
+    the render cache either way. Only an object carrying source-etag metadata
+    is taken as a variant; its local path then ends in NORMALIZED_SUFFIX,
+    which is what lets layout_size trust the original size it records.
+    """
+    if NORMALIZED_PREFIX:
+        try:
+            resp = s3.get_object(Bucket=bucket, Key=normalized_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                raise
+        else:
+            source_etag = resp.get("Metadata", {}).get("source-etag")
+            if source_etag:
+                path = os.path.splitext(path)[0] + NORMALIZED_SUFFIX
+                with open(path, "wb") as f:
+                    for chunk in resp["Body"].iter_chunks(1024 * 1024):
+                        f.write(chunk)
+                return path, f'"{source_etag}"'
+            resp["Body"].close()
+        logger.info("No normalized variant of %s/%s yet; using the original", bucket, key)
+    return path, download_object(bucket, key, path)
+
+
+def fetch_background(bucket: str, key: str, profile: str) -> Tuple[str, str]:
+    """Fetch a background through the cache, preferring its mezzanine (see
+    mezzanine.py) when it serves profile.
+
+    Returns the local path and the ETag of the uploaded original, which keys
+    the render cache either way.
+    """
+    if MEZZANINE_PREFIX and mezzanine_serves(get_profile(profile)):
+        checked_at = missing_mezzanines.get((bucket, key))
+        if checked_at is None or time.time() - checked_at >= background_cache.revalidate_after:
+            target = mezzanine_key(key)
+            try:
+                path = background_cache.fetch(bucket, target)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                    raise
+            else:
+                source_etag = background_cache.metadata(bucket, target).get("source-etag")
+                if source_etag:
+                    missing_mezzanines.pop((bucket, key), None)
+                    return path, f'"{source_etag}"'
+            missing_mezzanines[(bucket, key)] = time.time()
+            logger.info("No mezzanine of %s/%s yet; using the original", bucket, key)
+    path = background_cache.fetch(bucket, key)
+    return path, background_cache.etag(bucket, key)
+
+
+def fetch_inputs(
+    background: Tuple[str, str],
+    *images: Tuple[str, str, str],
+    profile: Optional[str] = None,
+) -> Tuple[str, List[str], List[str]]:
+    """Download all job inputs concurrently.
+
+    Returns the background path, the local path of each image (normalized
+    variants change the extension) and the ETags of the background and each
+    image, in that order.
+
+    background is (bucket, key) and goes through fetch_background for profile;
+    images are (bucket, key, local_path). The transfers share the pooled S3 client, so
+    the small image downloads complete while the background is still
+    streaming. No HEAD requests are made: a failed GET is the existence check.
+    """
+    with ThreadPoolExecutor(max_workers=min(16, 1 + len(images))) as pool:
+        futures = [("background", background, pool.submit(fetch_background, *background, profile))]
+        futures += [
+            (f"image{i}", image[:2], pool.submit(download_image, *image)) for i, image in enumerate(images, 1)
+        ]
+    for label, (bucket, key), future in futures:
+        e = future.exception()
+        if e is None:
+            continue
+        if isinstance(e, ClientError):
+            code = e.response.get("Error", {}).get("Code")
+            logger.error("S3 download failed for %s: %s. %s/%s", label, code, bucket, key)
+        raise e
+    fetched = [future.result() for _, _, future in futures]
+    return fetched[0][0], [path for path, _ in fetched[1:]], [etag for _, etag in fetched]
+
+
+def process_job(payload: dict) -> str:
+    """Fetch inputs, render and upload one job; return the output S3 URI.
+
+    Expected payload fields:
       - background_bucket, background_key
       - image1_bucket, image1_key
       - image2_bucket, image2_key
       - output_bucket, output_key
       - include_audio (optional, default True)
       - duration_seconds (optional, default 6, max 12)
+      - render_backend (optional, "moviepy" or "ffmpeg", default RENDER_BACKEND)
+      - profile (optional, "fast", "balanced" or "archive", default ENCODING_PROFILE)
+      - job_id (optional; stages and progress are recorded in the job store)
+      - estimated_cost, job_class (optional, set by the API; see scheduling.py)
+      - renditions (optional, names from renditions.RENDITIONS; each is
+        uploaded next to output_key, see renditions.rendition_key)
+      - attempt, message_id (set by handle_sqs_batch; see failure_stage and
+        is_own_output)
+
+    Stage timings and transfer/resource counters are emitted as one metrics
+    record per job (see metrics.py). A payload with a "jobs" list is a group
+    job (see process_group).
     """
+    if "jobs" in payload:
+        return process_group(payload)
+    reporter = JobReporter(job_store, payload.get("job_id"))
+    metrics = JobMetrics(scratch_dir=SCRATCH_DIR)
+    metrics.properties.update(
+        JobId=payload.get("job_id"),
+        OutputKey=payload.get("output_key"),
+        JobClass=payload.get("job_class"),
+        EstimatedCost=message_cost(payload),
+        Attempt=payload.get("attempt"),
+        Outcome="completed",
+    )
     try:
-        # Support both direct invocation (dict of fields) and SQS trigger (Records list)
-        payload = event
-        if isinstance(event, dict) and "Records" in event:
-            # Take first record; expected body is JSON
-            record = event["Records"][0]
-            body = record.get("body", "{}")
-            try:
-                payload = json.loads(body)
-            except Exception:
-                logger.error("Failed to parse SQS message body as JSON: %s", body)
-                raise
+        return _run_job(payload, reporter, metrics)
+    except Exception as e:
+        metrics.properties["Outcome"] = "failed"
+        reporter.stage(failure_stage(payload), error=str(e) or e.__class__.__name__)
+        raise
+    finally:
+        metrics.emit()
 
-        background_bucket = payload["background_bucket"]
-        background_key = payload["background_key"]
-        image1_bucket = payload.get("image1_bucket", background_bucket)
-        image1_key = payload["image1_key"]
-        image2_bucket = payload.get("image2_bucket", background_bucket)
-        image2_key = payload["image2_key"]
-        output_bucket = payload["output_bucket"]
-        output_key = payload["output_key"]
-        include_audio = bool(payload.get("include_audio", True))
-        duration_seconds = float(payload.get("duration_seconds", 6.0))
-
-        tmp = "/tmp"
-        bg_path = os.path.join(tmp, "background.mp4")
-        i1_path = os.path.join(tmp, "image1.png")
-        i2_path = os.path.join(tmp, "image2.png")
-        out_path = os.path.join(tmp, "output.mp4")
 
+def failure_stage(payload: dict) -> str:
+    """The stage to record when a job raises: "retrying" while SQS will
+    redeliver it, "failed" on its last attempt.
+
+    payload["attempt"] is the message's ApproximateReceiveCount; a direct
+    invocation has none and is not retried.
+    """
+    attempt = payload.get("attempt")
+    return "retrying" if attempt is not None and attempt < MAX_RECEIVE_COUNT else "failed"
+
+
+def output_tags(payload: dict, digest: Optional[str] = None) -> Dict[str, str]:
+    """S3 metadata naming the message and render that wrote an output."""
+    tags = {}
+    if payload.get("message_id"):
+        tags[MESSAGE_ID_METADATA] = payload["message_id"]
+    if digest:
+        tags[DIGEST_METADATA] = digest
+    return tags
+
+
+def is_own_output(existing: Optional[Dict[str, str]], payload: dict, digest: Optional[str] = None) -> bool:
+    """Whether an existing output (its metadata, or None when there is none)
+    was written by this message, or renders the same inputs as digest.
+
+    SQS delivers at least once, so a redelivered message may find its output
+    already written; but client job_ids can collide, so any other object at
+    the output key is overwritten rather than taken as done.
+    """
+    if existing is None:
+        return False
+    if payload.get("message_id") and existing.get(MESSAGE_ID_METADATA) == payload["message_id"]:
+        return True
+    return digest is not None and existing.get(DIGEST_METADATA) == digest
+
+
+def _run_job(payload: dict, reporter: JobReporter, metrics: JobMetrics) -> str:
+    background_bucket = payload["background_bucket"]
+    background_key = payload["background_key"]
+    image1_bucket = payload.get("image1_bucket", background_bucket)
+    image1_key = payload["image1_key"]
+    image2_bucket = payload.get("image2_bucket", background_bucket)
+    image2_key = payload["image2_key"]
+    output_bucket = payload["output_bucket"]
+    output_key = payload["output_key"]
+    include_audio = bool(payload.get("include_audio", True))
+    duration_seconds = float(payload.get("duration_seconds", 6.0))
+    render_backend = payload.get("render_backend") or RENDER_BACKEND
+    profile = get_profile(payload.get("profile")).name
+    renditions = [(r, rendition_key(output_key, r)) for r in map(get_rendition, payload.get("renditions") or [])]
+    metrics.dimensions.update(Backend=render_backend, Profile=profile)
+
+    def skip_duplicate() -> str:
+        logger.info("Output s3://%s/%s is already done; skipping duplicate delivery", output_bucket, output_key)
+        metrics.properties["Outcome"] = "skipped"
+        reporter.stage("completed", output_key=output_key)
+        return f"s3://{output_bucket}/{output_key}"
+
+    # A redelivery whose output is written has nothing left to do (renditions
+    # are uploaded before it); the digest check waits for the input ETags.
+    with metrics.span("head"):
+        existing = output_metadata(s3, output_bucket, output_key)
+    if is_own_output(existing, payload):
+        return skip_duplicate()
+
+    with JobWorkspace(SCRATCH_DIR, required_bytes=JOB_SCRATCH_BYTES) as ws:
+        i1_path = ws.file("image1" + (os.path.splitext(image1_key)[1] or ".png"))
+        i2_path = ws.file("image2" + (os.path.splitext(image2_key)[1] or ".png"))
+        out_path = ws.file("output.mp4")
+
+        reporter.stage("fetching")
         logger.info(
             "Downloading inputs from S3… bg=%s/%s, i1=%s/%s, i2=%s/%s",
             background_bucket,
@@ -151,65 +533,437 @@ def lambda_handler(event, context):
             image2_key,
         )
 
-        # Pre-flight head checks for clearer errors
-        try:
-            s3.head_object(Bucket=background_bucket, Key=background_key)
-            s3.head_object(Bucket=image1_bucket, Key=image1_key)
-            s3.head_object(Bucket=image2_bucket, Key=image2_key)
-        except ClientError as e:
-            code = e.response.get("Error", {}).get("Code")
-            logger.error(
-                "S3 head_object failed: %s. bg=%s/%s, i1=%s/%s, i2=%s/%s",
-                code,
-                background_bucket,
-                background_key,
-                image1_bucket,
-                image1_key,
-                image2_bucket,
-                image2_key,
+        fetched_before = background_cache.bytes_fetched
+        with metrics.span("download"):
+            bg_path, (i1_path, i2_path), etags = fetch_inputs(
+                (background_bucket, background_key),
+                (image1_bucket, image1_key, i1_path),
+                (image2_bucket, image2_key, i2_path),
+                profile=profile,
+            )
+        metrics.put(
+            "BytesDownloaded",
+            background_cache.bytes_fetched - fetched_before + os.path.getsize(i1_path) + os.path.getsize(i2_path),
+            "Bytes",
+        )
+
+        digest = render_cache_key(
+            (background_bucket, background_key), etags[0], etags[1:], include_audio, duration_seconds, profile
+        )
+        if is_own_output(existing, payload, digest):
+            return skip_duplicate()
+        tags = output_tags(payload, digest)
+        if RENDER_CACHE_ENABLED:
+            with metrics.span("cache"):
+                # Renditions first, as on upload: the main output marks the job done
+                hit = all(
+                    serve_from_cache(s3, output_bucket, f"{digest}-{r.name}", key) for r, key in renditions
+                ) and serve_from_cache(s3, output_bucket, digest, output_key, tags)
+            if hit:
+                metrics.properties["Outcome"] = "cached"
+                fields = {"renditions": {r.name: key for r, key in renditions}} if renditions else {}
+                reporter.stage("completed", output_key=output_key, cached=True, **fields)
+                return f"s3://{output_bucket}/{output_key}"
+
+        preview_thread = None
+        if PREVIEW_MODE in ("poster", "clip"):
+            with metrics.span("poster"):
+                publish_poster((bg_path, i1_path, i2_path), ws.file("poster"), output_bucket, output_key, reporter)
+        if PREVIEW_MODE == "clip":
+            preview_thread = threading.Thread(
+                target=publish_preview_clip,
+                args=((bg_path, i1_path, i2_path), ws.file("preview.mp4"), output_bucket, output_key,
+                      duration_seconds, reporter),
+                daemon=True,
             )
-            raise
+            preview_thread.start()
 
-        # Downloads
         try:
-            s3.download_file(background_bucket, background_key, bg_path)
-            s3.download_file(image1_bucket, image1_key, i1_path)
-            s3.download_file(image2_bucket, image2_key, i2_path)
-        except ClientError as e:
-            code = e.response.get("Error", {}).get("Code")
-            logger.error("S3 download failed: %s", code)
-            raise
-
-        overlay_images_on_video(
-            bg_path,
-            i1_path,
-            i2_path,
-            out_path,
-            include_audio=include_audio,
-            duration_seconds=duration_seconds,
+            background_frames = None
+            if background_key in FRAME_STORE_BACKGROUNDS and render_backend == "moviepy":
+                with metrics.span("framestore"):
+                    background_frames = frame_store.get(bg_path)
+
+            def on_progress(frames_done: int, frames_total: int) -> None:
+                metrics.put("Frames", frames_done)
+                reporter.progress(frames_done, frames_total)
+
+            render_args = dict(
+                include_audio=include_audio,
+                duration_seconds=duration_seconds,
+                backend=render_backend,
+                background_frames=background_frames,
+                profile=profile,
+                cpus=job_cpus,
+                on_progress=on_progress,
+                metrics=metrics,
+            )
+            reporter.stage("rendering")
+            ready = {}
+            if renditions:
+                # Every size is encoded from one decode and composite per frame,
+                # whatever the backend; renditions need files, so no streaming.
+                rendition_paths = [(r, ws.file(f"output-{r.name}.{r.format}")) for r, _ in renditions]
+                with metrics.span("render"):
+                    rendition_errors = render_renditions(
+                        bg_path, i1_path, i2_path, out_path, rendition_paths,
+                        include_audio=include_audio,
+                        duration_seconds=duration_seconds,
+                        profile=profile,
+                        cpus=job_cpus,
+                        background_frames=background_frames,
+                        on_progress=on_progress,
+                    )
+                reporter.stage("uploading")
+                with metrics.span("upload"):
+                    for (r, key), (_, path), error in zip(renditions, rendition_paths, rendition_errors):
+                        if error is not None:
+                            logger.warning("Rendition %s failed; skipping it: %s", r.name, error)
+                            continue
+                        s3.upload_file(path, output_bucket, key, ExtraArgs={"ContentType": r.content_type})
+                        ready[r.name] = key
+                        metrics.add("BytesUploaded", os.path.getsize(path), "Bytes")
+                        # Listed by the status endpoint as soon as each is uploaded
+                        reporter.record(renditions=dict(ready))
+                    s3.upload_file(out_path, output_bucket, output_key, ExtraArgs={"Metadata": tags})
+                metrics.add("BytesUploaded", os.path.getsize(out_path), "Bytes")
+            elif OUTPUT_MODE == "stream":
+                logger.info("Rendering and streaming result to S3…")
+                # Parts upload while encoding, so there is no separate upload span.
+                with StreamingUpload(s3, out_path, output_bucket, output_key, metadata=tags) as upload:
+                    overlay_images_on_video(bg_path, i1_path, i2_path, upload.path, fragmented=True, **render_args)
+                metrics.put("BytesUploaded", upload.bytes_uploaded, "Bytes")
+            else:
+                overlay_images_on_video(bg_path, i1_path, i2_path, out_path, **render_args)
+                reporter.stage("uploading")
+                logger.info("Uploading result to S3…")
+                with metrics.span("upload"):
+                    s3.upload_file(out_path, output_bucket, output_key, ExtraArgs={"Metadata": tags})
+                metrics.put("BytesUploaded", os.path.getsize(out_path), "Bytes")
+        finally:
+            # The preview's files live in the workspace
+            if preview_thread is not None:
+                preview_thread.join()
+
+        if RENDER_CACHE_ENABLED:
+            with metrics.span("store"):
+                store_in_cache(s3, output_bucket, output_key, digest)
+                for name, key in ready.items():
+                    store_in_cache(s3, output_bucket, key, f"{digest}-{name}")
+
+    reporter.stage("completed", output_key=output_key)
+    logger.info("Video Processing Completed Successfully")
+    return f"s3://{output_bucket}/{output_key}"
+
+
+def process_group(payload: dict) -> str:
+    """Render a group of image pairs over one decode of a shared background.
+
+    Takes the background, output_bucket, include_audio, duration_seconds and
+    profile fields of process_job, plus "jobs": a list of {job_id,
+    image1_key, image2_key, output_key} (image buckets default to the
+    background's). Outputs already written for this message or these inputs
+    (see is_own_output) or in the render cache are not rendered again, so a
+    redelivered group only redoes its failed members. Raises if any member failed, after the others are uploaded.
+    Returns the output S3 URIs, comma-separated.
+    """
+    background_bucket = payload["background_bucket"]
+    background_key = payload["background_key"]
+    output_bucket = payload["output_bucket"]
+    include_audio = bool(payload.get("include_audio", True))
+    duration_seconds = float(payload.get("duration_seconds", 6.0))
+    profile = get_profile(payload.get("profile")).name
+    members = payload["jobs"]
+    reporters = [JobReporter(job_store, m.get("job_id")) for m in members]
+
+    metrics = JobMetrics(scratch_dir=SCRATCH_DIR)
+    metrics.dimensions.update(Backend="group", Profile=profile)
+    metrics.properties.update(GroupSize=len(members), Attempt=payload.get("attempt"), Outcome="completed")
+    finished = set()
+    failures = {}
+
+    def complete(i: int, **fields) -> None:
+        finished.add(i)
+        reporters[i].stage("completed", output_key=members[i]["output_key"], **fields)
+
+    try:
+        with metrics.span("head"), ThreadPoolExecutor(max_workers=min(16, len(members))) as pool:
+            existing = list(pool.map(lambda m: output_metadata(s3, output_bucket, m["output_key"]), members))
+        for i in (i for i, found in enumerate(existing) if is_own_output(found, payload)):
+            complete(i)
+        pending = [i for i in range(len(members)) if i not in finished]
+        if not pending:
+            logger.info("All %d outputs of the group are already done; skipping duplicate delivery", len(members))
+            metrics.properties["Outcome"] = "skipped"
+
+        # Outputs are rendered (and uploaded) MAX_GROUP_ENCODERS at a time
+        reserved = max(1, min(len(pending), MAX_GROUP_ENCODERS))
+        with JobWorkspace(SCRATCH_DIR, required_bytes=JOB_SCRATCH_BYTES * reserved) as ws:
+            inputs = {}
+            for i in pending:
+                reporters[i].stage("fetching")
+                inputs[i] = [
+                    (
+                        members[i].get(f"image{n}_bucket", background_bucket),
+                        members[i][f"image{n}_key"],
+                        ws.file(f"{i}-image{n}" + (os.path.splitext(members[i][f"image{n}_key"])[1] or ".png")),
+                    )
+                    for n in (1, 2)
+                ]
+            images = [image for i in pending for image in inputs[i]]
+
+            if pending:
+                fetched_before = background_cache.bytes_fetched
+                with metrics.span("download"):
+                    bg_path, image_paths, etags = fetch_inputs(
+                        (background_bucket, background_key), *images, profile=profile
+                    )
+                metrics.put(
+                    "BytesDownloaded",
+                    background_cache.bytes_fetched - fetched_before + sum(os.path.getsize(p) for p in image_paths),
+                    "Bytes",
+                )
+                paths = dict(zip(pending, zip(image_paths[0::2], image_paths[1::2])))
+                image_etags = dict(zip(pending, zip(etags[1::2], etags[2::2])))
+
+            digests = {
+                i: render_cache_key(
+                    (background_bucket, background_key), etags[0], image_etags[i],
+                    include_audio, duration_seconds, profile,
+                )
+                for i in pending
+            }
+            for i in pending:
+                if is_own_output(existing[i], payload, digests[i]):
+                    complete(i)
+            pending = [i for i in pending if i not in finished]
+            if RENDER_CACHE_ENABLED and pending:
+                with metrics.span("cache"):
+                    for i in pending:
+                        tags = output_tags(payload, digests[i])
+                        if serve_from_cache(s3, output_bucket, digests[i], members[i]["output_key"], tags):
+                            complete(i, cached=True)
+                pending = [i for i in pending if i not in finished]
+
+            if pending:
+                background_frames = None
+                if background_key in FRAME_STORE_BACKGROUNDS:
+                    with metrics.span("framestore"):
+                        background_frames = frame_store.get(bg_path)
+
+                def upload(i: int, output: str) -> None:
+                    reporters[i].stage("uploading")
+                    s3.upload_file(
+                        output, output_bucket, members[i]["output_key"],
+                        ExtraArgs={"Metadata": output_tags(payload, digests[i])},
+                    )
+                    if RENDER_CACHE_ENABLED:
+                        store_in_cache(s3, output_bucket, members[i]["output_key"], digests[i])
+
+                # At most MAX_GROUP_ENCODERS outputs are on disk at once: each
+                # chunk is uploaded and deleted before the next one renders.
+                frames_before = 0
+                for start in range(0, len(pending), MAX_GROUP_ENCODERS):
+                    chunk = pending[start:start + MAX_GROUP_ENCODERS]
+                    outputs = {i: ws.file(f"{i}-output.mp4") for i in chunk}
+                    chunk_frames = [0]
+
+                    def on_progress(frames_done: int, frames_total: int) -> None:
+                        chunk_frames[0] = frames_done
+                        metrics.put("Frames", frames_before + frames_done)
+                        for i in chunk:
+                            reporters[i].progress(frames_done, frames_total)
+
+                    for i in chunk:
+                        reporters[i].stage("rendering")
+                    with metrics.span("render"):
+                        errors = render_group(
+                            bg_path,
+                            [GroupMember(*paths[i], outputs[i]) for i in chunk],
+                            include_audio=include_audio,
+                            duration_seconds=duration_seconds,
+                            profile=profile,
+                            cpus=job_cpus,
+                            background_frames=background_frames,
+                            on_progress=on_progress,
+                        )
+                    frames_before += chunk_frames[0]
+                    failures.update((i, e) for i, e in zip(chunk, errors) if e is not None)
+                    rendered = [i for i in chunk if i not in failures]
+
+                    logger.info("Uploading %d group outputs to S3…", len(rendered))
+                    with metrics.span("upload"), ThreadPoolExecutor(max_workers=min(8, max(1, len(rendered)))) as pool:
+                        uploads = {i: pool.submit(upload, i, outputs[i]) for i in rendered}
+                    for i, future in uploads.items():
+                        if future.exception() is not None:
+                            failures[i] = future.exception()
+                        else:
+                            complete(i)
+                            metrics.add("BytesUploaded", os.path.getsize(outputs[i]), "Bytes")
+                    for output in outputs.values():
+                        if os.path.exists(output):
+                            os.remove(output)
+    except Exception as e:
+        failures.update((i, e) for i in range(len(members)) if i not in finished and i not in failures)
+        raise
+    finally:
+        for i, e in failures.items():
+            reporters[i].stage(failure_stage(payload), error=str(e) or e.__class__.__name__)
+        if failures:
+            metrics.properties["Outcome"] = "failed"
+        metrics.emit()
+
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(members)} group jobs failed: "
+            + "; ".join(f"{members[i]['output_key']}: {e}" for i, e in sorted(failures.items()))
         )
+    logger.info("Group of %d videos completed successfully", len(members))
+    return ",".join(f"s3://{output_bucket}/{m['output_key']}" for m in members)
+
+
+def warm_shared_inputs(payloads: List[dict]) -> None:
+    """Fetch each distinct background once before jobs fan out to workers.
+
+    Forked workers inherit the populated background cache and frame store, so
+    a batch sharing a background downloads and decodes it only once. Errors
+    are left for the affected jobs to report.
+    """
+    seen = set()
+    for payload in payloads:
+        try:
+            bucket, key = payload["background_bucket"], payload["background_key"]
+            # The profile decides between the original and its mezzanine
+            profile = get_profile(payload.get("profile")).name
+            if (bucket, key, profile) in seen:
+                continue
+            seen.add((bucket, key, profile))
+            bg_path, _ = fetch_background(bucket, key, profile)
+            backend = payload.get("render_backend") or RENDER_BACKEND
+            if key in FRAME_STORE_BACKGROUNDS and backend == "moviepy":
+                frame_store.get(bg_path)
+        except Exception:
+            logger.warning("Could not prefetch background for batch", exc_info=True)
+
 
-        logger.info("Uploading result to S3…")
-        s3.upload_file(out_path, output_bucket, output_key)
+def _job_worker(payload: dict, conn, cpus: int) -> None:
+    """Process entrypoint: run one job and send back None or an error message."""
+    global s3, job_cpus
+    job_cpus = cpus
+    # Never share pooled connections with the parent process.
+    s3 = boto3.client("s3", config=S3_CONFIG)
+    background_cache.client = s3
+    error = None
+    try:
+        process_job(payload)
+    except Exception as e:
+        logger.exception("Job failed")
+        error = str(e) or e.__class__.__name__
+    try:
+        conn.send(error)
+    finally:
+        conn.close()
+
+
+def run_jobs(jobs: List[Tuple[str, dict]], max_workers: int = MAX_PARALLEL_JOBS) -> Dict[str, Optional[str]]:
+    """Run (job_id, payload) pairs, up to max_workers at once in child processes.
 
-        # best-effort cleanup
-        for p in [bg_path, i1_path, i2_path, out_path]:
+    Jobs start cheapest first by estimated cost (see scheduling.py), so short
+    clips in a batch finish without waiting on long renders, and each gets a
+    share of the vCPUs in proportion to its cost among the jobs running with
+    it. Returns job_id -> None on success or an error message. Lambda has no
+    /dev/shm, so workers are plain forked processes reporting over a Pipe
+    rather than a multiprocessing Pool.
+    """
+    results = {}
+    jobs = sorted(jobs, key=lambda job: message_cost(job[1]))
+    if len(jobs) <= 1 or max_workers <= 1:
+        for job_id, payload in jobs:
+            try:
+                process_job(payload)
+                results[job_id] = None
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                results[job_id] = str(e) or e.__class__.__name__
+        return results
+
+    ctx = multiprocessing.get_context("fork")
+    cpus = available_cpus()
+    pending = [(job_id, payload, message_cost(payload)) for job_id, payload in jobs]
+    running = {}
+    while pending or running:
+        starting, pending = pending[:max_workers - len(running)], pending[max_workers - len(running):]
+        for i, (job_id, payload, cost) in enumerate(starting):
+            others = [c for _, _, c in running.values()] + [c for _, _, c in starting[i + 1:]]
+            recv_conn, send_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(
+                target=_job_worker, args=(payload, send_conn, cpu_share(cost, others, cpus)), daemon=True
+            )
+            proc.start()
+            send_conn.close()
+            running[recv_conn] = (job_id, proc, cost)
+        for conn in wait(list(running)):
+            job_id, proc, _ = running.pop(conn)
             try:
-                if os.path.exists(p):
-                    os.remove(p)
-            except Exception:
-                pass
-        
-        logger.info("Video Processing Completed Successfully")
+                results[job_id] = conn.recv()
+            except EOFError:
+                results[job_id] = None
+            conn.close()
+            proc.join()
+            if proc.exitcode != 0 and results[job_id] is None:
+                results[job_id] = f"worker exited with code {proc.exitcode}"
+    return results
+
+
+def handle_sqs_batch(records: List[dict]) -> dict:
+    """Process every record of an SQS batch and report the failed ones.
+
+    Returns the partial batch response, so only failed messages are
+    redelivered (requires ReportBatchItemFailures on the event source).
+    Each payload gets the message's receive count as "attempt" and its
+    messageId as "message_id".
+    """
+    failures = []
+    jobs = []
+    for record in records:
+        message_id = record.get("messageId")
+        body = record.get("body", "{}")
+        attempt = int(record.get("attributes", {}).get("ApproximateReceiveCount", MAX_RECEIVE_COUNT))
+        try:
+            jobs.append((message_id, {**json.loads(body), "attempt": attempt, "message_id": message_id}))
+        except Exception:
+            logger.error("Failed to parse SQS message body as JSON: %s", body)
+            failures.append(message_id)
+
+    logger.info("Processing %d SQS records (%d unparseable)", len(records), len(failures))
+    warm_shared_inputs([payload for _, payload in jobs])
+    for message_id, error in run_jobs(jobs).items():
+        if error is not None:
+            logger.error("Message %s failed: %s", message_id, error)
+            failures.append(message_id)
+
+    return {"batchItemFailures": [{"itemIdentifier": m} for m in failures]}
+
+
+def lambda_handler(event, context):
+    """AWS Lambda entrypoint.
+
+    An SQS trigger (event with "Records") processes every record and returns
+    a batchItemFailures response. A direct invocation passes the job fields
+    documented on process_job as the event itself.
+    """
+    if isinstance(event, dict) and "Records" in event:
+        return handle_sqs_batch(event["Records"])
+
+    try:
+        output = process_job(event)
         return {
             "statusCode": 200,
             "body": json.dumps({
                 "message": "ok",
-                "output": f"s3://{output_bucket}/{output_key}",
+                "output": output,
             }),
         }
     except Exception as e:
         logger.exception("Lambda failed")
         return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
-
-
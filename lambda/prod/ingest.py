@@ -0,0 +1,184 @@
+"""Size-bounded, single-decode image ingestion.
+
+Phone photos arrive at 12 MP or more but end up a few hundred pixels wide on
+the clip. Each image is opened once: the header gives its size for the
+layout, then it is decoded straight to (close to) its target size. JPEGs use
+Pillow's ``draft()`` DCT scaling so the full-resolution pixels are never
+materialized, and other formats shrink through ``reduce()`` before the final
+LANCZOS resize. HEIC/HEIF uploads are decoded through ``pillow-heif`` when it
+is installed. EXIF orientation is applied, so sizes are as displayed.
+
+Uploads are usually normalized ahead of time (see normalize.py) into an
+upright, downscaled WebP under ``NORMALIZED_PREFIX`` that records the size
+of the original; ``layout_size`` reports that size so the layout does not
+depend on which variant a render decoded.
+"""
+
+import logging
+import os
+from typing import NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+try:
+    from pillow_heif import register_heif_opener
+except ImportError:  # pragma: no cover - optional dependency
+    register_heif_opener = None
+
+if register_heif_opener is not None:
+    register_heif_opener()
+
+logger = logging.getLogger()
+
+# Extensions the ffmpeg backend cannot decode itself
+FFMPEG_UNSUPPORTED = (".heic", ".heif")
+
+# Normalized variant of images/<id>.<ext> is <NORMALIZED_PREFIX>images/<id>.webp
+NORMALIZED_PREFIX = os.environ.get("NORMALIZED_PREFIX", "normalized/")
+
+EXIF_ORIENTATION = 0x0112
+EXIF_IMAGE_DESCRIPTION = 0x010E
+# Orientations stored rotated by 90 degrees, so width and height swap on display
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+# ImageDescription of a normalized variant, followed by "<width>x<height>" of the original
+SOURCE_SIZE_MARKER = "meme-clip source-size="
+# Local file name ending the worker gives a downloaded normalized variant.
+# Only those files have their SOURCE_SIZE_MARKER honored: an upload can carry
+# any ImageDescription.
+NORMALIZED_SUFFIX = ".normalized.webp"
+
+
+# Modes whose samples reduce() may average. It rejects 1-bit and 16-bit
+# integer images, and averaging palette indices mixes unrelated colors.
+REDUCE_MODES = ("L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr", "I", "F")
+
+# Same transposes as ImageOps.exif_transpose, by orientation
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+class IngestedImage(NamedTuple):
+    image: Image.Image
+    source_size: Tuple[int, int]
+    decoded_size: Tuple[int, int]
+
+    @property
+    def bytes_saved(self) -> int:
+        """RGBA bytes not allocated compared with a full-resolution decode."""
+        (sw, sh), (dw, dh) = self.source_size, self.decoded_size
+        return max(0, (sw * sh - dw * dh) * 4)
+
+
+def open_image(path: str) -> Image.Image:
+    """Open an image lazily; only the header is read until it is decoded."""
+    try:
+        return Image.open(path)
+    except Image.UnidentifiedImageError:
+        if os.path.splitext(path)[1].lower() in FFMPEG_UNSUPPORTED and register_heif_opener is None:
+            raise RuntimeError(f"Cannot decode {path}: pillow-heif is not installed") from None
+        raise
+
+
+def normalized_key(key: str) -> str:
+    """S3 key of the normalized variant of an uploaded image."""
+    return NORMALIZED_PREFIX + os.path.splitext(key)[0] + ".webp"
+
+
+def image_orientation(img: Image.Image) -> int:
+    """EXIF orientation of img (1 when absent or invalid)."""
+    orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+    return orientation if orientation in range(1, 9) else 1
+
+
+def layout_size(img: Image.Image, normalized: Optional[bool] = None) -> Tuple[int, int]:
+    """Size compute_layout should see for img.
+
+    That is the original's size for a normalized variant and the displayed
+    (EXIF-oriented) size otherwise. normalized defaults to whether img was
+    opened from a file named with NORMALIZED_SUFFIX.
+    """
+    if normalized is None:
+        normalized = str(getattr(img, "filename", "")).endswith(NORMALIZED_SUFFIX)
+    description = img.getexif().get(EXIF_IMAGE_DESCRIPTION) if normalized else None
+    if isinstance(description, str) and description.startswith(SOURCE_SIZE_MARKER):
+        try:
+            w, h = (int(v) for v in description[len(SOURCE_SIZE_MARKER):].split("x"))
+            if w > 0 and h > 0:
+                return w, h
+        except ValueError:
+            pass
+    w, h = img.size
+    return (h, w) if image_orientation(img) in TRANSPOSED_ORIENTATIONS else (w, h)
+
+
+def reducible(img: Image.Image) -> Image.Image:
+    """img, converted when needed to a mode in REDUCE_MODES."""
+    if img.mode in REDUCE_MODES:
+        return img
+    if img.mode == "1":
+        return img.convert("L")
+    if img.mode == "P" and "transparency" not in img.info:
+        return img.convert("RGB")
+    return img.convert("RGBA")
+
+
+def ingest_image(img: Image.Image, target_size: Tuple[int, int]) -> IngestedImage:
+    """Decode img once at close to target_size and return it upright as RGBA at exactly that size."""
+    source_size = img.size
+    orientation = image_orientation(img)
+    tw, th = max(1, target_size[0]), max(1, target_size[1])
+    # target_size is as displayed; decoding happens in stored orientation.
+    dw, dh = (th, tw) if orientation in TRANSPOSED_ORIENTATIONS else (tw, th)
+    if img.format == "JPEG":
+        # Lets libjpeg decode at 1/2, 1/4 or 1/8 scale, never below the target.
+        img.draft("RGB", (dw, dh))
+    img.load()
+    decoded_size = img.size
+
+    factor = min(img.size[0] // dw, img.size[1] // dh)
+    if factor >= 2:
+        img = reducible(img).reduce(factor)
+    if orientation != 1:
+        img = img.transpose(ORIENTATION_TRANSPOSE[orientation])
+    img = img.convert("RGBA")
+    if img.size != (tw, th):
+        img = img.resize((tw, th), Image.Resampling.LANCZOS)
+
+    ingested = IngestedImage(img, source_size, decoded_size)
+    logger.info(
+        "Ingested image %dx%d (decoded at %dx%d) -> %dx%d, ~%d KB less than a full decode",
+        *source_size, *decoded_size, tw, th, ingested.bytes_saved // 1024,
+    )
+    return ingested
+
+
+def normalize_image(path: str, out_path: str, max_size: Tuple[int, int], quality: int = 90) -> Tuple[int, int]:
+    """Write an upright WebP of path that fits in max_size (never enlarged).
+
+    The original's displayed size is recorded in the file for layout_size.
+    Returns the size written.
+    """
+    with open_image(path) as img:
+        sw, sh = layout_size(img, normalized=False)
+        scale = min(1.0, max_size[0] / sw, max_size[1] / sh)
+        image = ingest_image(img, (max(1, round(sw * scale)), max(1, round(sh * scale)))).image
+    if image.getextrema()[3] == (255, 255):
+        image = image.convert("RGB")
+    exif = Image.Exif()
+    exif[EXIF_IMAGE_DESCRIPTION] = f"{SOURCE_SIZE_MARKER}{sw}x{sh}"
+    image.save(out_path, format="WEBP", quality=quality, method=4, exif=exif.tobytes())
+    return image.size
+
+
+def ingest_to_file(path: str, target_size: Tuple[int, int], out_path: str) -> str:
+    """Write a target-sized PNG of path for consumers that decode files themselves."""
+    with open_image(path) as img:
+        ingest_image(img, target_size).image.save(out_path, format="PNG", compress_level=1)
+    return out_path
@@ -0,0 +1,185 @@
+"""Job state store shared by the API and the render worker.
+
+The worker records stage transitions (queued, fetching, rendering,
+uploading, completed, failed, and retrying after an attempt SQS will
+redeliver) and frame-level encoder progress; the API's status endpoint
+answers with a single key lookup. Every write bumps a
+per-job ``version``, which doubles as the record's HTTP ETag so clients can
+send ``If-None-Match`` and long-poll for the next change.
+
+Backends are chosen with ``JOB_STORE``: ``dynamodb`` (table ``JOB_TABLE``)
+in production, ``sqlite:<path>`` as a local stand-in, or empty to disable.
+
+This file is deployed with both lambda/api and lambda/prod; the two copies
+must stay identical (checked by lambda/tests/test_shared_modules.py).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from decimal import Decimal
+from typing import Optional
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+logger = logging.getLogger()
+
+STAGES = ("queued", "fetching", "rendering", "uploading", "retrying", "completed", "failed")
+
+# Records expire a week after their last update (DynamoDB TTL attribute)
+TTL_SECONDS = 7 * 24 * 3600
+
+
+class JobStore(ABC):
+    """Interface implemented by the storage backends."""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        """Merge fields into the job's record and bump its version."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        """The job's record, or None if there is none."""
+
+    def wait_for_change(self, job_id: str, etag: Optional[str], timeout: float, interval: float = 1.0) -> Optional[dict]:
+        """Return the record once its ETag differs from etag, or the unchanged
+        record after timeout seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            record = self.get(job_id)
+            if record is None or record_etag(record) != etag or time.monotonic() >= deadline:
+                return record
+            time.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+
+
+def record_etag(record: dict) -> str:
+    return f'"{record.get("job_id")}-{record.get("version", 0)}"'
+
+
+class DynamoJobStore(JobStore):
+    def __init__(self, table: str):
+        self.table = table
+        self._client = None
+        self._pid = None
+
+    @property
+    def client(self):
+        # Clients are not shared across forked render workers
+        if self._client is None or self._pid != os.getpid():
+            self._client = boto3.client("dynamodb")
+            self._pid = os.getpid()
+        return self._client
+
+    def update(self, job_id: str, **fields) -> None:
+        serializer = TypeSerializer()
+        now = time.time()
+        fields.update(updated_at=now, expires_at=int(now + TTL_SECONDS))
+        names, values, sets = {}, {":one": {"N": "1"}}, []
+        for i, (name, value) in enumerate(fields.items()):
+            if isinstance(value, float):
+                value = Decimal(str(value))
+            names[f"#f{i}"] = name
+            values[f":v{i}"] = serializer.serialize(value)
+            sets.append(f"#f{i} = :v{i}")
+        self.client.update_item(
+            TableName=self.table,
+            Key={"job_id": {"S": job_id}},
+            UpdateExpression="SET " + ", ".join(sets) + " ADD version :one",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        item = self.client.get_item(TableName=self.table, Key={"job_id": {"S": job_id}}).get("Item")
+        if item is None:
+            return None
+        deserializer = TypeDeserializer()
+        record = {}
+        for name, value in item.items():
+            value = deserializer.deserialize(value)
+            if isinstance(value, Decimal):
+                value = int(value) if value == value.to_integral_value() else float(value)
+            record[name] = value
+        return record
+
+
+class SQLiteJobStore(JobStore):
+    """Single-file stand-in for DynamoDB, for tests and local runs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def update(self, job_id: str, **fields) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            record = json.loads(row[0]) if row else {"job_id": job_id, "version": 0}
+            record.update(fields, updated_at=time.time())
+            record["version"] += 1
+            conn.execute("INSERT OR REPLACE INTO jobs (job_id, record) VALUES (?, ?)", (job_id, json.dumps(record)))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+class JobReporter:
+    """Writes one job's stage transitions and throttled encoder progress.
+
+    A no-op when there is no store or no job_id. Store errors are logged and
+    never fail the render.
+    """
+
+    def __init__(self, store: Optional[JobStore], job_id: Optional[str], min_interval: float = 1.0):
+        self.store = store if job_id else None
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_progress = 0.0
+
+    def stage(self, stage: str, **fields) -> None:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown job stage: {stage}")
+        status = stage if stage in ("queued", "completed", "failed") else "processing"
+        if stage == "completed":
+            fields.setdefault("progress", 1.0)
+        self._write(status=status, stage=stage, **fields)
+
+    def record(self, **fields) -> None:
+        """Store extra fields (e.g. preview keys) without changing the stage."""
+        self._write(**fields)
+
+    def progress(self, frames_done: int, frames_total: int) -> None:
+        now = time.monotonic()
+        if frames_done < frames_total and now - self._last_progress < self.min_interval:
+            return
+        self._last_progress = now
+        progress = round(min(1.0, frames_done / frames_total), 3) if frames_total else 0.0
+        self._write(frames_done=frames_done, frames_total=frames_total, progress=progress)
+
+    def _write(self, **fields) -> None:
+        if self.store is None:
+            return
+        try:
+            self.store.update(self.job_id, **fields)
+        except Exception:
+            logger.warning("Could not update job state for %s", self.job_id, exc_info=True)
+
+
+def job_store_from_env() -> Optional[JobStore]:
+    spec = os.environ.get("JOB_STORE", "")
+    if spec == "dynamodb":
+        return DynamoJobStore(os.environ["JOB_TABLE"])
+    if spec.startswith("sqlite:"):
+        return SQLiteJobStore(spec[len("sqlite:"):])
+    return None
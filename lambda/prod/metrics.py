@@ -0,0 +1,254 @@
+"""Per-job stage timings and resource counters.
+
+Each job collects spans (wall-clock milliseconds per stage) and counters
+(frames, bytes transferred, peak RSS and scratch usage) in a ``JobMetrics``
+and emits them once when it finishes. In Lambda they are printed as
+CloudWatch Embedded Metric Format lines, which CloudWatch turns into metrics
+without any API calls; locally a timing table is logged instead.
+
+``METRICS`` selects the output: ``emf``, ``table`` or ``off`` (default
+``emf`` inside Lambda, ``table`` elsewhere). ``METRICS_NAMESPACE`` sets the
+CloudWatch namespace.
+
+Peak RSS is the job's own: on Linux the process's high-water mark is reset
+when the job starts, and a sampler thread adds the resident memory of its
+encoder subprocesses. That is exact for jobs run in their own process (as
+run_jobs does); jobs sharing a process share the figure. Elsewhere it falls
+back to the lifetime peak of peak_rss_bytes.
+"""
+
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger()
+
+METRICS_MODE = os.environ.get(
+    "METRICS", "emf" if "AWS_LAMBDA_FUNCTION_NAME" in os.environ else "table"
+)
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "MemeClip")
+
+# Seconds between samples of a running job's resident memory
+RSS_SAMPLE_INTERVAL = float(os.environ.get("RSS_SAMPLE_INTERVAL", "0.1"))
+
+
+def peak_rss_bytes() -> int:
+    """Largest resident set of this process or any waited-for child (ffmpeg)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return max(own, children) * scale
+
+
+def _status_kb(pid: str, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _descendants(pid: str) -> List[str]:
+    found = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return found
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children = f.read().split()
+        except OSError:
+            continue
+        for child in children:
+            found.append(child)
+            found.extend(_descendants(child))
+    return found
+
+
+def children_rss_bytes() -> int:
+    """Current resident memory of this process's descendants (ffmpeg)."""
+    total = 0
+    for pid in _descendants("self"):
+        try:
+            total += _status_kb(pid, "VmRSS")
+        except (OSError, ValueError):
+            pass  # exited since it was listed
+    return total * 1024
+
+
+def reset_peak_rss() -> bool:
+    """Restart this process's VmHWM from its current RSS; False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class JobRSS:
+    """Peak resident memory of one job: this process's VmHWM since the job
+    started plus the largest sampled total of its subprocesses."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.supported = reset_peak_rss()
+        self.children_peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        if self.supported:
+            self._thread = threading.Thread(target=self._sample, args=(interval,), name="rss-sampler", daemon=True)
+            self._thread.start()
+
+    def _sample(self, interval: float) -> None:
+        while True:
+            self.children_peak = max(self.children_peak, children_rss_bytes())
+            if self._stop.wait(interval):
+                return
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def peak_bytes(self) -> int:
+        if not self.supported:
+            return peak_rss_bytes()
+        try:
+            own = _status_kb("self", "VmHWM") * 1024
+        except (OSError, ValueError):
+            return peak_rss_bytes()
+        return own + self.children_peak
+
+
+class JobMetrics:
+    """Spans and counters for one job, emitted once with emit().
+
+    track_rss=False skips the per-job RSS sampler (for throwaway instances
+    that are never emitted); PeakRSSBytes is then the lifetime peak.
+    """
+
+    def __init__(self, scratch_dir: Optional[str] = None, track_rss: bool = True):
+        self.scratch_dir = scratch_dir
+        self.spans: Dict[str, float] = {}
+        self.counters: Dict[str, Tuple[float, str]] = {}
+        self.dimensions: Dict[str, str] = {}
+        self.properties: Dict[str, object] = {}
+        self._scratch_base = self._scratch_used()
+        self._rss = JobRSS() if track_rss else None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block; repeated spans of one name add up."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+            self.sample_scratch()
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds * 1000
+
+    def timed_iter(self, name: str, items: Iterable) -> Iterator:
+        """Yield from items, counting only the time spent producing them."""
+        it = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self.add_time(name, time.perf_counter() - start)
+            yield item
+
+    def put(self, name: str, value: float, unit: str = "Count") -> None:
+        self.counters[name] = (value, unit)
+
+    def add(self, name: str, value: float, unit: str = "Count") -> None:
+        self.counters[name] = (self.counters.get(name, (0, unit))[0] + value, unit)
+
+    def _scratch_used(self) -> int:
+        if not self.scratch_dir:
+            return 0
+        try:
+            return shutil.disk_usage(self.scratch_dir).used
+        except OSError:
+            return 0
+
+    def sample_scratch(self) -> None:
+        """Track the peak of scratch space used since the job started."""
+        if self.scratch_dir:
+            used = max(0, self._scratch_used() - self._scratch_base)
+            self.put("PeakScratchBytes", max(used, self.counters.get("PeakScratchBytes", (0,))[0]), "Bytes")
+
+    def finish(self) -> None:
+        """Record totals and derived rates; called by emit()."""
+        self.sample_scratch()
+        self.spans["total"] = (time.perf_counter() - self._started) * 1000
+        if self._rss is not None:
+            self._rss.stop()
+        self.put("PeakRSSBytes", self._rss.peak_bytes() if self._rss is not None else peak_rss_bytes(), "Bytes")
+        frames = self.counters.get("Frames", (0,))[0]
+        render_ms = self.spans.get("render")
+        if frames and render_ms:
+            self.put("RenderFPS", round(frames / (render_ms / 1000), 2), "Count/Second")
+
+    def emit(self, mode: Optional[str] = None) -> None:
+        mode = mode or METRICS_MODE
+        if mode == "off":
+            if self._rss is not None:
+                self._rss.stop()
+            return
+        self.finish()
+        if mode == "emf":
+            sys.stdout.write(json.dumps(self.to_emf()) + "\n")
+            sys.stdout.flush()
+        else:
+            logger.info("%s", self.to_table())
+
+    def to_emf(self) -> dict:
+        """CloudWatch Embedded Metric Format document."""
+        metrics, values = [], {}
+        for name, ms in self.spans.items():
+            metric = f"{name.capitalize()}Time"
+            metrics.append({"Name": metric, "Unit": "Milliseconds"})
+            values[metric] = round(ms, 1)
+        for name, (value, unit) in self.counters.items():
+            metrics.append({"Name": name, "Unit": unit})
+            values[name] = value
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [sorted(self.dimensions)],
+                    "Metrics": metrics,
+                }],
+            },
+            **self.dimensions,
+            **self.properties,
+            **values,
+        }
+
+    def to_table(self) -> str:
+        title = " ".join(f"{k}={v}" for k, v in {**self.dimensions, **self.properties}.items())
+        lines = [f"Job metrics {title}".rstrip(), f"  {'stage':<20}{'ms':>10}"]
+        for name, ms in self.spans.items():
+            lines.append(f"  {name:<20}{ms:>10.1f}")
+        for name, (value, unit) in self.counters.items():
+            if unit == "Bytes":
+                lines.append(f"  {name:<20}{value / (1024 * 1024):>10.1f} MB")
+            else:
+                lines.append(f"  {name:<20}{value:>10}")
+        return "\n".join(lines)
@@ -0,0 +1,149 @@
+"""S3-triggered mezzanine transcoding of uploaded backgrounds.
+
+Backgrounds arrive as arbitrary MP4s (any resolution, GOP length, H.264
+profile and pixel format), and every render used to pay whatever decode cost
+the upload happened to carry. Runs from the same container image as the
+render worker (with the command ``mezzanine.lambda_handler``) on every object
+created under ``backgrounds/`` and transcodes it once to a render-friendly
+form at ``mezzanine_key(key)``:
+
+- at most ``MEZZANINE_HEIGHT`` tall (720x1280 for a 9:16 upload), scaled like
+  the encoding profiles' height cap so renders need no further scaling;
+- yuv420p High profile H.264 tuned for fast decoding, with a keyframe every
+  ``MEZZANINE_GOP_SECONDS`` so accurate seeks decode little;
+- at the source frame rate (renders take theirs from the background, so a
+  lower one would make the output depend on whether a mezzanine existed)
+  and at most the renderer's 12 second maximum, with the audio kept (copied
+  when already AAC).
+
+The worker checks for the mezzanine first whenever the job's profile renders
+no taller than it (``mezzanine_serves``), and falls back to the original
+otherwise. The mezzanine carries the original's ETag in its ``source-etag``
+metadata so the render cache key does not depend on which file a render
+decoded. A failed transcode is only logged.
+"""
+
+import functools
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+from urllib.parse import unquote_plus
+
+import boto3
+import imageio_ffmpeg
+from botocore.config import Config
+
+from ffmpeg_backend import audio_args, probe_video, run_ffmpeg
+from framestore import MAX_SECONDS
+from profiles import EncodingProfile, available_cpus, output_size
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Mezzanine of backgrounds/<name>.<ext> is <MEZZANINE_PREFIX>backgrounds/<name>.mp4
+MEZZANINE_PREFIX = os.environ.get("MEZZANINE_PREFIX", "mezzanine/")
+MEZZANINE_HEIGHT = int(os.environ.get("MEZZANINE_HEIGHT", "1280"))
+MEZZANINE_GOP_SECONDS = float(os.environ.get("MEZZANINE_GOP_SECONDS", "0.5"))
+
+# Near-transparent quality: every render re-encodes from this file.
+MEZZANINE_PROFILE = EncodingProfile("mezzanine", preset="fast", crf=14, threads=0, max_height=MEZZANINE_HEIGHT)
+
+
+def mezzanine_key(key: str) -> str:
+    """S3 key of the mezzanine of an uploaded background."""
+    return MEZZANINE_PREFIX + os.path.splitext(key)[0] + ".mp4"
+
+
+def mezzanine_serves(profile: EncodingProfile) -> bool:
+    """Whether renders in profile look the same from the mezzanine as from the
+    original, i.e. the profile scales the background to at most its height."""
+    return profile.max_height is not None and profile.max_height <= MEZZANINE_HEIGHT
+
+
+def mezzanine_command(source_path: str, output_path: str, meta: Dict[str, Any], threads: int) -> List[str]:
+    """ffmpeg command transcoding source_path (probed as meta) to a mezzanine."""
+    width, height = output_size(MEZZANINE_PROFILE, tuple(meta["size"]))
+    gop = max(1, round((meta.get("fps") or 24) * MEZZANINE_GOP_SECONDS))
+    filters = [f"scale={width}:{height}:flags=lanczos", "format=yuv420p"]
+    return [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-y",
+        "-loglevel", "error",
+        "-i", source_path,
+        "-map", "0:v:0",
+        *audio_args(meta, 0),
+        "-vf", ",".join(filters),
+        "-t", f"{MAX_SECONDS:.3f}",
+        "-c:v", "libx264",
+        "-preset", MEZZANINE_PROFILE.preset,
+        "-crf", str(MEZZANINE_PROFILE.crf),
+        "-tune", "fastdecode",
+        "-profile:v", "high",
+        "-g", str(gop),
+        "-keyint_min", str(gop),
+        "-sc_threshold", "0",
+        "-threads", str(threads),
+        "-movflags", "+faststart",
+        output_path,
+    ]
+
+
+def transcode_mezzanine(source_path: str, output_path: str) -> Tuple[int, int]:
+    """Write the mezzanine of a local background video; returns its size."""
+    meta = probe_video(source_path)
+    cmd = mezzanine_command(source_path, output_path, meta, available_cpus())
+    run_ffmpeg(cmd)
+    return output_size(MEZZANINE_PROFILE, tuple(meta["size"]))
+
+
+@functools.lru_cache(maxsize=None)
+def s3_client():
+    # Created on first use: the render worker imports this module for
+    # mezzanine_key without needing a client of its own.
+    return boto3.client("s3", config=Config(retries={"max_attempts": 3, "mode": "standard"}))
+
+
+def transcode_object(client, bucket: str, key: str) -> Tuple[str, Tuple[int, int]]:
+    """Write the mezzanine of s3://bucket/key; returns its key and size."""
+    with tempfile.TemporaryDirectory(prefix="mezzanine-") as tmp:
+        src = os.path.join(tmp, "source" + (os.path.splitext(key)[1] or ".mp4"))
+        resp = client.get_object(Bucket=bucket, Key=key)
+        with open(src, "wb") as f:
+            for chunk in resp["Body"].iter_chunks(1024 * 1024):
+                f.write(chunk)
+
+        out = os.path.join(tmp, "mezzanine.mp4")
+        size = transcode_mezzanine(src, out)
+        target = mezzanine_key(key)
+        client.upload_file(
+            out,
+            bucket,
+            target,
+            ExtraArgs={"ContentType": "video/mp4", "Metadata": {"source-etag": resp["ETag"].strip('"')}},
+        )
+        logger.info(
+            "Transcoded s3://%s/%s (%d bytes) -> %s %dx%d (%d bytes)",
+            bucket, key, resp["ContentLength"], target, *size, os.path.getsize(out),
+        )
+    return target, size
+
+
+def lambda_handler(event, context):
+    """Transcode every background in an S3 ObjectCreated notification."""
+    transcoded = 0
+    for record in event.get("Records", []):
+        bucket = record["s3"]["bucket"]["name"]
+        key = unquote_plus(record["s3"]["object"]["key"])
+        if key.startswith(MEZZANINE_PREFIX):
+            continue
+        started = time.perf_counter()
+        try:
+            transcode_object(s3_client(), bucket, key)
+            transcoded += 1
+        except Exception:
+            logger.exception("Could not transcode s3://%s/%s; renders will use the original", bucket, key)
+        else:
+            logger.info("Mezzanine transcode took %.0f ms", (time.perf_counter() - started) * 1000)
+    return {"transcoded": transcoded}
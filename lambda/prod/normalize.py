@@ -0,0 +1,82 @@
+"""S3-triggered normalization of uploaded images.
+
+Runs from the same container image as the render worker (with the command
+``normalize.lambda_handler``) on every object created under ``images/``.
+Each upload is decoded once, turned upright from its EXIF orientation and
+downscaled to the largest size any render can place it at (see
+``compositor.max_image_size``), then written as a compact WebP to
+``ingest.normalized_key(key)``. This happens while the user is still
+uploading the second image or submitting the job, so the worker decodes a
+few hundred KB instead of a multi-MB original.
+
+The variant carries the original's ETag in its ``source-etag`` metadata and
+the original's size in its EXIF, so render cache keys and the layout are the
+same whichever variant a render uses. A failed normalization is only
+logged: the worker falls back to the original.
+"""
+
+import logging
+import os
+import tempfile
+import time
+from typing import Tuple
+from urllib.parse import unquote_plus
+
+import boto3
+from botocore.config import Config
+
+from compositor import max_image_size
+from ingest import NORMALIZED_PREFIX, normalize_image, normalized_key
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+s3 = boto3.client("s3", config=Config(retries={"max_attempts": 3, "mode": "standard"}))
+
+# Largest background the overlays are rendered on, as WIDTHxHEIGHT
+NORMALIZE_FRAME_SIZE = tuple(int(v) for v in os.environ.get("NORMALIZE_FRAME_SIZE", "1080x1920").split("x"))
+NORMALIZE_QUALITY = int(os.environ.get("NORMALIZE_QUALITY", "90"))
+
+
+def normalize_object(bucket: str, key: str) -> Tuple[str, Tuple[int, int]]:
+    """Write the normalized variant of s3://bucket/key; returns its key and size."""
+    with tempfile.TemporaryDirectory(prefix="normalize-") as tmp:
+        src = os.path.join(tmp, "source" + (os.path.splitext(key)[1] or ".png"))
+        resp = s3.get_object(Bucket=bucket, Key=key)
+        with open(src, "wb") as f:
+            for chunk in resp["Body"].iter_chunks(1024 * 1024):
+                f.write(chunk)
+
+        out = os.path.join(tmp, "normalized.webp")
+        size = normalize_image(src, out, max_image_size(NORMALIZE_FRAME_SIZE), quality=NORMALIZE_QUALITY)
+        target = normalized_key(key)
+        s3.upload_file(
+            out,
+            bucket,
+            target,
+            ExtraArgs={"ContentType": "image/webp", "Metadata": {"source-etag": resp["ETag"].strip('"')}},
+        )
+        logger.info(
+            "Normalized s3://%s/%s (%d bytes) -> %s %dx%d (%d bytes)",
+            bucket, key, resp["ContentLength"], target, *size, os.path.getsize(out),
+        )
+    return target, size
+
+
+def lambda_handler(event, context):
+    """Normalize every image in an S3 ObjectCreated notification."""
+    normalized = 0
+    for record in event.get("Records", []):
+        bucket = record["s3"]["bucket"]["name"]
+        key = unquote_plus(record["s3"]["object"]["key"])
+        if key.startswith(NORMALIZED_PREFIX):
+            continue
+        started = time.perf_counter()
+        try:
+            normalize_object(bucket, key)
+            normalized += 1
+        except Exception:
+            logger.exception("Could not normalize s3://%s/%s; renders will use the original", bucket, key)
+        else:
+            logger.info("Normalization took %.0f ms", (time.perf_counter() - started) * 1000)
+    return {"normalized": normalized}
@@ -0,0 +1,114 @@
+"""Poster frame and low-resolution preview clip of a job's output.
+
+Both are composited with the same layout math as the final render, on a
+background decoded straight to preview size by ffmpeg, so they appear within
+a second of the inputs arriving while the full-quality encode is still
+running. The layout is proportional to the frame, so a preview is a scaled
+version of the final video (its fixed pixel minimums only bind below about
+400 px tall).
+"""
+
+import logging
+import os
+from typing import Iterator, Optional, Tuple
+
+import imageio_ffmpeg
+import numpy as np
+from PIL import Image
+
+from compositor import OverlayPlane, build_overlay_plane, compute_layout
+from ffmpeg_backend import encode_frames, probe_video
+from ingest import ingest_image, layout_size, open_image
+from profiles import EncodingProfile
+
+logger = logging.getLogger()
+
+# imageio-ffmpeg warns whenever the piped size differs from the source,
+# which is the point of decoding straight to preview size.
+logging.getLogger("imageio_ffmpeg").setLevel(logging.ERROR)
+
+PREVIEW_HEIGHT = int(os.environ.get("PREVIEW_HEIGHT", "480"))
+PREVIEW_FPS = float(os.environ.get("PREVIEW_FPS", "8"))
+
+# Cheapest x264 settings; the preview is replaced by the final render anyway.
+PREVIEW_PROFILE = EncodingProfile("preview", preset="ultrafast", crf=32, threads=0, max_height=None)
+
+POSTER_FORMATS = {".jpg": ("JPEG", 80), ".jpeg": ("JPEG", 80), ".webp": ("WEBP", 75)}
+
+
+def preview_size(frame_size: Tuple[int, int], height: int = PREVIEW_HEIGHT) -> Tuple[int, int]:
+    """Frame size scaled down to height (never up), kept even for yuv420p."""
+    w, h = frame_size
+    if h <= height:
+        return w // 2 * 2, h // 2 * 2
+    return max(2, int(w * height / h) // 2 * 2), height // 2 * 2
+
+
+def _overlay_plane(image1_path: str, image2_path: str, size: Tuple[int, int]) -> OverlayPlane:
+    with open_image(image1_path) as img1, open_image(image2_path) as img2:
+        layout = compute_layout(size, layout_size(img1), layout_size(img2))
+        return build_overlay_plane(
+            layout,
+            ingest_image(img1, layout.image1_size).image,
+            ingest_image(img2, layout.image2_size).image,
+        )
+
+
+def _scaled_frames(video_path: str, size: Tuple[int, int], output_params) -> Iterator[np.ndarray]:
+    """Decode video_path to RGB24 frames of size, scaled inside ffmpeg."""
+    w, h = size
+    reader = imageio_ffmpeg.read_frames(
+        video_path, pix_fmt="rgb24", output_params=output_params + ["-vf", f"scale={w}:{h}"]
+    )
+    try:
+        next(reader)
+        for raw in reader:
+            yield np.frombuffer(raw, dtype=np.uint8).reshape(h, w, 3).copy()
+    finally:
+        reader.close()
+
+
+def render_poster(
+    background_video_path: str,
+    image1_path: str,
+    image2_path: str,
+    output_path: str,
+    height: int = PREVIEW_HEIGHT,
+) -> str:
+    """Write the composited first frame as a JPEG or WebP (by output_path's extension)."""
+    fmt, quality = POSTER_FORMATS[os.path.splitext(output_path)[1].lower()]
+    size = preview_size(probe_video(background_video_path)["size"], height)
+    plane = _overlay_plane(image1_path, image2_path, size)
+    frame = next(_scaled_frames(background_video_path, size, ["-frames:v", "1"]))
+    Image.fromarray(plane.apply(frame)).save(output_path, format=fmt, quality=quality)
+    return output_path
+
+
+def render_preview_clip(
+    background_video_path: str,
+    image1_path: str,
+    image2_path: str,
+    output_path: str,
+    duration_seconds: float = 6.0,
+    height: int = PREVIEW_HEIGHT,
+    fps: float = PREVIEW_FPS,
+    threads: Optional[int] = None,
+) -> str:
+    """Write a silent, low-fps, low-resolution preview of the output clip."""
+    meta = probe_video(background_video_path)
+    size = preview_size(meta["size"], height)
+    trim_end = min(max(0.1, min(float(duration_seconds), 12.0)), meta.get("duration") or duration_seconds)
+    plane = _overlay_plane(image1_path, image2_path, size)
+    frames = _scaled_frames(
+        background_video_path, size, ["-t", f"{trim_end:.3f}", "-r", f"{fps}"]
+    )
+    encode_frames(
+        (plane.apply(frame) for frame in frames),
+        size,
+        fps,
+        output_path,
+        trim_end,
+        profile=PREVIEW_PROFILE,
+        threads=threads or 1,
+    )
+    return output_path
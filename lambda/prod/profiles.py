@@ -0,0 +1,56 @@
+"""Named encoding profiles trading turnaround time against compression.
+
+A profile fixes the x264 preset and CRF, an optional thread count and the
+largest output frame height. Threads default to the vCPUs Lambda actually
+allocates for the configured memory size rather than a hardcoded number.
+"""
+
+import os
+from typing import NamedTuple, Optional, Tuple
+
+
+class EncodingProfile(NamedTuple):
+    name: str
+    preset: str
+    crf: int
+    # 0 picks a thread count from the available vCPUs
+    threads: int
+    # None keeps the background's resolution
+    max_height: Optional[int]
+
+
+PROFILES = {
+    "fast": EncodingProfile("fast", preset="veryfast", crf=26, threads=0, max_height=960),
+    "balanced": EncodingProfile("balanced", preset="medium", crf=23, threads=0, max_height=1280),
+    "archive": EncodingProfile("archive", preset="slow", crf=19, threads=0, max_height=None),
+}
+
+DEFAULT_PROFILE = os.environ.get("ENCODING_PROFILE", "balanced")
+
+
+def available_cpus() -> int:
+    """vCPUs this process may run on (what Lambda allocates for its memory size)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def get_profile(name: Optional[str] = None) -> EncodingProfile:
+    """Look up a profile by name, falling back to ENCODING_PROFILE."""
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown encoding profile: {name}")
+    return PROFILES[name]
+
+
+def encoder_threads(profile: EncodingProfile, cpus: Optional[int] = None) -> int:
+    """Thread count for one encode given the vCPUs it may use."""
+    return profile.threads or max(1, cpus or available_cpus())
+
+
+def output_size(profile: EncodingProfile, frame_size: Tuple[int, int]) -> Tuple[int, int]:
+    """Frame size after applying the profile's height cap (kept even for yuv420p)."""
+    w, h = frame_size
+    if profile.max_height is None or h <= profile.max_height:
+        return w, h
+    return max(2, int(w * profile.max_height / h) // 2 * 2), profile.max_height
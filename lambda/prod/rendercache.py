@@ -0,0 +1,108 @@
+"""Content-addressed cache of finished renders.
+
+A render is fully determined by the background and image bytes (identified by
+their S3 ETags) and the job parameters, so its output can be reused whenever
+the same combination is submitted again. Finished renders are kept under
+``RENDER_CACHE_PREFIX`` in the output bucket, named by a hash of those
+inputs, and served to new jobs with an S3 server-side copy. A job's extra
+renditions (see renditions.py) are cached as ``<digest>-<name>.<format>``.
+
+``lambda/api/handler.py`` computes the same key to answer repeat submissions
+without queueing them; keep ``render_cache_key`` in sync with it.
+
+The worker also stores the key (and the SQS message id) as metadata on each
+output it writes, so a redelivered message can tell its own finished output
+from an unrelated object left at the same key (see output_metadata).
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+RENDER_CACHE_ENABLED = os.environ.get("RENDER_CACHE", "1").lower() not in ("0", "false", "no", "off", "")
+RENDER_CACHE_PREFIX = os.environ.get("RENDER_CACHE_PREFIX", "renders/")
+
+# Bump when a change to the renderer should invalidate existing entries.
+RENDER_CACHE_VERSION = 3
+
+# S3 user metadata keys the worker sets on the outputs it writes
+DIGEST_METADATA = "render-digest"
+MESSAGE_ID_METADATA = "sqs-message-id"
+
+
+def render_cache_key(
+    background: Tuple[str, str],
+    background_etag: str,
+    image_etags: Sequence[str],
+    include_audio: bool,
+    duration_seconds: float,
+    profile: str,
+) -> str:
+    """Hash of everything that determines the output video.
+
+    The render backend and compositor are deliberately left out: their
+    outputs are visually equivalent, so either may serve the other's entry.
+    """
+    duration_seconds = max(0.1, min(float(duration_seconds), 12.0))
+    material = {
+        "v": RENDER_CACHE_VERSION,
+        "background": [background[0], background[1], background_etag.strip('"')],
+        "images": [etag.strip('"') for etag in image_etags],
+        "include_audio": bool(include_audio),
+        "duration_seconds": round(duration_seconds, 3),
+        "profile": profile,
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def cache_object_key(digest: str, ext: str = ".mp4") -> str:
+    return f"{RENDER_CACHE_PREFIX}{digest}{ext}"
+
+
+def output_metadata(client, bucket: str, key: str) -> Optional[Dict[str, str]]:
+    """The object's S3 user metadata, or None if there is no such object."""
+    try:
+        return client.head_object(Bucket=bucket, Key=key).get("Metadata", {})
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def copy_object(client, bucket: str, src_key: str, dst_key: str, metadata: Optional[Dict[str, str]] = None) -> None:
+    """Server-side copy; metadata, if given, replaces the source's."""
+    extra = {"MetadataDirective": "REPLACE", "Metadata": metadata} if metadata is not None else {}
+    client.copy_object(Bucket=bucket, Key=dst_key, CopySource={"Bucket": bucket, "Key": src_key}, **extra)
+
+
+def serve_from_cache(
+    client, bucket: str, digest: str, output_key: str, metadata: Optional[Dict[str, str]] = None
+) -> bool:
+    """Copy a cached render to output_key; return False on a cache miss."""
+    src = cache_object_key(digest, os.path.splitext(output_key)[1] or ".mp4")
+    try:
+        copy_object(client, bucket, src, output_key, metadata)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    logger.info("Render cache hit: copied s3://%s/%s to %s", bucket, src, output_key)
+    return True
+
+
+def store_in_cache(client, bucket: str, output_key: str, digest: str) -> Optional[str]:
+    """Best-effort copy of a fresh render into the cache; returns its key."""
+    dst = cache_object_key(digest, os.path.splitext(output_key)[1] or ".mp4")
+    try:
+        copy_object(client, bucket, output_key, dst)
+        return dst
+    except ClientError:
+        logger.warning("Could not store render in cache at s3://%s/%s", bucket, dst, exc_info=True)
+        return None
@@ -0,0 +1,99 @@
+"""Named extra renditions rendered alongside a job's main output.
+
+A job may ask for smaller copies of its clip (a feed-sized MP4, a GIF for
+chat apps) with ``"renditions": ["small", "gif"]``. They are encoded from the
+same composited frames as the main output in a single pass (see
+``grouprender.render_renditions``) and uploaded next to it as
+``<output base>-<name>.<format>``.
+"""
+
+import os
+from typing import List, NamedTuple, Optional, Tuple
+
+import imageio_ffmpeg
+
+from ffmpeg_backend import encoder_command
+from profiles import EncodingProfile, output_size
+
+
+class Rendition(NamedTuple):
+    name: str
+    # "mp4" (H.264 with the background audio) or "gif" (silent, own palette)
+    format: str
+    # None keeps the background's resolution
+    max_height: Optional[int]
+    # Frame rate cap; None keeps the background's
+    max_fps: Optional[float]
+    # x264 settings of mp4 renditions
+    preset: str = "veryfast"
+    crf: int = 26
+
+    @property
+    def encoding(self) -> EncodingProfile:
+        return EncodingProfile(self.name, preset=self.preset, crf=self.crf, threads=0, max_height=self.max_height)
+
+    @property
+    def content_type(self) -> str:
+        return "image/gif" if self.format == "gif" else "video/mp4"
+
+
+RENDITIONS = {
+    "small": Rendition("small", "mp4", max_height=480, max_fps=None, crf=28),
+    "gif": Rendition("gif", "gif", max_height=360, max_fps=10),
+}
+
+
+def get_rendition(name: str) -> Rendition:
+    if name not in RENDITIONS:
+        raise ValueError(f"Unknown rendition: {name}")
+    return RENDITIONS[name]
+
+
+def rendition_key(output_key: str, rendition: Rendition) -> str:
+    """S3 key of a rendition of output_key (outputs/abc.mp4 -> outputs/abc-gif.gif)."""
+    return f"{os.path.splitext(output_key)[0]}-{rendition.name}.{rendition.format}"
+
+
+def rendition_size(rendition: Rendition, frame_size: Tuple[int, int]) -> Tuple[int, int]:
+    return output_size(rendition.encoding, frame_size)
+
+
+def rendition_command(
+    rendition: Rendition,
+    frame_size: Tuple[int, int],
+    fps: float,
+    output_path: str,
+    trim_end: float,
+    audio_source: Optional[str] = None,
+    threads: int = 1,
+) -> List[str]:
+    """ffmpeg command encoding RGB24 frames from stdin into rendition."""
+    if rendition.format == "mp4":
+        cmd = encoder_command(frame_size, fps, output_path, trim_end, audio_source, rendition.encoding, threads)
+        if rendition.max_fps and fps > rendition.max_fps:
+            cmd[-1:-1] = ["-r", f"{rendition.max_fps:g}"]
+        return cmd
+    if rendition.format != "gif":
+        raise ValueError(f"Unknown rendition format: {rendition.format}")
+    w, h = frame_size
+    out_w, out_h = rendition_size(rendition, frame_size)
+    filters = f"scale={out_w}:{out_h}:flags=lanczos"
+    if rendition.max_fps and fps > rendition.max_fps:
+        filters = f"fps={rendition.max_fps:g}," + filters
+    # One palette for the whole clip, built from the frames' differences
+    filters += ",split[a][b];[a]palettegen=stats_mode=diff[p];[b][p]paletteuse=dither=bayer:bayer_scale=3"
+    return [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-y",
+        "-loglevel", "error",
+        "-f", "rawvideo",
+        "-pix_fmt", "rgb24",
+        "-s", f"{w}x{h}",
+        "-r", f"{fps}",
+        "-i", "-",
+        "-vf", filters,
+        "-t", f"{trim_end:.3f}",
+        "-loop", "0",
+        "-f", "gif",
+        output_path,
+    ]
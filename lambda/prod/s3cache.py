@@ -0,0 +1,169 @@
+"""Warm-container cache for S3 objects reused across invocations.
+
+Nearly every job renders on the same background video, and a warm Lambda
+container keeps both this module's state and ``/tmp`` between invocations.
+Cached files are keyed by bucket, key and ETag and evicted least recently used
+first once the configured disk budget is exceeded. A cached entry is trusted
+for ``revalidate_after`` seconds; after that one conditional GET (``If-None-
+Match``) confirms it is still current without transferring the body.
+
+Forked job workers inherit the cache and share its directory, but each has
+its own copy of the index. Files are therefore only ever deleted by the
+process that created the cache, and only while no worker holds the
+directory's shared ``flock`` (taken on a worker's first fetch and held until
+it exits). Evicted or replaced files leave the index at once and are deleted
+by the next sweep that gets the exclusive lock. Every writer downloads to its
+own temporary file and renames it into place, so a file under its final
+name is always complete.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+CHUNK_SIZE = 1024 * 1024
+LOCK_FILENAME = ".lock"
+
+
+class CacheEntry(NamedTuple):
+    etag: str
+    path: str
+    size: int
+    checked_at: float
+    metadata: Dict[str, str]
+
+
+class S3FileCache:
+    """LRU file cache of S3 objects under a local directory."""
+
+    def __init__(self, client, root: str, max_bytes: int, revalidate_after: float = 60.0):
+        self.client = client
+        self.root = root
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        # Bytes transferred from S3 by this cache (misses only)
+        self.bytes_fetched = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._owner_pid = os.getpid()
+        # A forked worker's open lock file and its pid
+        self._shared = None
+        # Files left behind by a previous runtime process in this sandbox are
+        # not in the index, so start from an empty directory.
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(e.size for e in self._entries.values())
+
+    def fetch(self, bucket: str, key: str) -> str:
+        """Return a local path holding the current version of s3://bucket/key."""
+        with self._lock:
+            self._hold_shared()
+            entry = self._entries.get((bucket, key))
+            if entry is not None and time.time() - entry.checked_at < self.revalidate_after:
+                self._entries.move_to_end((bucket, key))
+                logger.info("Cache hit for s3://%s/%s (etag %s)", bucket, key, entry.etag)
+                return entry.path
+
+            params = {"Bucket": bucket, "Key": key}
+            if entry is not None:
+                params["IfNoneMatch"] = entry.etag
+            try:
+                resp = self.client.get_object(**params)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if entry is not None and code in ("304", "NotModified"):
+                    self._entries[(bucket, key)] = entry._replace(checked_at=time.time())
+                    self._entries.move_to_end((bucket, key))
+                    logger.info("Cache revalidated s3://%s/%s (etag %s)", bucket, key, entry.etag)
+                    return entry.path
+                raise
+
+            etag = resp["ETag"]
+            path = os.path.join(self.root, self._filename(bucket, key, etag))
+            size = self._write_body(resp["Body"], path)
+            self.bytes_fetched += size
+            self._entries.pop((bucket, key), None)
+            self._entries[(bucket, key)] = CacheEntry(etag, path, size, time.time(), resp.get("Metadata", {}))
+            self._evict(keep=(bucket, key))
+            self._sweep()
+            logger.info("Cache miss for s3://%s/%s: stored %d bytes (etag %s)", bucket, key, size, etag)
+            return path
+
+    def etag(self, bucket: str, key: str) -> Optional[str]:
+        """ETag of the cached copy of s3://bucket/key, if any."""
+        entry = self._entries.get((bucket, key))
+        return entry.etag if entry is not None else None
+
+    def metadata(self, bucket: str, key: str) -> Dict[str, str]:
+        """User metadata of the cached copy of s3://bucket/key ({} if not cached)."""
+        entry = self._entries.get((bucket, key))
+        return entry.metadata if entry is not None else {}
+
+    def _filename(self, bucket: str, key: str, etag: str) -> str:
+        digest = hashlib.sha256(f"{bucket}/{key}/{etag}".encode("utf-8")).hexdigest()[:32]
+        return digest + os.path.splitext(key)[1]
+
+    def _write_body(self, body, path: str) -> int:
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: body.read(CHUNK_SIZE), b""):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            body.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return size
+
+    def _evict(self, keep) -> None:
+        while self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            logger.info("Evicting s3://%s/%s from cache", *oldest)
+            del self._entries[oldest]
+
+    def _hold_shared(self) -> None:
+        """In a forked worker, hold a shared lock on the directory until exit."""
+        if os.getpid() == self._owner_pid or (self._shared and self._shared[1] == os.getpid()):
+            return
+        f = open(os.path.join(self.root, LOCK_FILENAME), "a")
+        fcntl.flock(f, fcntl.LOCK_SH)
+        self._shared = (f, os.getpid())
+
+    def _sweep(self) -> None:
+        """Delete files no longer in the index (evicted, replaced, or written
+        by finished workers); only the owner does, and only while no worker
+        holds the directory."""
+        if os.getpid() != self._owner_pid:
+            return
+        with open(os.path.join(self.root, LOCK_FILENAME), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Cache in use by a worker; deferring cleanup")
+                return
+            indexed = {os.path.basename(e.path) for e in self._entries.values()}
+            for name in os.listdir(self.root):
+                if name not in indexed and name != LOCK_FILENAME:
+                    try:
+                        os.remove(os.path.join(self.root, name))
+                    except OSError:
+                        pass
@@ -0,0 +1,145 @@
+"""Stream encoder output into an S3 multipart upload while encoding.
+
+The encoder writes a fragmented MP4 (which needs no seek back to patch the
+moov atom) into a named pipe inside the job workspace. A reader thread cuts
+the stream into parts and uploads them while encoding continues, so the upload
+overlaps the encode and the full file never has to exist in ``/tmp``.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger()
+
+# S3 requires every part but the last to be at least 5 MiB.
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+READ_SIZE = 256 * 1024
+MAX_PARTS_IN_FLIGHT = 4
+
+# ffmpeg muxer flags for an MP4 that can be written to a non-seekable pipe
+FRAGMENTED_MP4_FLAGS = ["-movflags", "frag_keyframe+empty_moov+default_base_moof"]
+
+
+class StreamingUpload:
+    """Context manager exposing a FIFO path whose contents land in s3://bucket/key.
+
+    The multipart upload is completed on a clean exit and aborted if the
+    render or any part upload fails.
+    """
+
+    def __init__(self, client, fifo_path: str, bucket: str, key: str,
+                 part_size: int = DEFAULT_PART_SIZE, content_type: str = "video/mp4",
+                 metadata: Optional[Dict[str, str]] = None):
+        self.client = client
+        self.path = fifo_path
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, 5 * 1024 * 1024)
+        self.content_type = content_type
+        self.metadata = metadata or {}
+        self.bytes_uploaded = 0
+        self._upload_id = None
+        self._parts = []
+        self._error = None
+        self._thread = None
+        self._slots = threading.BoundedSemaphore(MAX_PARTS_IN_FLIGHT)
+        self._pool = ThreadPoolExecutor(max_workers=MAX_PARTS_IN_FLIGHT)
+
+    def __enter__(self) -> "StreamingUpload":
+        os.mkfifo(self.path)
+        resp = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=self.key, ContentType=self.content_type, Metadata=self.metadata
+        )
+        self._upload_id = resp["UploadId"]
+        self._thread = threading.Thread(target=self._pump, name="s3-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self._unblock_reader()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+        error = self._error
+        if exc_type is None and error is None and self.bytes_uploaded == 0:
+            error = RuntimeError("encoder produced no output")
+        try:
+            if exc_type is not None or error is not None:
+                self._abort()
+            else:
+                self._complete()
+        finally:
+            os.remove(self.path)
+        if exc_type is None and error is not None:
+            raise error
+
+    def _abort(self) -> None:
+        # A failed abort must not replace the render's own error; parts left
+        # behind are removed by the bucket's AbortIncompleteMultipartUpload rule.
+        logger.error("Aborting multipart upload of s3://%s/%s", self.bucket, self.key)
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        except Exception:
+            logger.exception("Could not abort multipart upload %s of s3://%s/%s", self._upload_id, self.bucket, self.key)
+
+    def _unblock_reader(self) -> None:
+        # If the encoder died before opening the FIFO, the reader is still
+        # blocked in open(); briefly opening the write end releases it.
+        if not self._thread.is_alive():
+            return
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            os.close(fd)
+        except OSError:
+            pass
+
+    def _pump(self) -> None:
+        futures: List = []
+        buf = bytearray()
+        try:
+            with open(self.path, "rb", buffering=0) as f:
+                while True:
+                    chunk = f.read(READ_SIZE)
+                    if not chunk:
+                        break
+                    buf += chunk
+                    if len(buf) >= self.part_size:
+                        futures.append(self._submit(len(futures) + 1, bytes(buf)))
+                        buf.clear()
+                    if self._error is not None:
+                        break
+            if buf and self._error is None:
+                futures.append(self._submit(len(futures) + 1, bytes(buf)))
+            for future in futures:
+                future.result()
+        except Exception as e:
+            logger.exception("Streaming upload failed")
+            self._error = self._error or e
+
+    def _submit(self, part_number: int, data: bytes):
+        self._slots.acquire()
+        self.bytes_uploaded += len(data)
+        return self._pool.submit(self._upload_part, part_number, data)
+
+    def _upload_part(self, part_number: int, data: bytes) -> None:
+        try:
+            resp = self.client.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=part_number, Body=data
+            )
+            self._parts.append({"PartNumber": part_number, "ETag": resp["ETag"]})
+        except Exception as e:
+            self._error = self._error or e
+            raise
+        finally:
+            self._slots.release()
+
+    def _complete(self) -> None:
+        parts = sorted(self._parts, key=lambda p: p["PartNumber"])
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={"Parts": parts}
+        )
+        logger.info("Streamed %d bytes in %d parts to s3://%s/%s", self.bytes_uploaded, len(parts), self.bucket, self.key)
+
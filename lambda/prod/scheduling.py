@@ -0,0 +1,222 @@
+"""Job classes, render cost estimates and an in-memory queue stand-in.
+
+The API estimates what a job will cost to render from its duration, audio
+and encoding profile, and routes it by that cost to one of three queues, each
+drained by the worker with its own concurrency:
+
+- ``interactive``: short clips (a 3 second ``balanced`` render, say), so they
+  never wait behind a burst of long renders;
+- ``standard``: everything else;
+- ``bulk``: long ``archive`` renders and grouped batch jobs.
+
+The estimate travels with the message as ``estimated_cost``. The worker runs
+the cheapest jobs of a batch first and shares its vCPUs between concurrent
+jobs in proportion to their cost.
+
+Queues are chosen with ``JOB_QUEUE``: unset uses SQS, ``memory`` a
+process-local ``MemoryQueue`` with the subset of the SQS client API the
+project uses, so scheduling can be exercised offline.
+
+This file is deployed with both lambda/api and lambda/prod; the two copies
+must stay identical (checked by lambda/tests/test_shared_modules.py).
+"""
+
+import hashlib
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+import boto3
+
+JOB_CLASSES = ("interactive", "standard", "bulk")
+
+# Render cost per clip second relative to "balanced" (x264 preset and size)
+PROFILE_COST = {"fast": 0.5, "balanced": 1.0, "archive": 2.5}
+# Fetching inputs, the render cache check and uploading, per output
+JOB_OVERHEAD_COST = 1.0
+# Muxing (or re-encoding) the background audio, per clip second
+AUDIO_COST = 0.05
+
+# Jobs estimated at or below this cost are interactive, at or above
+# BULK_MIN_COST bulk.
+INTERACTIVE_MAX_COST = float(os.environ.get("INTERACTIVE_MAX_COST", "4"))
+BULK_MIN_COST = float(os.environ.get("BULK_MIN_COST", "30"))
+
+
+def estimate_cost(duration_seconds: float, include_audio: bool, profile: Optional[str], outputs: int = 1) -> float:
+    """Relative render cost, about one unit per second of "balanced" video.
+
+    Only the order of magnitude matters: it ranks and routes jobs.
+    """
+    duration_seconds = max(0.1, min(float(duration_seconds), 12.0))
+    per_second = PROFILE_COST.get(profile or "balanced", 1.0) + (AUDIO_COST if include_audio else 0.0)
+    return round(outputs * (JOB_OVERHEAD_COST + duration_seconds * per_second), 3)
+
+
+def job_class(cost: float) -> str:
+    """Queue class for a job of the given estimated cost."""
+    if cost <= INTERACTIVE_MAX_COST:
+        return "interactive"
+    if cost >= BULK_MIN_COST:
+        return "bulk"
+    return "standard"
+
+
+def message_cost(payload: dict) -> float:
+    """estimated_cost of a queued job, estimated from its fields when absent
+    (messages sent before the API recorded it)."""
+    if not isinstance(payload, dict):
+        return 0.0
+    try:
+        return float(payload["estimated_cost"])
+    except (KeyError, TypeError, ValueError):
+        pass
+    try:
+        duration_seconds = float(payload.get("duration_seconds", 6.0))
+    except (TypeError, ValueError):
+        duration_seconds = 6.0
+    return estimate_cost(
+        duration_seconds,
+        bool(payload.get("include_audio", True)),
+        payload.get("profile"),
+        outputs=len(payload.get("jobs") or ()) or 1,
+    )
+
+
+def cpu_share(cost: float, running_costs: Iterable[float], cpus: int) -> int:
+    """vCPUs for a job of cost starting next to jobs of running_costs, in
+    proportion to its share of the total (at least one)."""
+    total = cost + sum(running_costs)
+    if total <= 0:
+        return max(1, cpus)
+    return max(1, min(cpus, round(cpus * cost / total)))
+
+
+class MemoryQueue:
+    """Process-local stand-in for the SQS client, for tests and local runs.
+
+    Supports send_message, receive_message, delete_message,
+    change_message_visibility and get_queue_attributes, with visibility
+    timeouts and receive counts; any QueueUrl is accepted and created on
+    first use. clock may be replaced to drive simulated time.
+    """
+
+    def __init__(self, visibility_timeout: float = 900.0, clock: Callable[[], float] = time.time):
+        self.visibility_timeout = visibility_timeout
+        self.clock = clock
+        self._queues: Dict[str, "OrderedDict[str, dict]"] = {}
+        self._receipts = itertools.count(1)
+        self._lock = threading.Condition()
+
+    def send_message(self, QueueUrl: str, MessageBody: str, DelaySeconds: int = 0, MessageAttributes=None, **kwargs) -> dict:
+        message_id = str(uuid.uuid4())
+        with self._lock:
+            self._queues.setdefault(QueueUrl, OrderedDict())[message_id] = {
+                "MessageId": message_id,
+                "Body": MessageBody,
+                "MessageAttributes": MessageAttributes or {},
+                "sent_at": self.clock(),
+                "visible_at": self.clock() + DelaySeconds,
+                "receive_count": 0,
+                "receipt": None,
+            }
+            self._lock.notify_all()
+        return {"MessageId": message_id, "MD5OfMessageBody": hashlib.md5(MessageBody.encode("utf-8")).hexdigest()}
+
+    def receive_message(
+        self,
+        QueueUrl: str,
+        MaxNumberOfMessages: int = 1,
+        VisibilityTimeout: Optional[float] = None,
+        WaitTimeSeconds: float = 0,
+        **kwargs,
+    ) -> dict:
+        """Oldest visible messages first, hidden for VisibilityTimeout seconds.
+
+        WaitTimeSeconds long-polls in real time, so leave it at 0 with a
+        simulated clock.
+        """
+        timeout = self.visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self._lock:
+            while True:
+                now = self.clock()
+                visible = [m for m in self._queues.get(QueueUrl, {}).values() if m["visible_at"] <= now]
+                if visible or time.monotonic() >= deadline:
+                    break
+                self._lock.wait(max(0.0, min(1.0, deadline - time.monotonic())))
+            messages = []
+            for message in visible[:max(1, min(10, MaxNumberOfMessages))]:
+                message.update(visible_at=now + timeout, receipt=f"{message['MessageId']}-{next(self._receipts)}")
+                message["receive_count"] += 1
+                messages.append({
+                    "MessageId": message["MessageId"],
+                    "ReceiptHandle": message["receipt"],
+                    "Body": message["Body"],
+                    "MessageAttributes": message["MessageAttributes"],
+                    "Attributes": {
+                        "ApproximateReceiveCount": str(message["receive_count"]),
+                        "SentTimestamp": str(int(message["sent_at"] * 1000)),
+                    },
+                })
+        return {"Messages": messages} if messages else {}
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str, **kwargs) -> dict:
+        with self._lock:
+            self._queues.get(QueueUrl, {}).pop(self._find(QueueUrl, ReceiptHandle), None)
+        return {}
+
+    def change_message_visibility(self, QueueUrl: str, ReceiptHandle: str, VisibilityTimeout: float, **kwargs) -> dict:
+        with self._lock:
+            message = self._queues.get(QueueUrl, {}).get(self._find(QueueUrl, ReceiptHandle))
+            if message is not None:
+                message["visible_at"] = self.clock() + VisibilityTimeout
+                self._lock.notify_all()
+        return {}
+
+    def get_queue_attributes(self, QueueUrl: str, AttributeNames: Optional[List[str]] = None, **kwargs) -> dict:
+        with self._lock:
+            now = self.clock()
+            messages = list(self._queues.get(QueueUrl, {}).values())
+        visible = sum(1 for m in messages if m["visible_at"] <= now)
+        return {"Attributes": {
+            "ApproximateNumberOfMessages": str(visible),
+            "ApproximateNumberOfMessagesNotVisible": str(len(messages) - visible),
+        }}
+
+    def _find(self, queue_url: str, receipt: str) -> Optional[str]:
+        for message_id, message in self._queues.get(queue_url, {}).items():
+            if message["receipt"] == receipt:
+                return message_id
+        return None
+
+
+def sqs_event(queue_url: str, messages: List[dict]) -> dict:
+    """Lambda SQS trigger event for messages returned by receive_message."""
+    return {"Records": [
+        {
+            "messageId": m["MessageId"],
+            "receiptHandle": m["ReceiptHandle"],
+            "body": m["Body"],
+            "attributes": m.get("Attributes", {}),
+            "messageAttributes": m.get("MessageAttributes", {}),
+            "eventSource": "aws:sqs",
+            "eventSourceARN": queue_url,
+        }
+        for m in messages
+    ]}
+
+
+# Shared by everything in this process that uses JOB_QUEUE=memory
+memory_queue = MemoryQueue()
+
+
+def queue_client_from_env():
+    """SQS client, or the process-wide MemoryQueue when JOB_QUEUE=memory."""
+    if os.environ.get("JOB_QUEUE", "") == "memory":
+        return memory_queue
+    return boto3.client("sqs")
@@ -0,0 +1,253 @@
+"""Time-sliced parallel rendering.
+
+A single encode of the whole clip stops scaling past a couple of x264
+threads, and compositing in Python runs on one core. Instead the clip's
+frames are split into contiguous segments, each rendered by its own forked
+process: it decodes just its range of the background (accurate seek, or a
+slice of stored frames), blends the same overlay plane and encodes a
+video-only segment. Every segment starts with its own IDR frame, so the
+segments are joined with ffmpeg's concat demuxer as a stream copy (no
+re-encode), and the background audio is muxed once over the full range in
+that same step.
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+from multiprocessing.connection import wait
+from typing import Iterator, List, Optional, Tuple, Union
+
+import imageio_ffmpeg
+import numpy as np
+
+from compositor import OverlayPlane, build_overlay_plane, compute_layout
+from ffmpeg_backend import ProgressCallback, audio_args, encode_frames, probe_video, run_ffmpeg
+from framestore import StoredFrames
+from ingest import ingest_image, layout_size, open_image
+from profiles import EncodingProfile, available_cpus, encoder_threads, get_profile
+from s3stream import FRAGMENTED_MP4_FLAGS
+
+logger = logging.getLogger()
+
+# "auto" uses one segment per vCPU; a number fixes the count; 1 disables.
+RENDER_SEGMENTS = os.environ.get("RENDER_SEGMENTS", "1")
+# Shorter segments spend more of their time on process start-up and seeking.
+MIN_SEGMENT_SECONDS = float(os.environ.get("MIN_SEGMENT_SECONDS", "2"))
+
+# Frames between progress messages from a segment process
+PROGRESS_EVERY = 10
+
+
+def segment_count(setting: Union[int, str], duration_seconds: float, cpus: int) -> int:
+    """Segments to render a clip of duration_seconds with, given cpus vCPUs."""
+    if multiprocessing.current_process().daemon:
+        # Jobs run in parallel from an SQS batch are daemonic processes,
+        # which cannot fork workers of their own.
+        return 1
+    count = cpus if str(setting).strip().lower() == "auto" else int(setting)
+    return max(1, min(count, int(duration_seconds // MIN_SEGMENT_SECONDS)))
+
+
+def plan_segments(frames_total: int, segments: int) -> List[Tuple[int, int]]:
+    """Split frames [0, frames_total) into `segments` near-equal [start, end) ranges."""
+    segments = max(1, min(segments, frames_total))
+    bounds = [round(i * frames_total / segments) for i in range(segments + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _segment_frames(
+    background_video_path: str,
+    background_frames: Optional[StoredFrames],
+    fps: float,
+    start: int,
+    end: int,
+) -> Iterator[np.ndarray]:
+    """Background frames start..end-1, decoded only from their own range."""
+    if background_frames is not None:
+        for i in range(start, min(end, len(background_frames.frames))):
+            yield background_frames.frames[i]
+        return
+    # Seeking half a frame early keeps frame `start` despite rounding in its
+    # timestamp; passthrough stops ffmpeg duplicating it to fill the gap.
+    seek = max(0.0, (start - 0.5) / fps)
+    reader = imageio_ffmpeg.read_frames(
+        background_video_path,
+        pix_fmt="rgb24",
+        input_params=["-ss", f"{seek:.6f}"],
+        output_params=["-fps_mode", "passthrough", "-frames:v", str(end - start)],
+    )
+    try:
+        meta = next(reader)
+        w, h = meta["size"]
+        for raw in reader:
+            yield np.frombuffer(raw, dtype=np.uint8).reshape(h, w, 3)
+    finally:
+        reader.close()
+
+
+def _render_segment(
+    conn,
+    index: int,
+    background_video_path: str,
+    background_frames: Optional[StoredFrames],
+    plane: OverlayPlane,
+    frame_size: Tuple[int, int],
+    fps: float,
+    span: Tuple[int, int],
+    output_path: str,
+    profile: EncodingProfile,
+    threads: int,
+) -> None:
+    """Process entrypoint: composite and encode one segment, reporting progress."""
+    start, end = span
+
+    def on_progress(done: int, total: int) -> None:
+        if done % PROGRESS_EVERY == 0:
+            conn.send(("progress", index, done))
+
+    try:
+        frames = _segment_frames(background_video_path, background_frames, fps, start, end)
+        encode_frames(
+            (plane.apply(frame) for frame in frames),
+            frame_size,
+            fps,
+            output_path,
+            (end - start) / fps,
+            profile=profile,
+            threads=threads,
+            on_progress=on_progress,
+        )
+        conn.send(("done", index, end - start))
+    except Exception as e:
+        logger.exception("Segment %d failed", index)
+        conn.send(("error", index, str(e) or e.__class__.__name__))
+    finally:
+        conn.close()
+
+
+def concat_command(
+    segment_list: str,
+    output_path: str,
+    trim_end: float,
+    audio_source: Optional[str] = None,
+    fragmented: bool = False,
+) -> List[str]:
+    """ffmpeg command joining encoded segments by stream copy, muxing audio once."""
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-y",
+        "-loglevel", "error",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", segment_list,
+    ]
+    if audio_source:
+        cmd += ["-t", f"{trim_end:.3f}", "-i", audio_source, "-map", "0:v"]
+        cmd += audio_args(probe_video(audio_source), 1)
+    else:
+        cmd += ["-an"]
+    cmd += ["-c:v", "copy", "-t", f"{trim_end:.3f}"]
+    if fragmented:
+        cmd += FRAGMENTED_MP4_FLAGS + ["-f", "mp4"]
+    cmd.append(output_path)
+    return cmd
+
+
+def render_segmented(
+    background_video_path: str,
+    image1_path: str,
+    image2_path: str,
+    output_path: str,
+    segments: int,
+    include_audio: bool = True,
+    duration_seconds: float = 6.0,
+    background_frames: Optional[StoredFrames] = None,
+    fragmented: bool = False,
+    profile: Optional[EncodingProfile] = None,
+    cpus: Optional[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> None:
+    """Render the clip as `segments` time slices in parallel and join them.
+
+    duration_seconds must already be clamped by the caller. The output
+    matches ``overlay_images_on_video``'s plane compositor frame for frame;
+    only the encoder's keyframe placement differs.
+    """
+    profile = profile or get_profile()
+    cpus = cpus or available_cpus()
+    if background_frames is not None:
+        fps, frame_size, bg_duration = background_frames.fps, tuple(background_frames.size), background_frames.duration
+    else:
+        meta = probe_video(background_video_path)
+        fps, frame_size, bg_duration = meta.get("fps") or 24, tuple(meta["size"]), meta.get("duration")
+    trim_end = min(duration_seconds, bg_duration or duration_seconds)
+    frames_total = math.ceil(round(trim_end * fps, 6))
+    min_frames = max(1, int(MIN_SEGMENT_SECONDS * fps))
+    spans = plan_segments(frames_total, min(segments, max(1, frames_total // min_frames)))
+    threads = max(1, encoder_threads(profile, cpus) // len(spans))
+
+    with open_image(image1_path) as img1, open_image(image2_path) as img2:
+        layout = compute_layout(frame_size, layout_size(img1), layout_size(img2))
+        plane = build_overlay_plane(
+            layout,
+            ingest_image(img1, layout.image1_size).image,
+            ingest_image(img2, layout.image2_size).image,
+        )
+
+    workdir = tempfile.mkdtemp(prefix="segments-", dir=os.path.dirname(os.path.abspath(output_path)))
+    ctx = multiprocessing.get_context("fork")
+    running = {}
+    try:
+        paths = [os.path.join(workdir, f"segment{i:03d}.mp4") for i in range(len(spans))]
+        logger.info("Rendering %d frames as %d segments of ~%d frames", frames_total, len(spans), frames_total // len(spans))
+        for i, span in enumerate(spans):
+            recv_conn, send_conn = ctx.Pipe(duplex=False)
+            proc = ctx.Process(
+                target=_render_segment,
+                args=(send_conn, i, background_video_path, background_frames, plane, frame_size, fps, span,
+                      paths[i], profile, threads),
+            )
+            proc.start()
+            send_conn.close()
+            running[recv_conn] = proc
+
+        done = [0] * len(spans)
+        errors = []
+        while running:
+            for conn in wait(list(running)):
+                try:
+                    kind, index, value = conn.recv()
+                except EOFError:
+                    proc = running.pop(conn)
+                    proc.join()
+                    if proc.exitcode != 0:
+                        errors.append(f"segment process exited with code {proc.exitcode}")
+                    continue
+                if kind == "error":
+                    errors.append(f"segment {index}: {value}")
+                    continue
+                done[index] = value
+                if on_progress is not None:
+                    on_progress(sum(done), frames_total)
+        if errors:
+            raise RuntimeError("Segmented render failed: " + "; ".join(errors))
+
+        segment_list = os.path.join(workdir, "segments.txt")
+        with open(segment_list, "w") as f:
+            f.writelines(f"file '{path}'\n" for path in paths)
+        run_ffmpeg(concat_command(
+            segment_list,
+            output_path,
+            trim_end,
+            audio_source=(background_video_path if include_audio else None),
+            fragmented=fragmented,
+        ))
+    finally:
+        for conn, proc in running.items():
+            proc.kill()
+            proc.join()
+            conn.close()
+        shutil.rmtree(workdir, ignore_errors=True)
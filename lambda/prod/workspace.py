@@ -0,0 +1,54 @@
+"""Per-job scratch directories.
+
+Every job gets its own directory under the scratch root for its downloaded
+images, encoder temp files and output, so several jobs can render in the same
+process or container without touching each other's files. The directory is
+removed when the job finishes, whether it succeeded or not.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger()
+
+
+class ScratchSpaceError(RuntimeError):
+    """Raised when the scratch filesystem cannot hold another job."""
+
+
+class JobWorkspace:
+    """Context manager owning a unique scratch directory for one job.
+
+    required_bytes is checked against the free space of root before the
+    directory is created, so a job fails fast instead of mid-encode.
+    """
+
+    def __init__(self, root: str = "/tmp", required_bytes: int = 0, prefix: str = "job-"):
+        self.root = root
+        self.required_bytes = required_bytes
+        self.prefix = prefix
+        self.path = None
+
+    def __enter__(self) -> "JobWorkspace":
+        free = shutil.disk_usage(self.root).free
+        if free < self.required_bytes:
+            raise ScratchSpaceError(
+                f"Not enough scratch space in {self.root}: {free} bytes free, {self.required_bytes} required"
+            )
+        self.path = tempfile.mkdtemp(prefix=self.prefix, dir=self.root)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.cleanup()
+
+    def file(self, name: str) -> str:
+        """Path for name inside this job's directory."""
+        return os.path.join(self.path, name)
+
+    def cleanup(self) -> None:
+        if self.path and os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+            logger.info("Removed job workspace %s", self.path)
+        self.path = None
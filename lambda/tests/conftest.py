@@ -0,0 +1,105 @@
+"""Shared setup for the lambda/prod and lambda/api tests.
+
+Both functions have a module named handler, so lambda/prod is importable as
+usual and the API's handler is loaded as api_handler (see the api_handler
+fixture). lambda/prod comes first on sys.path: the modules deployed with
+both functions must be identical (see test_shared_modules.py), so either
+copy serves both handlers.
+"""
+
+import hashlib
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+
+import imageio_ffmpeg
+import pytest
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PROD_DIR = os.path.join(LAMBDA_DIR, "prod")
+API_DIR = os.path.join(LAMBDA_DIR, "api")
+
+sys.path.insert(0, PROD_DIR)
+sys.path.append(API_DIR)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("METRICS", "off")
+
+
+@pytest.fixture(scope="session")
+def api_handler():
+    os.environ.setdefault("S3_BUCKET", "test-bucket")
+    os.environ.setdefault("SQS_QUEUE_URL", "memory://test-standard")
+    os.environ.setdefault("JOB_QUEUE", "memory")
+    spec = importlib.util.spec_from_file_location("api_handler", os.path.join(API_DIR, "handler.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def background_video(tmp_path_factory):
+    """A one second 180x320 test pattern with a tone."""
+    path = str(tmp_path_factory.mktemp("inputs") / "background.mp4")
+    subprocess.run([
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", "testsrc2=size=180x320:rate=24:duration=1",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=1", "-c:a", "aac",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-shortest", path,
+    ], check=True)
+    return path
+
+
+class MemoryS3:
+    """The S3 client calls the worker makes, over a dict of (bucket, key) -> bytes."""
+
+    def __init__(self):
+        self.objects = {}
+        self.metadata = {}
+        self.uploads = []
+
+    def _get(self, operation, bucket, key, missing="NoSuchKey"):
+        if (bucket, key) not in self.objects:
+            raise ClientError({"Error": {"Code": missing, "Message": "Not Found"}}, operation)
+        return self.objects[(bucket, key)]
+
+    def head_object(self, Bucket, Key, **kwargs):
+        data = self._get("HeadObject", Bucket, Key, missing="404")
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"', "ContentLength": len(data),
+                "Metadata": dict(self.metadata.get((Bucket, Key), {}))}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        data = self._get("GetObject", Bucket, Key)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if IfNoneMatch == etag:
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+        return {"ETag": etag, "ContentLength": len(data), "Metadata": dict(self.metadata.get((Bucket, Key), {})),
+                "Body": StreamingBody(io.BytesIO(data), len(data))}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, **kwargs):
+        with open(Filename, "rb") as f:
+            self.objects[(Bucket, Key)] = f.read()
+        self.metadata[(Bucket, Key)] = dict((ExtraArgs or {}).get("Metadata", {}))
+        self.uploads.append(Key)
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective="COPY", Metadata=None, **kwargs):
+        source = (CopySource["Bucket"], CopySource["Key"])
+        self.objects[(Bucket, Key)] = self._get("CopyObject", *source)
+        self.metadata[(Bucket, Key)] = dict(Metadata if MetadataDirective == "REPLACE" else self.metadata.get(source, {}))
+        return {}
+
+
+@pytest.fixture
+def memory_s3(monkeypatch, tmp_path):
+    """A MemoryS3 installed as the worker's client, with an empty background cache."""
+    import handler
+    from s3cache import S3FileCache
+
+    s3 = MemoryS3()
+    monkeypatch.setattr(handler, "s3", s3)
+    monkeypatch.setattr(handler, "background_cache", S3FileCache(s3, str(tmp_path / "background-cache"), 256 * 1024 * 1024))
+    monkeypatch.setattr(handler, "missing_mezzanines", {})
+    return s3
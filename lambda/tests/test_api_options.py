@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+import handler
+import profiles
+import renditions
+
+
+def test_api_option_sets_match_worker(api_handler):
+    assert set(api_handler.RENDER_BACKENDS) == set(handler.RENDER_BACKENDS)
+    assert set(api_handler.ENCODING_PROFILES) == set(profiles.PROFILES)
+    assert set(api_handler.RENDITIONS) == set(renditions.RENDITIONS)
+
+
+@pytest.mark.parametrize("backend", ["gstreamer", "FFMPEG", 1])
+def test_unknown_render_backend_is_rejected(api_handler, backend):
+    response = api_handler.lambda_handler({
+        "httpMethod": "POST",
+        "body": json.dumps({"job_id": "j", "image1_key": "images/a.png", "image2_key": "images/b.png",
+                            "render_backend": backend}),
+    }, None)
+    assert response["statusCode"] == 400
+    assert "render_backend" in json.loads(response["body"])["error"]
+
+
+def test_known_render_backend_is_accepted(api_handler):
+    options, error = api_handler.parse_render_options({"render_backend": "ffmpeg"})
+    assert error is None and options["render_backend"] == "ffmpeg"
+    assert api_handler.parse_render_options({})[0]["render_backend"] is None
+
+
+def test_batch_rejects_render_backend(api_handler):
+    response = api_handler.lambda_handler({
+        "httpMethod": "POST",
+        "body": json.dumps({"jobs": [{"job_id": "j", "image1_key": "images/a.png", "image2_key": "images/b.png"}],
+                            "render_backend": "ffmpeg"}),
+    }, None)
+    assert response["statusCode"] == 400
+    assert "render_backend" in json.loads(response["body"])["error"]
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+
+class CopyFailsS3:
+    """S3 client stub: every object exists, CopyObject fails with error_code."""
+
+    def __init__(self, error_code):
+        self.error_code = error_code
+        self.copies = 0
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": f'"etag-{Key}"'}
+
+    def copy_object(self, **kwargs):
+        self.copies += 1
+        raise ClientError({"Error": {"Code": self.error_code, "Message": "Access Denied"}}, "CopyObject")
+
+
+@pytest.mark.parametrize("code", ["403", "AccessDenied", "NoSuchKey", "InternalError"])
+def test_cache_lookup_error_is_a_miss(api_handler, monkeypatch, code):
+    monkeypatch.setattr(api_handler, "s3_client", CopyFailsS3(code))
+    assert api_handler.copy_cached_render("0" * 64, "outputs/job.mp4") is False
+
+
+def test_submit_queues_when_cache_lookup_is_denied(api_handler, monkeypatch):
+    s3 = CopyFailsS3("AccessDenied")
+    monkeypatch.setattr(api_handler, "s3_client", s3)
+    response = api_handler.submit_job(
+        {"job_id": "denied", "image1_key": "images/a.png", "image2_key": "images/b.png"}, {}
+    )
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["message"] == "Video processing queued"
+    assert s3.copies == 1
@@ -0,0 +1,39 @@
+import imageio_ffmpeg
+import numpy as np
+
+import handler
+from test_ingest import make_png
+
+# As in lambda/dev/parity.py
+MIN_PSNR_DB = 30.0
+
+
+def read_frames(path):
+    reader = imageio_ffmpeg.read_frames(path)
+    meta = next(reader)
+    width, height = meta["size"]
+    return [np.frombuffer(frame, np.uint8).reshape(height, width, 3) for frame in reader]
+
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def test_moviepy_and_ffmpeg_backends_match(tmp_path, background_video):
+    image1 = make_png(str(tmp_path / "image1.png"), "RGB", (64, 48))
+    image2 = make_png(str(tmp_path / "image2.png"), "RGBA", (48, 64))
+    frames = {}
+    for backend in ("moviepy", "ffmpeg"):
+        output = str(tmp_path / f"{backend}.mp4")
+        handler.overlay_images_on_video(
+            background_video, image1, image2, output,
+            include_audio=False, duration_seconds=1.0, backend=backend, profile="fast",
+        )
+        frames[backend] = read_frames(output)
+
+    reference, other = frames["moviepy"], frames["ffmpeg"]
+    assert len(reference) == len(other)
+    assert reference[0].shape == other[0].shape
+    for a, b in zip(reference, other):
+        assert psnr(a, b) >= MIN_PSNR_DB
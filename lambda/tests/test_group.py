@@ -0,0 +1,48 @@
+import glob
+import os
+
+import handler
+from test_ingest import make_png
+
+
+def test_group_renders_and_uploads_in_chunks(tmp_path, monkeypatch, memory_s3, background_video):
+    with open(background_video, "rb") as f:
+        memory_s3.objects[("media", "backgrounds/bg.mp4")] = f.read()
+    members = []
+    for i in range(5):
+        for n in (1, 2):
+            with open(make_png(str(tmp_path / f"{i}-{n}.png"), "RGB", (64, 64)), "rb") as f:
+                memory_s3.objects[("media", f"images/{i}-{n}.png")] = f.read()
+        members.append({"job_id": f"job{i}", "image1_key": f"images/{i}-1.png",
+                        "image2_key": f"images/{i}-2.png", "output_key": f"outputs/job{i}.mp4"})
+
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    reserved = []
+    on_disk = []
+    workspace = handler.JobWorkspace
+
+    def recording_workspace(root, required_bytes=0, **kwargs):
+        reserved.append(required_bytes)
+        return workspace(root, required_bytes=required_bytes, **kwargs)
+
+    upload_file = memory_s3.upload_file
+
+    def counting_upload(Filename, *args, **kwargs):
+        on_disk.append(len(glob.glob(os.path.join(os.path.dirname(Filename), "*-output.mp4"))))
+        return upload_file(Filename, *args, **kwargs)
+
+    monkeypatch.setattr(handler, "JobWorkspace", recording_workspace)
+    monkeypatch.setattr(handler, "MAX_GROUP_ENCODERS", 2)
+    monkeypatch.setattr(handler, "SCRATCH_DIR", str(scratch))
+    monkeypatch.setattr(handler, "RENDER_CACHE_ENABLED", False)
+    monkeypatch.setattr(memory_s3, "upload_file", counting_upload)
+
+    handler.process_group({
+        "background_bucket": "media", "background_key": "backgrounds/bg.mp4", "output_bucket": "media",
+        "include_audio": False, "duration_seconds": 0.5, "profile": "fast", "jobs": members,
+    })
+
+    assert reserved == [handler.JOB_SCRATCH_BYTES * 2]
+    assert sorted(memory_s3.uploads) == [m["output_key"] for m in members]
+    assert max(on_disk) <= 2
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+from conftest import PROD_DIR
+
+# As lambda/dev/importtime.py checks from the command line
+BUDGET_MS = 600
+LAZY_MODULES = ("moviepy", "imageio", "IPython", "proglog", "tqdm")
+
+PROBE = (
+    "import sys, time\n"
+    "t = time.perf_counter()\n"
+    "import handler\n"
+    "elapsed = (time.perf_counter() - t) * 1000\n"
+    "lazy = sorted({m.split('.')[0] for m in sys.modules} & set(sys.argv[1:]))\n"
+    "print(f'{elapsed:.1f} ' + ','.join(lazy))\n"
+)
+
+
+def timed_import():
+    env = {**os.environ, "METRICS": "off"}
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, *LAZY_MODULES],
+        cwd=PROD_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout.strip().split(" ", 1)
+    return float(out[0]), [m for m in (out[1] if len(out) > 1 else "").split(",") if m]
+
+
+def test_handler_cold_import_is_fast_and_lazy():
+    # Best of three, as a shared CI machine adds noise to any single run
+    runs = [timed_import() for _ in range(3)]
+    assert [lazy for _, lazy in runs] == [[]] * 3
+    assert min(ms for ms, _ in runs) < BUDGET_MS
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import handler
+from handler import overlay_images_on_video
+from ingest import NORMALIZED_SUFFIX, ingest_image, layout_size, normalize_image, normalized_key, open_image
+from moviepy.editor import VideoFileClip
+
+
+def make_png(path, mode, size=(1400, 1400)):
+    """A size PNG in mode with a red square in its top-left quarter."""
+    img = Image.new("RGB", size, (255, 255, 255))
+    ImageDraw.Draw(img).rectangle([0, 0, size[0] // 2, size[1] // 2], fill=(255, 0, 0))
+    if mode == "P":
+        img = img.convert("P", palette=Image.Palette.ADAPTIVE, colors=16)
+    elif mode == "P-transparent":
+        img = img.convert("P", palette=Image.Palette.ADAPTIVE, colors=16)
+        img.info["transparency"] = img.getpixel((size[0] - 1, size[1] - 1))
+    elif mode == "I;16":
+        img = Image.fromarray(np.asarray(img.convert("L"), dtype=np.uint16) * 257)
+    else:
+        img = img.convert(mode)
+    img.save(path, format="PNG")
+    return path
+
+
+@pytest.mark.parametrize("mode", ["P", "P-transparent", "1", "L", "I;16", "RGB", "RGBA"])
+def test_ingest_any_png_mode(tmp_path, mode):
+    path = make_png(str(tmp_path / "image.png"), mode)
+    with open_image(path) as img:
+        ingested = ingest_image(img, (200, 200))
+    assert ingested.image.mode == "RGBA"
+    assert ingested.image.size == (200, 200)
+    assert ingested.decoded_size == (1400, 1400)
+    if mode not in ("1", "L", "I;16"):
+        # Colors survive the reduction: red stays red, white stays white
+        r, g, b, _ = ingested.image.getpixel((40, 40))
+        assert r > 200 and g < 60 and b < 60
+    if mode != "P-transparent":
+        assert ingested.image.getpixel((160, 160))[:3] == (255, 255, 255)
+
+
+def test_transparent_palette_keeps_alpha(tmp_path):
+    path = make_png(str(tmp_path / "image.png"), "P-transparent")
+    with open_image(path) as img:
+        image = ingest_image(img, (200, 200)).image
+    assert image.getpixel((160, 160))[3] == 0
+    assert image.getpixel((40, 40))[3] == 255
+
+
+@pytest.mark.parametrize("mode", ["P", "1"])
+def test_normalize_png_mode(tmp_path, mode):
+    path = make_png(str(tmp_path / "image.png"), mode)
+    assert normalize_image(path, str(tmp_path / "image.webp"), (512, 512)) == (512, 512)
+
+
+@pytest.mark.parametrize("backend", ["moviepy", "ffmpeg"])
+def test_render_palette_and_bilevel_png(tmp_path, background_video, backend):
+    image1 = make_png(str(tmp_path / "palette.png"), "P")
+    image2 = make_png(str(tmp_path / "bilevel.png"), "1")
+    output = str(tmp_path / "output.mp4")
+    overlay_images_on_video(
+        background_video, image1, image2, output,
+        duration_seconds=0.5, backend=backend, profile="fast", segments=1,
+    )
+    assert os.path.getsize(output) > 0
+    with VideoFileClip(output) as clip:
+        assert clip.size == [180, 320]
+
+
+def test_ffmpeg_backend_leaves_input_directory_alone(tmp_path, background_video):
+    inputs, work = tmp_path / "inputs", tmp_path / "work"
+    inputs.mkdir()
+    work.mkdir()
+    image1 = make_png(str(inputs / "image1.png"), "RGB")
+    image2 = make_png(str(inputs / "image2.png"), "P")
+    output = str(work / "output.mp4")
+    overlay_images_on_video(background_video, image1, image2, output,
+                            duration_seconds=0.5, backend="ffmpeg", profile="fast", segments=1)
+    assert sorted(os.listdir(inputs)) == ["image1.png", "image2.png"]
+    assert os.listdir(work) == ["output.mp4"]
+
+
+def test_source_size_marker_only_counts_for_normalized_variants(tmp_path):
+    variant = str(tmp_path / "image.webp")
+    assert normalize_image(make_png(str(tmp_path / "image.png"), "RGB"), variant, (512, 512)) == (512, 512)
+    with open_image(variant) as img:
+        assert layout_size(img) == (512, 512)
+        assert layout_size(img, normalized=True) == (1400, 1400)
+    # The worker names the variants it downloads with NORMALIZED_SUFFIX
+    os.rename(variant, str(tmp_path / ("image" + NORMALIZED_SUFFIX)))
+    with open_image(str(tmp_path / ("image" + NORMALIZED_SUFFIX))) as img:
+        assert layout_size(img) == (1400, 1400)
+
+
+def test_download_image_flags_only_tagged_variants(tmp_path, memory_s3):
+    variant = normalize_image(make_png(str(tmp_path / "image.png"), "RGB"), str(tmp_path / "image.webp"), (512, 512))
+    with open(tmp_path / "image.webp", "rb") as f:
+        memory_s3.objects[("media", normalized_key("images/a.png"))] = f.read()
+    with open(tmp_path / "image.png", "rb") as f:
+        memory_s3.objects[("media", "images/a.png")] = f.read()
+
+    # Without source-etag metadata the object is not taken as a variant
+    path, _ = handler.download_image("media", "images/a.png", str(tmp_path / "untagged.png"))
+    assert path.endswith("untagged.png")
+
+    memory_s3.metadata[("media", normalized_key("images/a.png"))] = {"source-etag": "abc"}
+    path, etag = handler.download_image("media", "images/a.png", str(tmp_path / "tagged.png"))
+    assert path.endswith(NORMALIZED_SUFFIX) and etag == '"abc"'
+    with open_image(path) as img:
+        assert img.size == variant and layout_size(img) == (1400, 1400)
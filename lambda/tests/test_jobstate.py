@@ -0,0 +1,20 @@
+import pytest
+
+from jobstate import JobReporter, JobStore, SQLiteJobStore, record_etag
+
+
+def test_job_store_is_abstract():
+    with pytest.raises(TypeError):
+        JobStore()
+
+
+def test_sqlite_store_versions_records(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite"))
+    assert isinstance(store, JobStore)
+    JobReporter(store, "job").stage("rendering")
+    first = store.get("job")
+    store.update("job", progress=0.5)
+    second = store.get("job")
+    assert (first["stage"], second["progress"]) == ("rendering", 0.5)
+    assert record_etag(first) != record_etag(second)
+    assert store.wait_for_change("job", record_etag(first), timeout=0) == second
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+import pytest
+
+from metrics import JobMetrics, peak_rss_bytes
+
+MB = 1024 * 1024
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="per-job RSS needs /proc")
+
+
+def test_peak_rss_is_per_job():
+    # An earlier job's peak, freed before the next one starts
+    block = b"x" * (300 * MB)
+    del block
+    lifetime_peak = peak_rss_bytes()
+    assert lifetime_peak >= 300 * MB
+
+    metrics = JobMetrics()
+    metrics.finish()
+    assert metrics.counters["PeakRSSBytes"][0] < lifetime_peak - 200 * MB
+
+
+def test_peak_rss_includes_subprocesses():
+    metrics = JobMetrics()
+    before = JobMetrics()
+    before.finish()
+    subprocess.run(
+        [sys.executable, "-c", "import time; block = b'x' * (200 * 1024 * 1024); time.sleep(1)"], check=True
+    )
+    metrics.finish()
+    assert metrics.counters["PeakRSSBytes"][0] >= before.counters["PeakRSSBytes"][0] + 150 * MB
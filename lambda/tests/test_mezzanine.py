@@ -0,0 +1,18 @@
+import subprocess
+
+import imageio_ffmpeg
+
+from ffmpeg_backend import probe_video
+from mezzanine import transcode_mezzanine
+
+
+def test_mezzanine_keeps_the_source_frame_rate(tmp_path):
+    source = str(tmp_path / "background.mp4")
+    subprocess.run([
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", "testsrc2=size=180x320:rate=60:duration=0.5",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", source,
+    ], check=True)
+    output = str(tmp_path / "mezzanine.mp4")
+    transcode_mezzanine(source, output)
+    assert probe_video(output)["fps"] == probe_video(source)["fps"] == 60
@@ -0,0 +1,34 @@
+import handler
+from rendercache import DIGEST_METADATA, MESSAGE_ID_METADATA
+from test_ingest import make_png
+
+
+def test_existing_output_is_skipped_only_when_it_is_this_jobs(tmp_path, monkeypatch, memory_s3, background_video):
+    with open(background_video, "rb") as f:
+        memory_s3.objects[("media", "backgrounds/bg.mp4")] = f.read()
+    for n in (1, 2):
+        with open(make_png(str(tmp_path / f"{n}.png"), "RGB", (64, 64)), "rb") as f:
+            memory_s3.objects[("media", f"images/{n}.png")] = f.read()
+    # Another client's job with the same job_id
+    memory_s3.objects[("media", "outputs/job.mp4")] = b"someone else's video"
+
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    monkeypatch.setattr(handler, "SCRATCH_DIR", str(scratch))
+    monkeypatch.setattr(handler, "PREVIEW_MODE", "off")
+    monkeypatch.setattr(handler, "RENDER_CACHE_ENABLED", False)
+    payload = {"job_id": "job", "background_bucket": "media", "background_key": "backgrounds/bg.mp4",
+               "image1_key": "images/1.png", "image2_key": "images/2.png",
+               "output_bucket": "media", "output_key": "outputs/job.mp4",
+               "include_audio": False, "duration_seconds": 0.5, "profile": "fast", "render_backend": "ffmpeg"}
+
+    handler.process_job({**payload, "message_id": "m1"})
+    assert memory_s3.uploads == ["outputs/job.mp4"]
+    assert memory_s3.objects[("media", "outputs/job.mp4")] != b"someone else's video"
+    metadata = memory_s3.metadata[("media", "outputs/job.mp4")]
+    assert metadata[MESSAGE_ID_METADATA] == "m1" and metadata[DIGEST_METADATA]
+
+    # A redelivery of the same message, then a new message for the same inputs
+    handler.process_job({**payload, "message_id": "m1"})
+    handler.process_job({**payload, "message_id": "m2"})
+    assert memory_s3.uploads == ["outputs/job.mp4"]
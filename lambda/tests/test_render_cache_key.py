@@ -0,0 +1,26 @@
+"""The API serves cache hits under keys the worker stored them by."""
+
+import pytest
+
+import rendercache
+
+CASES = [
+    (("media", "backgrounds/background.mp4"), '"bg-etag"', ['"a"', '"b"'], True, 6.0, "balanced"),
+    (("media", "backgrounds/other.mp4"), "bg-etag", ["a", "b"], False, 3.3333, "fast"),
+    (("uploads", "backgrounds/background.mp4"), '"bg-etag"', ['"a-2"', '"b"'], True, 30, "archive"),
+    (("media", "backgrounds/background.mp4"), '"bg-etag"', ['"a"', '"b"'], 1, "0.01", "balanced"),
+]
+
+
+@pytest.mark.parametrize("args", CASES)
+def test_api_and_worker_keys_match(api_handler, args):
+    assert api_handler.render_cache_key(*args) == rendercache.render_cache_key(*args)
+
+
+def test_keys_depend_on_every_input(api_handler):
+    assert len({api_handler.render_cache_key(*args) for args in CASES}) == len(CASES)
+
+
+def test_api_reads_entries_where_the_worker_stores_them(api_handler):
+    assert api_handler.RENDER_CACHE_VERSION == rendercache.RENDER_CACHE_VERSION
+    assert f"{api_handler.RENDER_CACHE_PREFIX}{'0' * 64}.mp4" == rendercache.cache_object_key("0" * 64)
@@ -0,0 +1,50 @@
+import multiprocessing
+import os
+
+from conftest import MemoryS3
+from s3cache import S3FileCache
+
+MB = 1024 * 1024
+
+
+def cache_files(cache):
+    return sorted(name for name in os.listdir(cache.root) if not name.startswith("."))
+
+
+def test_worker_never_deletes_files_its_siblings_use(tmp_path):
+    s3 = MemoryS3()
+    s3.objects[("media", "bg.mp4")] = b"a" * MB
+    cache = S3FileCache(s3, str(tmp_path / "cache"), max_bytes=MB)
+    shared = cache.fetch("media", "bg.mp4")
+
+    ctx = multiprocessing.get_context("fork")
+    started, release = ctx.Event(), ctx.Event()
+
+    def worker():
+        # A new version, plus an object that evicts it from this worker's index
+        s3.objects[("media", "bg.mp4")] = b"b" * MB
+        cache.revalidate_after = 0
+        cache.fetch("media", "bg.mp4")
+        s3.objects[("media", "other.mp4")] = b"c" * MB
+        cache.fetch("media", "other.mp4")
+        started.set()
+        release.wait(10)
+
+    proc = ctx.Process(target=worker)
+    proc.start()
+    assert started.wait(10)
+    assert os.path.exists(shared)
+    assert len(cache_files(cache)) == 3
+
+    # The owner defers cleanup while a worker is running...
+    s3.objects[("media", "next.mp4")] = b"d" * MB
+    cache.fetch("media", "next.mp4")
+    assert os.path.exists(shared)
+
+    # ...and removes everything outside its index once it has exited
+    release.set()
+    proc.join()
+    assert proc.exitcode == 0
+    s3.objects[("media", "last.mp4")] = b"e" * MB
+    last = cache.fetch("media", "last.mp4")
+    assert cache_files(cache) == [os.path.basename(last)]
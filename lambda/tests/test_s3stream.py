@@ -0,0 +1,44 @@
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from s3stream import StreamingUpload
+
+
+class AbortDeniedS3:
+    """Multipart calls succeed except AbortMultipartUpload (no IAM permission)."""
+
+    def __init__(self):
+        self.aborts = 0
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, PartNumber, **kwargs):
+        return {"ETag": f'"part-{PartNumber}"'}
+
+    def abort_multipart_upload(self, **kwargs):
+        self.aborts += 1
+        raise ClientError({"Error": {"Code": "AccessDenied", "Message": "Access Denied"}}, "AbortMultipartUpload")
+
+
+def test_failed_abort_keeps_render_error(tmp_path):
+    client = AbortDeniedS3()
+    path = str(tmp_path / "output.mp4")
+    with pytest.raises(RuntimeError, match="encoder crashed"):
+        with StreamingUpload(client, path, "bucket", "outputs/job.mp4"):
+            with open(path, "wb") as f:
+                f.write(b"\0" * 1024)
+            raise RuntimeError("encoder crashed")
+    assert client.aborts == 1
+    assert not os.path.exists(path)
+
+
+def test_failed_abort_keeps_empty_output_error(tmp_path):
+    client = AbortDeniedS3()
+    path = str(tmp_path / "output.mp4")
+    with pytest.raises(RuntimeError, match="no output"):
+        with StreamingUpload(client, path, "bucket", "outputs/job.mp4"):
+            open(path, "wb").close()
+    assert client.aborts == 1
@@ -0,0 +1,23 @@
+"""Modules deployed with both lambda/api and lambda/prod.
+
+Each function is packaged from its own directory (the API as a zip of
+lambda/api, the worker as an image built from lambda/prod), so these
+modules are kept as two copies that must not drift apart.
+"""
+
+import filecmp
+import os
+
+import pytest
+
+from conftest import API_DIR, PROD_DIR
+
+SHARED_MODULES = ("jobstate.py", "scheduling.py")
+
+
+@pytest.mark.parametrize("name", SHARED_MODULES)
+def test_shared_module_copies_are_identical(name):
+    assert filecmp.cmp(os.path.join(PROD_DIR, name), os.path.join(API_DIR, name), shallow=False), (
+        f"lambda/api/{name} and lambda/prod/{name} differ; copy one over the other"
+    )
+
@@ -0,0 +1,25 @@
+import json
+
+import handler
+from jobstate import SQLiteJobStore
+
+
+def sqs_record(message_id, payload, receive_count):
+    return {"messageId": message_id, "body": json.dumps(payload),
+            "attributes": {"ApproximateReceiveCount": str(receive_count)}}
+
+
+def test_failures_retry_until_the_last_receive(tmp_path, monkeypatch, memory_s3):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(handler, "job_store", store)
+    monkeypatch.setattr(handler, "MAX_RECEIVE_COUNT", 3)
+    payload = {"job_id": "job", "background_bucket": "media", "background_key": "backgrounds/missing.mp4",
+               "image1_key": "images/1.png", "image2_key": "images/2.png",
+               "output_bucket": "media", "output_key": "outputs/job.mp4"}
+
+    for receive_count, stage in ((1, "retrying"), (2, "retrying"), (3, "failed")):
+        response = handler.handle_sqs_batch([sqs_record("m1", payload, receive_count)])
+        assert response == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+        record = store.get("job")
+        assert (record["stage"], record["status"]) == (stage, "failed" if stage == "failed" else "processing")
+        assert record["error"]